@@ -0,0 +1,188 @@
+"""
+Exercise the submodule build cache (_ext/build_cache.py) on a synthetic project.
+
+Creates a git repository holding a few top-level pages and a submodule with
+--pages generated pages, then builds it to fresh output directories (as a
+fresh CI checkout would) sharing one cache directory:
+
+  cold cache      nothing cached yet; everything is read, the tree is stored
+  fresh checkout  the tree is restored; only the top-level pages are read
+  edited page     a top-level page changed; the tree is still restored
+  renamed title   a top-level title changed; the tree's pages are written
+                  again from the restored doctrees, but not read
+  submodule bump  a commit in the submodule; the tree is read again
+
+For each build it prints the time and how many documents were read and
+written, and checks that restored pages and searchindex.js match a build
+without the cache.
+
+Usage (from docs/):
+    python _bench/build_cache_bench.py [--pages 300]
+"""
+import argparse
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+DOCS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DOCS_DIR)
+
+PAGE = """# {title}
+
+Generated page {i} of the synthetic submodule. It links to [the next page](page{next}.md)
+and has a few sections so the search index has something to chew on.
+
+## Usage {i}
+
+```c
+float4 main{i}(float4 position : SV_Position) : SV_Target {{ return position; }}
+```
+
+## Notes {i}
+
+Words {i} for the index: shader parameter block generics interfaces modules.
+"""
+
+
+def git(cwd, *args):
+    subprocess.run(['git', '-c', 'user.name=bench', '-c', 'user.email=bench@localhost',
+                    '-c', 'protocol.file.allow=always', *args],
+                   cwd=cwd, check=True, capture_output=True)
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def make_submodule(root, pages):
+    os.makedirs(root)
+    git(root, 'init', '-q')
+    names = [f'page{i}' for i in range(pages)]
+    write(os.path.join(root, 'index.md'),
+          '# Library\n\n```{toctree}\n' + '\n'.join(f'chapter{i // 50}/index' for i in range(0, pages, 50)) + '\n```\n')
+    for start in range(0, pages, 50):
+        chapter = os.path.join(root, f'chapter{start // 50}')
+        chunk = names[start:start + 50]
+        write(os.path.join(chapter, 'index.md'),
+              f'# Chapter {start // 50}\n\n```{{toctree}}\n' + '\n'.join(chunk) + '\n```\n')
+        for name in chunk:
+            i = int(name[len('page'):])
+            next_page = i + 1 if i + 1 < start + len(chunk) else start
+            write(os.path.join(chapter, name + '.md'), PAGE.format(title=f'Page {i}', i=i, next=next_page))
+    git(root, 'add', '.')
+    git(root, 'commit', '-q', '-m', 'Initial pages')
+
+
+def make_project(root, submodule):
+    os.makedirs(root)
+    git(root, 'init', '-q')
+    write(os.path.join(root, 'conf.py'),
+          f"import sys\nsys.path.insert(0, {DOCS_DIR!r})\n"
+          "extensions = ['myst_parser', '_ext.generate_toc_html', '_ext.generate_llms_txt', '_ext.build_cache']\n"
+          "exclude_patterns = ['_build']\n"
+          "suppress_warnings = ['myst.xref_missing', 'toc.not_included']\n")
+    write(os.path.join(root, 'index.rst'),
+          'Synthetic docs\n==============\n\n.. toctree::\n\n   first\n   external/lib/index\n')
+    write(os.path.join(root, 'first.md'), '# First steps\n\nA top-level page.\n')
+    git(root, 'submodule', 'add', '-q', submodule, 'external/lib')
+    git(root, 'add', '.')
+    git(root, 'commit', '-q', '-m', 'Initial project')
+
+
+class Counter:
+    def __init__(self):
+        self.read = 0
+        self.written = 0
+
+    def doctree_read(self, app, doctree):
+        self.read += 1
+
+    def page_context(self, app, pagename, templatename, context, doctree):
+        if doctree is not None:
+            self.written += 1
+
+
+def build(project, outdir, cache_dir):
+    from sphinx.application import Sphinx
+    overrides = {'build_cache_dir': cache_dir} if cache_dir else {}
+    counter = Counter()
+    start = time.perf_counter()
+    app = Sphinx(project, project, os.path.join(outdir, 'html'), os.path.join(outdir, 'doctrees'), 'html',
+                 confoverrides=overrides, status=io.StringIO(), warning=io.StringIO())
+    app.connect('doctree-read', counter.doctree_read)
+    app.connect('html-page-context', counter.page_context)
+    app.build()
+    return time.perf_counter() - start, counter
+
+
+def read_output(outdir, relpath):
+    with open(os.path.join(outdir, 'html', relpath), 'rb') as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pages', type=int, default=300)
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as root:
+        submodule = os.path.join(root, 'lib')
+        project = os.path.join(root, 'project')
+        cache_dir = os.path.join(root, 'cache')
+        make_submodule(submodule, args.pages)
+        make_project(project, submodule)
+        # The pages, one index per chapter of up to 50 pages, the library index, index and first
+        total = args.pages + -(-args.pages // 50) + 3
+        checked_out = os.path.join(project, 'external', 'lib')
+
+        def edit_page():
+            with open(os.path.join(project, 'first.md'), 'a', encoding='utf-8') as f:
+                f.write('\nAnother paragraph.\n')
+
+        def rename_title():
+            write(os.path.join(project, 'first.md'), '# Getting started\n\nA top-level page.\n')
+
+        def bump_submodule():
+            with open(os.path.join(checked_out, 'chapter0', 'page0.md'), 'a', encoding='utf-8') as f:
+                f.write('\nUpdated upstream.\n')
+            git(checked_out, 'commit', '-q', '-am', 'Update page 0')
+
+        runs = [
+            ('cold cache', None, total, total),
+            ('fresh checkout', None, 2, 2),
+            ('edited page', edit_page, 2, 2),
+            ('renamed title', rename_title, 2, total),
+            ('submodule bump', bump_submodule, total, total),
+        ]
+        for n, (name, change, expect_read, expect_written) in enumerate(runs):
+            if change:
+                change()
+            outdir = os.path.join(root, f'build{n}')
+            elapsed, counter = build(project, outdir, cache_dir)
+            print(f"{name:>15}: {elapsed:6.2f}s, {counter.read:4d} of {total} documents read, "
+                  f"{counter.written:4d} written")
+            if (counter.read, counter.written) != (expect_read, expect_written):
+                failures.append(name)
+
+            if name == 'fresh checkout':
+                # The restored build must match one made without the cache
+                reference = os.path.join(root, 'reference')
+                build(project, reference, None)
+                for relpath in ('external/lib/chapter0/page1.html', 'external/lib/chapter0/page1.md',
+                                'searchindex.js', '_static/toc.html', 'llms-full.txt', 'llms-full-index.json'):
+                    if read_output(outdir, relpath) != read_output(reference, relpath):
+                        print(f"{relpath} differs from the build without the cache")
+                        failures.append(f'{name} ({relpath})')
+
+    if failures:
+        sys.exit(f"Unexpected results: {', '.join(failures)}")
+
+
+if __name__ == '__main__':
+    main()
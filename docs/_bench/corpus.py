@@ -0,0 +1,161 @@
+"""
+Generate a synthetic doc tree shaped like the real docs, for the benchmarks.
+
+The tree has an ``index.rst`` root whose toctree lists the top-level
+sections; every section is an ``index.md`` listing its children in an
+RTD-TOC comment block, as the submodule docs do. Pages mix prose with
+headings, $$ math, Liquid captures, fenced code and relative links
+(including links with fragments to missing documents and query strings,
+which fix_links has to repair). A fraction of the files is saved as
+UTF-16LE with a BOM.
+
+Usage (from docs/):
+    python _bench/corpus.py OUTDIR [--docs 1000] [--depth 3] [--math 0.3]
+        [--liquid 0.05] [--links 4] [--utf16 0.01] [--seed 0]
+"""
+import argparse
+import math
+import os
+import random
+
+PARAGRAPH = ("Slang shaders compile to many targets, and the same module can be "
+             "specialized for each of them without changing its source. ")
+
+
+def plan_tree(docs, depth):
+    """
+    Return {docname: [child docnames]} for a tree of about docs documents.
+
+    Children are listed breadth first, so the tree stays balanced: every
+    section has the same branching factor except along the last level filled.
+    """
+    branching = max(2, math.ceil(max(docs - 1, 1) ** (1 / max(depth, 1))))
+    tree = {'index': []}
+    queue = [('index', '', 0)]
+    count = 1
+    while queue and count < docs:
+        parent, prefix, level = queue.pop(0)
+        for i in range(branching):
+            if count >= docs:
+                break
+            if level + 1 < depth:
+                docname = f'{prefix}d{i}/index'
+                queue.append((docname, f'{prefix}d{i}/', level + 1))
+            else:
+                docname = f'{prefix}p{i}'
+            tree[docname] = []
+            tree[parent].append(docname)
+            count += 1
+    return tree
+
+
+def relative_link(from_doc, to_doc, suffix='.md'):
+    return os.path.relpath(to_doc + suffix, os.path.dirname(from_doc) or '.').replace(os.sep, '/')
+
+
+def page_body(rng, docname, all_docs, math_density, liquid, links):
+    lines = []
+    for section in range(1, rng.randint(2, 4) + 1):
+        lines.append(f'## Section {section}\n')
+        text = PARAGRAPH * rng.randint(1, 4)
+        if rng.random() < math_density:
+            text += f'The derivative $$\\frac{{\\partial f}}{{\\partial x_{section}}}$$ scales $$dx_{section}$$. '
+        lines.append(text + '\n')
+        if rng.random() < math_density:
+            lines.append(f'$$\nJ_{section} = \\begin{{bmatrix}} a & b \\\\ c & d \\end{{bmatrix}}\n$$\n')
+        if rng.random() < 0.3:
+            lines.append(f'```slang\nfloat f{section}(float x) {{ return x * x; }} // $$ in code\n```\n')
+
+    if rng.random() < liquid:
+        lines.append('{% capture tip %}\n**Tip:** keep modules small.\n{% endcapture %}\n'
+                     '{{ tip | markdownify }}\n')
+
+    link_lines = []
+    for i in range(links):
+        kind = rng.random()
+        if kind < 0.5:
+            target = rng.choice(all_docs)
+            link_lines.append(f'- [Related {i}]({relative_link(docname, target)}#section-1)')
+        elif kind < 0.8:
+            link_lines.append(f'- [Missing {i}](external/slang/docs/user-guide/missing-{i}.md#overview)')
+        else:
+            link_lines.append(f'- [Search {i}](https://example.com/search?q=slang&page={i})')
+    if link_lines:
+        lines.append('## See also\n\n' + '\n'.join(link_lines) + '\n')
+    return '\n'.join(lines)
+
+
+def section_toc(docname, children):
+    entries = '\n'.join(relative_link(docname, child, '') for child in children)
+    return f'<!-- RTD-TOC-START\n```{{toctree}}\n:titlesonly:\n{entries}\n```\nRTD-TOC-END -->\n'
+
+
+def generate_corpus(root, docs=1000, depth=3, math_density=0.3, liquid=0.05, links=4,
+                    utf16=0.01, seed=0):
+    """
+    Write the tree below root and return {docname: (path, children)}.
+
+    Paths are relative to root. The same arguments always produce the
+    same files.
+    """
+    rng = random.Random(seed)
+    tree = plan_tree(docs, depth)
+    all_docs = [docname for docname in tree if docname != 'index']
+    corpus = {}
+
+    top = '\n'.join(f'   {child}' for child in tree['index'])
+    write_doc(root, 'index.rst', f'Synthetic Docs\n==============\n\n.. toctree::\n'
+                                 f'   :caption: Sections\n   :maxdepth: 1\n\n{top}\n', False)
+    corpus['index'] = ('index.rst', tree['index'])
+
+    for docname in all_docs:
+        children = tree[docname]
+        path = docname + '.md'
+        parts = []
+        if rng.random() < 0.3:
+            parts.append(f'---\ndescription: Synthetic page {docname}\n---\n')
+        parts.append(f'# {"Section" if children else "Page"} {docname}\n')
+        if children:
+            parts.append(section_toc(docname, children))
+        parts.append(page_body(rng, docname, all_docs, math_density, liquid, links))
+        write_doc(root, path, '\n'.join(parts), rng.random() < utf16)
+        corpus[docname] = (path, children)
+    return corpus
+
+
+def write_doc(root, path, content, as_utf16):
+    full_path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    if as_utf16:
+        with open(full_path, 'wb') as f:
+            f.write(('\ufeff' + content).encode('utf-16le'))
+    else:
+        with open(full_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+
+def add_corpus_arguments(parser):
+    parser.add_argument('--depth', type=int, default=3, help='levels of sections below the root')
+    parser.add_argument('--math', type=float, default=0.3,
+                        help='probability of inline and block math per section')
+    parser.add_argument('--liquid', type=float, default=0.05,
+                        help='fraction of pages with a Liquid capture')
+    parser.add_argument('--links', type=int, default=4, help='links per page')
+    parser.add_argument('--utf16', type=float, default=0.01,
+                        help='fraction of pages saved as UTF-16LE')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('outdir')
+    parser.add_argument('--docs', type=int, default=1000)
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+    corpus = generate_corpus(args.outdir, args.docs, args.depth, args.math, args.liquid,
+                             args.links, args.utf16, args.seed)
+    print(f"Wrote {len(corpus)} documents to {args.outdir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Exercise the cached linkcheck builder (_ext/linkcheck_cache.py) offline.
+
+Starts two local HTTP servers standing in for two hosts, each answering
+after a short delay and counting requests and the peak number of
+concurrent requests. A throwaway project linking to both is then checked
+three times: from a cold cache, again with a warm cache (only broken
+links go back to the network), and after adding new links (only those
+are checked).
+
+Usage (from docs/):
+    python _bench/linkcheck_bench.py [--links 200] [--broken 5] [--delay 0.02]
+        [--workers 5] [--host-concurrency 2]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DOCS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Answers /ok/* with 200 and anything else with 404, after a delay."""
+
+    daemon_threads = True
+
+    def __init__(self, delay):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.paths = set()
+        self.active = 0
+        self.peak = 0
+
+    def reset(self):
+        self.requests = 0
+        self.paths = set()
+        self.peak = 0
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def respond(self, body):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.paths.add(self.path)
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            time.sleep(server.delay)
+            code = 200 if self.path.startswith('/ok/') else 404
+            self.send_response(code)
+            self.send_header('Content-Length', str(len(body) if code == 200 else 0))
+            self.end_headers()
+            if code == 200:
+                self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def do_HEAD(self):
+        self.respond(b'')
+
+    def do_GET(self):
+        self.respond(b'ok')
+
+    def log_message(self, format, *args):
+        pass
+
+
+def write_project(root, servers, links, broken, extra):
+    """Write a one-page project linking to the stand-in servers."""
+    lines = ['Links', '=====', '']
+    for i in range(links + extra):
+        server = servers[i % len(servers)]
+        kind = 'broken' if i < broken else 'ok'
+        lines.append(f'- `Link {i} <http://127.0.0.1:{server.server_port}/{kind}/{i}>`_')
+    with open(os.path.join(root, 'index.rst'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    with open(os.path.join(root, 'conf.py'), 'w', encoding='utf-8') as f:
+        f.write(f"import sys\nsys.path.insert(0, {DOCS_DIR!r})\n"
+                f"extensions = ['_ext.linkcheck_cache']\n")
+
+
+def run_linkcheck(root, workers, host_concurrency):
+    from sphinx.cmd.build import build_main
+    args = ['-b', 'linkcheck', '-q', '-D', f'linkcheck_workers={workers}',
+            '-D', f'linkcheck_host_concurrency={host_concurrency}',
+            root, os.path.join(root, '_build')]
+    # Broken links are expected; keep their report out of the output
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        return build_main(args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--links', type=int, default=200)
+    parser.add_argument('--broken', type=int, default=5)
+    parser.add_argument('--delay', type=float, default=0.02, help='seconds each response takes')
+    parser.add_argument('--workers', type=int, default=5, help='linkcheck_workers')
+    parser.add_argument('--host-concurrency', type=int, default=2)
+    args = parser.parse_args()
+
+    # Keep requests to the stand-in servers away from any configured proxy
+    os.environ['NO_PROXY'] = os.environ['no_proxy'] = '127.0.0.1,localhost'
+    servers = [StandInServer(args.delay) for _ in range(2)]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as root:
+        runs = [('cold cache', 0, args.links), ('warm cache', 0, args.broken),
+                ('new links', 10, args.broken + 10)]
+        for name, extra, expected in runs:
+            write_project(root, servers, args.links, args.broken, extra)
+            for server in servers:
+                server.reset()
+            start = time.perf_counter()
+            status = run_linkcheck(root, args.workers, args.host_concurrency)
+            elapsed = time.perf_counter() - start
+            requests = sum(server.requests for server in servers)
+            urls = sum(len(server.paths) for server in servers)
+            peak = max(server.peak for server in servers)
+            print(f"{name:>10}: {elapsed:6.2f}s, {urls:4d} URLs checked in {requests:4d} requests, "
+                  f"peak {peak} concurrent per host, exit status {status}")
+            if urls != expected or peak > args.host_concurrency:
+                failures.append(name)
+
+    for server in servers:
+        server.shutdown()
+    if failures:
+        sys.exit(f"Unexpected results: {', '.join(failures)}")
+
+
+if __name__ == '__main__':
+    main()
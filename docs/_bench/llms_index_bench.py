@@ -0,0 +1,66 @@
+"""
+Check the llms-full.txt index and page texts of a build (_ext/generate_llms_txt.py).
+
+For every document in llms-full-index.json, checks that its byte range in
+llms-full.txt holds the same bytes as its page text, and that each section
+range starts at a heading and lies inside the document. Then prints how many
+bytes an agent downloads for one document or one section, compared with the
+whole file.
+
+Usage (from docs/, after a build):
+    python _bench/llms_index_bench.py [_build/html] [--output llms-full.txt]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('outdir', nargs='?', default='_build/html')
+    parser.add_argument('--output', default='llms-full.txt')
+    args = parser.parse_args()
+
+    with open(os.path.join(args.outdir, args.output), 'rb') as f:
+        data = f.read()
+    with open(os.path.join(args.outdir, f"{os.path.splitext(args.output)[0]}-index.json"), encoding='utf-8') as f:
+        index = json.load(f)
+
+    failures = []
+    if index['bytes'] != len(data):
+        failures.append(f"index says {index['bytes']} bytes, {args.output} has {len(data)}")
+    doc_sizes = []
+    section_sizes = []
+    for docname, doc in index['docs'].items():
+        chunk = data[doc['start']:doc['end']]
+        doc_sizes.append(len(chunk))
+        if 'page' in doc:
+            with open(os.path.join(args.outdir, doc['page']), 'rb') as f:
+                if f.read() != chunk:
+                    failures.append(f"{docname}: {doc['page']} differs from its range")
+        for anchor, section in doc['sections'].items():
+            text = data[section['start']:section['end']].decode('utf-8')
+            lines = text.split('\n', 2)
+            is_heading = lines[0].startswith('#') or (len(lines) > 1 and lines[1][:1] in ('=', '-'))
+            if not doc['start'] <= section['start'] < section['end'] <= doc['end'] or not is_heading:
+                failures.append(f"{docname}#{anchor}: range doesn't start at its heading")
+            section_sizes.append(section['end'] - section['start'])
+
+    sections = len(section_sizes)
+    print(f"{args.output}: {len(data)} bytes, {len(doc_sizes)} documents, {sections} sections indexed")
+    if doc_sizes:
+        print(f"one document: median {statistics.median(doc_sizes):.0f} bytes, max {max(doc_sizes)} "
+              f"({statistics.median(doc_sizes) / len(data):.1%} of the file at the median)")
+    if section_sizes:
+        print(f"one section:  median {statistics.median(section_sizes):.0f} bytes, max {max(section_sizes)} "
+              f"({statistics.median(section_sizes) / len(data):.2%} of the file at the median)")
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(f"{len(failures)} problem(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Check and benchmark the $$ math conversion in conf.py (latex_block_to_inline).
+
+The regression corpus in math_corpus/ holds <name>.in sources and the
+expected <name>.out result. The microbenchmark times the conversion on a
+generated math-dense markdown file (1 MB by default) and compares it with
+the previous regex-based implementation, kept below for reference.
+
+Usage (from docs/):
+    python _bench/math_bench.py [--size 1000000] [--skip-reference]
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+
+DOCS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'math_corpus')
+sys.path.insert(0, DOCS_DIR)
+
+import conf  # noqa: E402
+
+CHUNK = '''## Section {n}
+
+The forward derivative $$\\frac{{\\partial f}}{{\\partial x_{n}}}$$ multiplies $$dx_{n}$$, and
+$$y_{n} = f(x_{n})$$ is the primal value, so $$dy_{n} = f'(x_{n})\\,dx_{n}$$ follows.
+
+$$
+J_{n} = \\begin{{bmatrix}} \\frac{{\\partial s}}{{\\partial x}} & \\frac{{\\partial s}}{{\\partial y}} \\end{{bmatrix}}
+$$
+
+```slang
+[Differentiable]
+float f{n}(float x) {{ return x * x; }} // $$ stays as written
+```
+
+Backward mode gives $$\\bar{{x}}_{n} = \\bar{{y}}_{n} f'(x_{n})$$ for every $$n$$.
+
+'''
+
+
+def reference_latex_block_to_inline(content):
+    """The previous implementation: quadratic in the number of inline spans."""
+    block_matches = re.finditer(r'^\s*\$\$(.*?)\$\$\s*$', content, re.MULTILINE | re.DOTALL)
+    block_positions = [(m.start(), m.end()) for m in block_matches]
+    all_matches = list(re.finditer(r'\$\$(.*?)\$\$', content, re.DOTALL))
+
+    def is_inline(match):
+        pos = match.span()
+        return not any(block_start <= pos[0] <= block_end for block_start, block_end in block_positions)
+
+    inline_matches = [m for m in all_matches if is_inline(m)]
+    for match in reversed(inline_matches):
+        start, end = match.span()
+        content = content[:start] + '$' + match.group(1) + '$' + content[end:]
+    return content
+
+
+def convert(content):
+    source = [content]
+    conf.latex_block_to_inline(None, None, source)
+    return source[0]
+
+
+def check_corpus():
+    """Return the names of corpus cases whose output doesn't match."""
+    failures = []
+    for in_path in sorted(glob.glob(os.path.join(CORPUS_DIR, '*.in'))):
+        with open(in_path, encoding='utf-8', newline='') as f:
+            content = f.read()
+        with open(in_path[:-3] + '.out', encoding='utf-8', newline='') as f:
+            expected = f.read()
+        name = os.path.basename(in_path)[:-3]
+        ok = convert(content) == expected
+        print(f"  {name}: {'ok' if ok else 'MISMATCH'}")
+        if not ok:
+            failures.append(name)
+    return failures
+
+
+def math_document(size):
+    chunks = []
+    total = 0
+    n = 0
+    while total < size:
+        chunk = CHUNK.format(n=n)
+        chunks.append(chunk)
+        total += len(chunk)
+        n += 1
+    return ''.join(chunks)
+
+
+def best_time(func, content, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', type=int, default=1000 * 1000,
+                        help='size of the generated document in characters')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--skip-reference', action='store_true',
+                        help='do not time the previous (slow) implementation')
+    args = parser.parse_args()
+
+    print("Regression corpus:")
+    failures = check_corpus()
+
+    content = math_document(args.size)
+    inline_spans = content.count('$$') // 2
+    print(f"Document: {len(content)} chars, {inline_spans} $$ pairs")
+    elapsed = best_time(convert, content, args.repeat)
+    print(f"  scanner:   {elapsed * 1000:9.1f} ms")
+    if not args.skip_reference:
+        reference = best_time(reference_latex_block_to_inline, content, 1)
+        print(f"  reference: {reference * 1000:9.1f} ms ({reference / elapsed:.0f}x slower)")
+
+    if failures:
+        sys.exit(f"Corpus mismatches: {', '.join(failures)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+"""
+Benchmark suite for the docs build extensions on synthetic doc trees.
+
+For every requested size a corpus is generated (see corpus.py) and
+
+* each conf.py preprocessing step, the toctree collection, the TOC
+  traversal and rendering, the search index and the fix_links passes are
+  timed in isolation on that corpus, without Sphinx;
+* unless --hooks-only is given, a full ``sphinx-build`` with this conf.py
+  is timed, followed by an incremental rebuild with nothing changed.
+
+Everything runs offline and does not need the submodules. Each result is
+appended as one JSON line to the results file together with the current
+commit, so scaling curves can be compared across commits with --show.
+
+Usage (from docs/):
+    python _bench/run_bench.py [--sizes 100,1000,10000] [--hooks-only]
+    python _bench/run_bench.py --sizes 10000 --jobs 1,auto   # serial vs parallel
+    python _bench/run_bench.py --show
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DOCS_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, DOCS_DIR)
+
+import sphinx  # noqa: E402
+from docutils import nodes  # noqa: E402
+
+import conf  # noqa: E402
+from _ext import fix_links, generate_search_index, generate_toc_html  # noqa: E402
+from _ext.html_pass import map_files  # noqa: E402
+from corpus import add_corpus_arguments, generate_corpus  # noqa: E402
+
+RESULTS_PATH = os.path.join(BENCH_DIR, 'results.jsonl')
+
+# Link shapes as MyST writes them; the first two are what fix_links repairs
+HTML_LINKS = (
+    '<a class="reference internal" href="#external/slang/docs/user-guide/missing-{i}.html#overview">Missing</a>',
+    '<a class="reference external" href="https://example.com/search?q=slang&amp;amp;page={i}">Search</a>',
+    '<a class="reference internal" href="../d{i}/p{i}.html#section-1">Related</a>',
+)
+
+
+def git_commit():
+    """Return the current commit, suffixed with -dirty if the tree has changes."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=DOCS_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=DOCS_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+class Recorder:
+    """Print results and append them to the results file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.common = {
+            'commit': git_commit(),
+            'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'host': platform.node(),
+            'python': platform.python_version(),
+            'sphinx': sphinx.__version__,
+        }
+
+    def add(self, kind, name, docs, seconds, items=None):
+        items_text = '' if items is None else f' ({items} items)'
+        print(f"  {name:<44} {seconds * 1000:10.1f} ms{items_text}")
+        if self.path:
+            result = dict(self.common, kind=kind, name=name, docs=docs,
+                          seconds=round(seconds, 6), items=items)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(result, sort_keys=True) + '\n')
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def read_sources(srcdir, corpus):
+    """Return {docname: text as Sphinx hands it to source-read}."""
+    sources = {}
+    for docname, (path, _) in corpus.items():
+        with open(os.path.join(srcdir, path), 'rb') as f:
+            # Older Sphinx versions decode with replacement, which is how a
+            # UTF-16 file reaches the UTF-16 step
+            sources[docname] = f.read().decode('utf-8-sig', 'replace')
+    return sources
+
+
+def bench_preprocessing(recorder, srcdir, corpus, doctreedir):
+    """Time each conf.py step over the corpus, feeding each the previous step's output."""
+    env = SimpleNamespace(doc2path=lambda docname: os.path.join(srcdir, corpus[docname][0]))
+    app = SimpleNamespace(env=env, doctreedir=doctreedir)
+    sources = read_sources(srcdir, corpus)
+    docs = len(corpus)
+    texts = {docname: [text] for docname, text in sources.items()}
+
+    steps = ['utf16le', 'add_orphan_directive', 'latex_block_to_inline', 'render_liquid']
+    for name in steps:
+        check, transform = conf.SOURCE_STEPS[name]
+        hits = [docname for docname, source in texts.items() if check(source[0])]
+        if name == 'render_liquid':
+            liquid_inputs = {docname: texts[docname][0] for docname in hits}
+        start = time.perf_counter()
+        for docname in hits:
+            transform(app, docname, texts[docname])
+        label = 'conf.render_liquid (cold cache)' if name == 'render_liquid' else f'conf.{name}'
+        recorder.add('hook', label, docs, time.perf_counter() - start, len(hits))
+
+    # Rendering again hits the cache written above
+    start = time.perf_counter()
+    for docname, text in liquid_inputs.items():
+        conf.render_liquid(app, docname, [text])
+    recorder.add('hook', 'conf.render_liquid (warm cache)', docs, time.perf_counter() - start,
+                 len(liquid_inputs))
+
+    # The toctree step only runs with -D build_toctree=1, so time it separately
+    hits = [docname for docname, text in sources.items() if 'RTD-TOC-START' in text]
+    start = time.perf_counter()
+    for docname in hits:
+        conf.uncomment_toctrees(app, docname, [sources[docname]])
+    recorder.add('hook', 'conf.uncomment_toctrees', docs, time.perf_counter() - start, len(hits))
+
+    app.source_pipeline = ['utf16le', 'add_orphan_directive', 'latex_block_to_inline', 'render_liquid']
+    start = time.perf_counter()
+    for docname, text in sources.items():
+        conf.preprocess_source(app, docname, [text])
+    recorder.add('hook', 'conf.preprocess_source (all steps)', docs, time.perf_counter() - start, docs)
+    return {docname: source[0] for docname, source in texts.items()}
+
+
+def toc_env(srcdir, corpus, sources):
+    """Build the env attributes the TOC code reads, as collected during a real read."""
+    env = SimpleNamespace(
+        srcdir=srcdir,
+        found_docs=set(corpus),
+        doc2path=lambda docname: os.path.join(srcdir, corpus[docname][0]),
+        app=SimpleNamespace(builder=SimpleNamespace(get_target_uri=lambda docname: docname + '.html')),
+    )
+    app = SimpleNamespace(env=env)
+    for docname, text in sources.items():
+        generate_toc_html.collect_commented_toctree(app, docname, [text])
+        entry = generate_toc_html.get_toc_index(env)[docname]
+        entry['title'] = next((line[2:] for line in text.splitlines() if line.startswith('# ')), None)
+        entry['toctrees'] = []
+    root = generate_toc_html.get_toc_index(env)['index']
+    root['title'] = 'Synthetic Docs'
+    root['toctrees'] = [{'caption': 'Sections', 'maxdepth': 1,
+                         'entries': [(None, child) for child in corpus['index'][1]]}]
+    return env
+
+
+def bench_toc(recorder, srcdir, corpus, sources):
+    docs = len(corpus)
+    app = SimpleNamespace(env=SimpleNamespace())
+    start = time.perf_counter()
+    for docname, text in sources.items():
+        generate_toc_html.collect_commented_toctree(app, docname, [text])
+    recorder.add('hook', 'generate_toc_html.collect_commented_toctree', docs,
+                 time.perf_counter() - start, docs)
+
+    env = toc_env(srcdir, corpus, sources)
+    sections, elapsed = timed(generate_toc_html.process_document, env, 'index')
+    recorder.add('hook', 'generate_toc_html.process_document', docs, elapsed, docs)
+
+    _, elapsed = timed(generate_toc_html.render_toc_html_from_doctree, sections)
+    recorder.add('hook', 'generate_toc_html.render (full)', docs, elapsed)
+    fragment_cache = {}
+    generate_toc_html.render_toc_html_from_doctree(sections, fragment_cache=fragment_cache)
+    _, elapsed = timed(lambda: generate_toc_html.render_toc_html_from_doctree(
+        sections, fragment_cache=fragment_cache))
+    recorder.add('hook', 'generate_toc_html.render (cached fragments)', docs, elapsed, len(fragment_cache))
+
+    index, elapsed = timed(generate_search_index.build_search_index, sections, {})
+    recorder.add('hook', 'generate_search_index.build_search_index', docs, elapsed, len(index['docs']))
+
+
+def synthetic_page(i, links):
+    body = '</li><li>'.join(HTML_LINKS[j % len(HTML_LINKS)].format(i=j) for j in range(links))
+    return f'<!DOCTYPE html>\n<html><body><p>Page {i}</p><ul><li>{body}</li></ul></body></html>\n'
+
+
+def bench_fix_links(recorder, docs, links, workdir):
+    htmldir = os.path.join(workdir, 'html')
+    os.makedirs(htmldir, exist_ok=True)
+    paths = []
+    for i in range(docs):
+        path = os.path.join(htmldir, f'p{i}.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(synthetic_page(i, max(links, 1) * 3))
+        paths.append(path)
+
+    for workers in (1, 0):
+        # Rewrite the originals each round so every file needs fixing
+        for i, path in enumerate(paths):
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(synthetic_page(i, max(links, 1) * 3))
+        results, elapsed, _ = map_files(fix_links.fix_html_file, paths, workers)
+        label = f'workers={workers}' if workers else 'workers=auto'
+        recorder.add('hook', f'fix_links.post_process ({label})', docs, elapsed, results.count('fixed'))
+
+    references = []
+    for i in range(docs * max(links, 1)):
+        references.append(nodes.reference('', '', refid=f'external/slang/docs/missing-{i}.html#overview'))
+        references.append(nodes.reference('', '', refuri=f'https://example.com/search?q=slang&amp;page={i}'))
+        references.append(nodes.reference('', '', refuri=f'../d{i}/p{i}.html#section-1'))
+    start = time.perf_counter()
+    fixed = sum(fix_links.fix_reference(node) for node in references)
+    recorder.add('hook', 'fix_links.fix_reference (transform)', docs, time.perf_counter() - start, fixed)
+
+
+def sphinx_build(srcdir, outdir, extra=()):
+    command = [sys.executable, '-m', 'sphinx', '-q', '-b', 'html', '-c', DOCS_DIR,
+               srcdir, outdir, *extra]
+    start = time.perf_counter()
+    result = subprocess.run(command, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.exit(f"sphinx-build failed:\n{result.stderr[-2000:]}")
+    return elapsed
+
+
+def bench_build(recorder, srcdir, docs, workdir, jobs):
+    outdir = os.path.join(workdir, f'build{jobs}')
+    extra = ['-j', jobs] if jobs else []
+    label = f' (-j {jobs})' if jobs else ''
+    recorder.add('build', f'sphinx-build full{label}', docs, sphinx_build(srcdir, outdir, extra))
+    recorder.add('build', f'sphinx-build no-op rebuild{label}', docs, sphinx_build(srcdir, outdir, extra))
+
+
+def show(path):
+    """Print the latest result per commit for every benchmark and size."""
+    latest = {}
+    commits = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            result = json.loads(line)
+            if result['commit'] not in commits:
+                commits.append(result['commit'])
+            latest[(result['name'], result['docs'], result['commit'])] = result['seconds']
+    names = sorted({(name, docs) for name, docs, _ in latest}, key=lambda key: (key[0], key[1]))
+    print(f"{'benchmark':<52} {'docs':>6} " + ' '.join(f'{commit:>14}' for commit in commits))
+    for name, docs in names:
+        cells = []
+        for commit in commits:
+            seconds = latest.get((name, docs, commit))
+            cells.append(f'{seconds * 1000:12.1f}ms' if seconds is not None else f'{"-":>14}')
+        print(f"{name:<52} {docs:>6} " + ' '.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='100,1000,10000',
+                        help='comma separated corpus sizes in documents')
+    parser.add_argument('--hooks-only', action='store_true', help='skip the sphinx-build runs')
+    parser.add_argument('--jobs', default='',
+                        help='comma separated -j values to build with, e.g. 1,auto (default: no -j)')
+    parser.add_argument('--results', default=RESULTS_PATH,
+                        help='JSON lines file the results are appended to ("" to not record)')
+    parser.add_argument('--show', action='store_true', help='print recorded results per commit and exit')
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    if args.show:
+        show(args.results)
+        return
+
+    recorder = Recorder(args.results)
+    print(f"Commit {recorder.common['commit']}, Sphinx {sphinx.__version__}")
+    for docs in [int(size) for size in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory() as workdir:
+            srcdir = os.path.join(workdir, 'src')
+            corpus = generate_corpus(srcdir, docs, args.depth, args.math, args.liquid,
+                                     args.links, args.utf16, args.seed)
+            print(f"{docs} documents:")
+            sources = bench_preprocessing(recorder, srcdir, corpus, os.path.join(workdir, 'doctrees'))
+            bench_toc(recorder, srcdir, corpus, sources)
+            bench_fix_links(recorder, docs, args.links, workdir)
+            if not args.hooks_only:
+                # Sphinx 9 can't decode UTF-16 sources at all, so build without them
+                shutil.rmtree(srcdir)
+                generate_corpus(srcdir, docs, args.depth, args.math, args.liquid,
+                                args.links, 0, args.seed)
+                for jobs in args.jobs.split(',') if args.jobs else ['']:
+                    bench_build(recorder, srcdir, docs, workdir, jobs)
+
+
+if __name__ == '__main__':
+    main()
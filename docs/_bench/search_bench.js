@@ -0,0 +1,125 @@
+// Times the two search paths of _static/search.js on a synthetic TOC.
+// Run through search_bench.py, which generates the payload:
+//     node search_bench.js payload.json ../_static/search.js
+//
+// The TOC is built with a minimal DOM shim that supports exactly what the DOM
+// walk uses, so absolute numbers are lower than in a browser; the comparison
+// between the two paths is what matters.
+'use strict';
+
+const fs = require('fs');
+const vm = require('vm');
+
+const [payloadPath, searchJsPath] = process.argv.slice(2);
+const payload = JSON.parse(fs.readFileSync(payloadPath, 'utf-8'));
+
+class Element {
+    constructor(tagName, className, text) {
+        this.tagName = tagName;
+        this.className = className || '';
+        const classes = this.className.split(/\s+/);
+        this.classList = { contains: name => classes.includes(name) };
+        this.children = [];
+        this.parentElement = null;
+        this.text = text || '';
+        this.attributes = {};
+    }
+
+    append(child) {
+        child.parentElement = this;
+        this.children.push(child);
+        return child;
+    }
+
+    get textContent() {
+        return this.text + this.children.map(child => child.textContent).join('');
+    }
+
+    getAttribute(name) {
+        return this.attributes[name];
+    }
+
+    // Only 'a.reference.internal' is used by the search code
+    querySelector(selector) {
+        for (const child of this.children) {
+            if (child.tagName === 'A' && child.classList.contains('reference') && child.classList.contains('internal')) {
+                return child;
+            }
+            const found = child.querySelector(selector);
+            if (found) return found;
+        }
+        return null;
+    }
+}
+
+// Build div.sidebar-tree > ul > li.toctree-lN > (a, ul > li ...) like render_entry does
+const internalLinks = [];
+function buildEntries(ul, sections, level) {
+    for (const [, entries] of sections) {
+        for (const entry of entries) {
+            const li = ul.append(new Element('LI', `toctree-l${level}` + (entry.children.length ? ' has-children' : '')));
+            const external = /^(https?:|mailto:)/.test(entry.link);
+            const a = li.append(new Element('A', external ? 'reference external' : 'reference internal', entry.title));
+            a.attributes.href = entry.link;
+            if (!external) internalLinks.push(a);
+            if (entry.children.length) {
+                buildEntries(li.append(new Element('UL')), entry.children, level + 1);
+            }
+        }
+    }
+}
+const tree = new Element('DIV', 'sidebar-tree');
+buildEntries(tree.append(new Element('UL')), payload.sections, 1);
+
+const noop = () => {};
+const context = {
+    console,
+    URL,
+    Set,
+    document: {
+        getElementById: () => null,
+        currentScript: null,
+        addEventListener: noop,
+        querySelectorAll: () => internalLinks,
+    },
+    window: { addEventListener: noop },
+};
+vm.createContext(context);
+vm.runInContext(fs.readFileSync(searchJsPath, 'utf-8'), context);
+
+function tokenize(searchText) {
+    // Same tokenization as txtSearchChange
+    return searchText.toLowerCase().split(/[\\.:,\s]+/).filter(t => t.length > 0);
+}
+
+function timeQuery(fn, searchText, iterations) {
+    const tokens = tokenize(searchText);
+    let results = fn(searchText, tokens).results.length;
+    const start = process.hrtime.bigint();
+    for (let i = 0; i < iterations; i++) {
+        fn(searchText, tokens);
+    }
+    const elapsed = Number(process.hrtime.bigint() - start) / 1e6;
+    return { ms: elapsed / iterations, results };
+}
+
+const queries = ['sample', 'type1x3.load', 'gather', 'interlockedadd', 'normalize', 'types', 'nomatch'];
+const domSearch = (text, tokens) => context.searchTocDom(text, tokens);
+const indexSearch = (text, tokens) => context.searchTocIndex(payload.index, text, tokens);
+
+console.log(`Internal links in TOC: ${internalLinks.length}`);
+console.log('query'.padEnd(18) + 'DOM walk (ms)'.padStart(15) + 'index (ms)'.padStart(13) +
+            'speedup'.padStart(10) + 'results dom/index'.padStart(20));
+let domTotal = 0;
+let indexTotal = 0;
+for (const query of queries) {
+    const dom = timeQuery(domSearch, query, 20);
+    const index = timeQuery(indexSearch, query, 200);
+    domTotal += dom.ms;
+    indexTotal += index.ms;
+    console.log(query.padEnd(18) + dom.ms.toFixed(3).padStart(15) + index.ms.toFixed(3).padStart(13) +
+                (dom.ms / index.ms).toFixed(1).padStart(9) + 'x' +
+                `${dom.results}/${index.results}`.padStart(20));
+}
+console.log(`mean per query: DOM walk ${(domTotal / queries.length).toFixed(3)} ms, ` +
+            `index ${(indexTotal / queries.length).toFixed(3)} ms`);
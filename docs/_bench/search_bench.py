@@ -0,0 +1,88 @@
+"""
+Benchmark the sidebar search: prebuilt index lookup vs. the TOC DOM walk.
+
+Builds a synthetic navigation tree shaped like the core module reference
+(categories > types > members), serializes it together with the index that
+the generate_search_index extension would produce, and runs
+search_bench.js under node to time both code paths in _static/search.js.
+
+Usage (from docs/):
+    python _bench/search_bench.py [--entries 5000] [--budget 1048576]
+"""
+import argparse
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+DOCS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DOCS_DIR)
+
+from _ext.generate_search_index import build_search_index  # noqa: E402
+
+CATEGORIES = ['Types', 'Interfaces', 'Global Functions']
+MEMBERS = ['Sample', 'SampleLevel', 'SampleGrad', 'Load', 'Store', 'GetDimensions',
+           'Gather', 'GatherRed', 'InterlockedAdd', 'InterlockedMax', 'operator[]',
+           'init', 'get', 'set', 'subscript', 'dot', 'cross', 'length', 'normalize',
+           'lerp', 'clamp', 'saturate', 'abs', 'min', 'max', 'pow', 'exp', 'log']
+
+
+def synthetic_sections(entries):
+    """Return a sections tree with roughly the requested number of entries."""
+    types_per_category = max(1, int((entries / len(CATEGORIES)) ** 0.5))
+    members_per_type = max(1, entries // (len(CATEGORIES) * types_per_category) - 1)
+    categories = []
+    for c, category in enumerate(CATEGORIES):
+        types = []
+        for t in range(types_per_category):
+            name = f'Type{c}x{t}'
+            members = [{
+                'title': MEMBERS[m % len(MEMBERS)] + (str(m // len(MEMBERS)) if m >= len(MEMBERS) else ''),
+                'link': f'../ref/{name}/m{m}.html',
+                'docname': f'ref/{name}/m{m}',
+                'children': [],
+            } for m in range(members_per_type)]
+            types.append({'title': name, 'link': f'../ref/{name}/index.html',
+                          'docname': f'ref/{name}/index', 'children': [(None, members)]})
+        categories.append({'title': category, 'link': f'../ref/c{c}.html',
+                           'docname': f'ref/c{c}', 'children': [(None, types)]})
+    reference = {'title': 'Standard Modules Reference', 'link': '../ref/index.html',
+                 'docname': 'ref/index', 'children': [(None, categories)]}
+    return [('Overview', [reference])]
+
+
+def count_entries(sections):
+    return sum(1 + count_entries(entry['children'])
+               for _, entries in sections for entry in entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--entries', type=int, default=5000)
+    parser.add_argument('--budget', type=int, default=1024 * 1024,
+                        help='fail if the serialized index is larger than this many bytes')
+    args = parser.parse_args()
+
+    sections = synthetic_sections(args.entries)
+    index = build_search_index(sections, {})
+    data = json.dumps(index, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    print(f"TOC entries: {count_entries(sections)}, index rows: {len(index['docs'])}, "
+          f"terms: {len(index['terms'])}")
+    print(f"Index size: {len(data)} bytes ({len(gzip.compress(data, 9))} gzipped), "
+          f"budget {args.budget} bytes")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        payload = os.path.join(tmp, 'payload.json')
+        with open(payload, 'w', encoding='utf-8') as f:
+            json.dump({'sections': sections, 'index': index}, f)
+        subprocess.run(['node', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'search_bench.js'),
+                        payload, os.path.join(DOCS_DIR, '_static', 'search.js')], check=True)
+
+    if len(data) > args.budget:
+        sys.exit(f"Index exceeds the size budget by {len(data) - args.budget} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Measure save-to-reload latency of the dev server (_ext/serve.py).
+
+Copies the docs to a temporary directory, starts the server on a free port
+and connects to its event stream the way an open page does. Then appends a
+line to a page --edits times and, for each edit, times how long it takes
+until the reload event arrives: debouncing, the incremental build (reading
+and writing the page, the build-finished passes) and the notification.
+
+Usage (from docs/):
+    python _bench/serve_bench.py [--page first-slang-shader.md] [--edits 10] [--poll]
+"""
+import argparse
+import http.client
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+DOCS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DOCS_DIR)
+
+from _ext.serve import EVENTS_PATH, RELOAD_SCRIPT, DevServer  # noqa: E402
+
+
+class EventClient(threading.Thread):
+    """Reads the event stream and records when each reload arrives."""
+
+    def __init__(self, host, port):
+        super().__init__(daemon=True)
+        self.connection = http.client.HTTPConnection(host, port)
+        self.reloads = []
+        self.ready = threading.Event()
+        self.received = threading.Event()
+
+    def run(self):
+        self.connection.request('GET', EVENTS_PATH)
+        response = self.connection.getresponse()
+        self.ready.set()
+        while True:
+            line = response.fp.readline()
+            if not line:
+                return
+            if line.startswith(b'data: reload'):
+                self.reloads.append(time.perf_counter())
+                self.received.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--page', default='first-slang-shader.md')
+    parser.add_argument('--edits', type=int, default=10)
+    parser.add_argument('--poll', action='store_true', help='use the polling watcher')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        srcdir = os.path.join(root, 'docs')
+        shutil.copytree(DOCS_DIR, srcdir, ignore=shutil.ignore_patterns('_build', '__pycache__'))
+        server = DevServer(srcdir, os.path.join(srcdir, '_build', 'serve'), port=0, poll=args.poll,
+                           interval=0.05)
+        start = time.perf_counter()
+        if not server.build():
+            sys.exit('initial build failed')
+        print(f"initial build: {time.perf_counter() - start:.2f}s, {server.counter.read} documents read, "
+              f"watching with {type(server.watcher).__name__}")
+
+        stop = threading.Event()
+        loop = threading.Thread(target=server.serve_forever, args=(stop,), daemon=True)
+        loop.start()
+        host, port = server.httpd.server_address[:2]
+        page = http.client.HTTPConnection(host, port)
+        page.request('GET', '/' + os.path.splitext(args.page)[0] + '.html')
+        if RELOAD_SCRIPT.encode('utf-8') not in page.getresponse().read():
+            sys.exit('reload script missing from the served page')
+        client = EventClient(host, port)
+        client.start()
+        client.ready.wait(5)
+
+        latencies = []
+        path = os.path.join(srcdir, args.page)
+        for i in range(args.edits):
+            client.received.clear()
+            saved = time.perf_counter()
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(f'\nEdit {i}.\n')
+            if not client.received.wait(30):
+                sys.exit(f'no reload after edit {i}')
+            latencies.append(client.reloads[-1] - saved)
+            # Let the watcher settle so the next save is a separate change
+            time.sleep(0.2)
+        stop.set()
+        loop.join(5)
+
+    print(f"save to reload over {len(latencies)} edits of {args.page}: "
+          f"median {statistics.median(latencies) * 1000:.0f} ms, "
+          f"max {max(latencies) * 1000:.0f} ms, min {min(latencies) * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,410 @@
+"""
+Custom Sphinx extension that caches the doc trees of the git submodules.
+
+Most of the pages live in the submodules below ``external/``, and they only
+change when a submodule moves. A fresh checkout (every CI run) still reads
+and writes all of them. With ``build_cache_dir`` set, each HTML build
+stores, for every submodule tree, what reading and writing its documents
+produced: the doctrees, the pages and their ``_sources``, the tree's
+subtrees of ``toc.html`` and the environment they were read into. Entries
+are keyed on the submodule's commit plus a digest of the env/html config
+values, the Sphinx and extension versions and the code in ``_ext`` and
+``_templates``.
+
+When a build starts with an environment that doesn't know a tree's
+documents and the cache has the entry for its key, the entry is restored:
+the documents' environment data is merged the way a parallel read merges
+it, and their doctrees and pages are copied into the build, so Sphinx
+neither reads nor writes them. Should the navigation (toctrees and titles)
+differ from the one the pages were written with, the pages are written
+again from the restored doctrees, still without reading the sources.
+
+A tree with uncommitted changes is neither restored nor stored. The cache
+is a plain directory; CI keeps it between runs with a cache step.
+"""
+import hashlib
+import json
+import os
+import pickle
+import re
+import shutil
+import subprocess
+import time
+import sphinx
+from sphinx.util import logging
+
+from . import generate_llms_txt
+from .generate_toc_html import get_toc_index, load_fragment_cache, save_fragment_cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+META_NAME = 'meta.json'
+FRAGMENTS_NAME = 'toc_fragments.pickle'
+# Environment pickles, shared by the entries stored by the same build
+ENV_DIR = 'envs'
+
+# Config values in these rebuild categories change what is read or written
+KEY_CATEGORIES = ('env', 'html')
+# Object reprs carry their address, which differs between runs
+ADDRESS_PATTERN = re.compile(r' at 0x[0-9a-fA-F]+')
+
+
+def run_git(cwd, *args):
+    """Return the stripped output of a git command, or None if it fails."""
+    try:
+        result = subprocess.run(['git', *args], cwd=cwd, capture_output=True, text=True, check=False)
+    except OSError:
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def find_trees(srcdir):
+    """Return the checked out submodules below srcdir, relative to it."""
+    trees = []
+    # Paths are printed relative to the working directory
+    for line in (run_git(srcdir, 'submodule', 'status') or '').splitlines():
+        fields = line[1:].split()
+        if line.startswith('-') or len(fields) < 2 or fields[1].startswith('../'):
+            continue
+        trees.append(fields[1])
+    return trees
+
+
+def tree_commit(path):
+    """Return the commit checked out at path, or None if it has local changes or isn't a checkout."""
+    toplevel = run_git(path, 'rev-parse', '--show-toplevel')
+    if toplevel is None or os.path.realpath(toplevel) != os.path.realpath(path):
+        return None
+    if run_git(path, 'status', '--porcelain') != '':
+        return None
+    return run_git(path, 'rev-parse', 'HEAD')
+
+
+def stable_repr(value):
+    """repr() that doesn't depend on set order or object addresses."""
+    if isinstance(value, dict):
+        items = sorted(f'{stable_repr(key)}: {stable_repr(item)}' for key, item in value.items())
+        return '{' + ', '.join(items) + '}'
+    if isinstance(value, (list, tuple)):
+        return '[' + ', '.join(stable_repr(item) for item in value) + ']'
+    if isinstance(value, (set, frozenset)):
+        return '{' + ', '.join(sorted(stable_repr(item) for item in value)) + '}'
+    if callable(value) and hasattr(value, '__qualname__'):
+        return f'{getattr(value, "__module__", None)}.{value.__qualname__}'
+    return ADDRESS_PATTERN.sub('', repr(value))
+
+
+def code_files(app):
+    """The files of our extensions and templates, which shape every page."""
+    dirs = [os.path.dirname(os.path.abspath(__file__))]
+    dirs += [os.path.join(app.confdir, path) for path in app.config.templates_path]
+    for base in dirs:
+        for root, dirnames, filenames in os.walk(base):
+            dirnames[:] = sorted(name for name in dirnames if name != '__pycache__')
+            for name in sorted(filenames):
+                if not name.endswith('.pyc'):
+                    yield os.path.join(root, name)
+
+
+def build_digest(app):
+    """Hash everything besides the sources that decides what reading and writing produce."""
+    digest = hashlib.sha256(f'{CACHE_VERSION} {sphinx.__display_version__} {app.builder.name}\n'.encode('utf-8'))
+    for item in sorted(app.config, key=lambda item: item.name):
+        if item.rebuild in KEY_CATEGORIES:
+            digest.update(f'{item.name}={stable_repr(item.value)}\n'.encode('utf-8'))
+    for name, extension in sorted(app.extensions.items()):
+        digest.update(f'{name} {extension.version}\n'.encode('utf-8'))
+    for path in code_files(app):
+        digest.update(os.path.relpath(path, app.confdir).encode('utf-8'))
+        with open(path, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def navigation_digest(env):
+    """Hash what pages show of the rest of the site: the toctrees and the titles."""
+    inputs = {
+        'toctrees': {docname: list(includes) for docname, includes in env.toctree_includes.items()},
+        'titles': {docname: title.astext() for docname, title in env.titles.items()},
+        'toc_html': get_toc_index(env),
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def cache_dir(app):
+    # Relative paths are taken from the directory of conf.py
+    return os.path.join(app.confdir, app.config.build_cache_dir)
+
+
+def entry_path(app, tree, key):
+    return os.path.join(cache_dir(app), tree.replace('/', '--'), key)
+
+
+def load_meta(entry):
+    try:
+        with open(os.path.join(entry, META_NAME), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == CACHE_VERSION else None
+
+
+def copy_tree(src, dst):
+    """Copy the files below src into dst; copies get the current time, so Sphinx sees them as new."""
+    if os.path.isdir(src):
+        shutil.copytree(src, dst, copy_function=shutil.copyfile, dirs_exist_ok=True)
+
+
+def cache_enabled(app):
+    return bool(app.config.build_cache_dir) and app.builder.name == 'html'
+
+
+def restore_trees(app):
+    """Restore the cached trees the environment doesn't have yet."""
+    app.build_cache_trees = {}
+    app.build_cache_restored = set()
+    if not cache_enabled(app):
+        return
+    start = time.perf_counter()
+    env = app.env
+    digest = build_digest(app)
+    envs = {}
+    for tree in app.config.build_cache_trees or find_trees(app.srcdir):
+        docnames = sorted(docname for docname in env.found_docs if docname.startswith(tree + '/'))
+        if not docnames:
+            continue
+        commit = tree_commit(os.path.join(app.srcdir, tree))
+        if commit is None:
+            logger.info(f"Build cache: {tree} has local changes or is not a checkout, not cached")
+            continue
+        key = hashlib.sha256(f'{commit}\n{digest}'.encode('utf-8')).hexdigest()[:20]
+        state = app.build_cache_trees[tree] = {'key': key, 'docnames': docnames, 'navigation': None}
+        # Documents the environment already has are left to Sphinx's own checks
+        if any(docname in env.all_docs for docname in docnames):
+            continue
+        entry = entry_path(app, tree, key)
+        meta = load_meta(entry)
+        if meta is None or meta['docnames'] != docnames:
+            logger.info(f"Build cache: no entry for {tree} at {commit[:12]}")
+            continue
+        if meta['env'] not in envs:
+            with open(os.path.join(cache_dir(app), ENV_DIR, meta['env']), 'rb') as f:
+                envs[meta['env']] = pickle.load(f)
+        if restore_entry(app, entry, meta, envs[meta['env']]):
+            state['navigation'] = meta['navigation']
+            app.build_cache_restored.update(docnames)
+            logger.info(f"Build cache: restored {len(docnames)} documents of {tree} at {commit[:12]}")
+    if app.build_cache_restored:
+        logger.info(f"Build cache: restored {len(app.build_cache_restored)} documents "
+                    f"in {time.perf_counter() - start:.2f}s")
+
+
+def restore_entry(app, entry, meta, other):
+    """Merge an entry into the build; returns False, undoing the merge, if its images got other names."""
+    env = app.env
+    docnames = meta['docnames']
+    env.merge_info_from(docnames, other, app)
+    # The pages refer to images by the names they had in the cached build
+    if any(env.images[filename][1] != uniquename for filename, uniquename in meta['images'].items()):
+        logger.info(f"Build cache: image names of {meta['tree']} differ from the cached build, reading it")
+        for docname in docnames:
+            app.events.emit('env-purge-doc', env, docname)
+            env.clear_doc(docname)
+        return False
+    # As if read just now, so the next incremental build sees them as up to date
+    now = time.time_ns() // 1_000
+    for docname in docnames:
+        env.all_docs[docname] = now
+    app.builder.images.update(meta['images'])
+
+    copy_tree(os.path.join(entry, 'doctrees'), str(app.doctreedir))
+    copy_tree(os.path.join(entry, 'html'), str(app.outdir))
+    try:
+        with open(os.path.join(entry, FRAGMENTS_NAME), 'rb') as f:
+            fragments = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        fragments = {}
+    if fragments:
+        fragment_cache = load_fragment_cache(app)
+        for docname, fragment in fragments.items():
+            fragment_cache.setdefault(docname, fragment)
+        save_fragment_cache(app, fragment_cache, env.found_docs)
+    return True
+
+
+def skip_restored_docs(app, env, docnames):
+    """Keep restored documents out of the list Sphinx is about to read."""
+    restored = getattr(app, 'build_cache_restored', None)
+    if restored:
+        docnames[:] = [docname for docname in docnames if docname not in restored]
+
+
+def check_navigation(app, env):
+    """Have restored pages written again if the navigation changed since they were cached."""
+    if not getattr(app, 'build_cache_trees', None):
+        return None
+    navigation = app.build_cache_navigation = navigation_digest(env)
+    stale = []
+    for tree, state in app.build_cache_trees.items():
+        if state['navigation'] and state['navigation'] != navigation:
+            logger.info(f"Build cache: navigation changed, writing the {len(state['docnames'])} pages of {tree}")
+            stale.extend(state['docnames'])
+    app.build_cache_rewritten = set(stale)
+    return stale
+
+
+def index_restored_docs(app, builder):
+    """
+    Add the restored documents to searchindex.js.
+
+    The search index is fed while pages are written; Sphinx keeps the
+    entries of documents it doesn't write from the searchindex.js on disk,
+    so the restored documents are fed into that file before writing starts.
+    """
+    restored = getattr(app, 'build_cache_restored', set())
+    docnames = sorted(restored - getattr(app, 'build_cache_rewritten', set()))
+    if not docnames or not getattr(builder, 'search', False):
+        return
+    from sphinx.search import IndexBuilder
+
+    start = time.perf_counter()
+    env = builder.env
+    lang = builder.config.html_search_language or builder.config.language
+    builder.indexer = IndexBuilder(env, lang, builder.config.html_search_options, builder.config.html_search_scorer)
+    if os.path.isfile(os.path.join(builder.outdir, builder.searchindex_filename)):
+        builder.load_indexer(set())
+    for docname in docnames:
+        title = env.longtitles.get(docname)
+        doctree = env.get_and_resolve_doctree(docname, builder)
+        builder.index_page(docname, doctree, title.astext() if title else '')
+    builder.dump_search_index()
+    builder.indexer = None
+    logger.info(f"Build cache: indexed {len(docnames)} restored documents for search "
+                f"in {time.perf_counter() - start:.2f}s")
+
+
+def store_trees(app, exception):
+    """Store the trees that have no entry for their key, or one written with another navigation."""
+    if exception or not getattr(app, 'build_cache_trees', None):
+        return
+    start = time.perf_counter()
+    env = app.env
+    navigation = getattr(app, 'build_cache_navigation', None) or navigation_digest(env)
+    stored = []
+    env_name = None
+    for tree, state in app.build_cache_trees.items():
+        entry = entry_path(app, tree, state['key'])
+        meta = load_meta(entry)
+        if meta is not None and meta['navigation'] == navigation:
+            continue
+        docnames = state['docnames']
+        if not all(os.path.isfile(os.path.join(app.doctreedir, docname + '.doctree')) and
+                   os.path.isfile(app.builder.get_outfilename(docname)) for docname in docnames):
+            logger.info(f"Build cache: {tree} wasn't built completely, not stored")
+            continue
+        if env_name is None:
+            env_name = store_environment(app)
+        store_entry(app, tree, entry, {
+            'version': CACHE_VERSION,
+            'tree': tree,
+            'key': state['key'],
+            'docnames': docnames,
+            'navigation': navigation,
+            'env': env_name,
+            'images': {filename: uniquename for filename, (owners, uniquename) in env.images.items()
+                       if not owners.isdisjoint(docnames)},
+            'stored': time.time(),
+        })
+        prune_entries(os.path.dirname(entry), app.config.build_cache_keep)
+        stored.append(tree)
+    if stored:
+        prune_environments(cache_dir(app))
+        logger.info(f"Build cache: stored {', '.join(stored)} in {time.perf_counter() - start:.2f}s")
+
+
+def store_environment(app):
+    """Copy the environment Sphinx pickled after reading into the cache, named by its hash."""
+    path = os.path.join(app.doctreedir, 'environment.pickle')
+    with open(path, 'rb') as f:
+        name = hashlib.sha256(f.read()).hexdigest()[:20] + '.pickle'
+    target = os.path.join(cache_dir(app), ENV_DIR, name)
+    if not os.path.isfile(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(path, target + '.tmp')
+        os.replace(target + '.tmp', target)
+    return name
+
+
+def store_entry(app, tree, entry, meta):
+    tmp = f'{entry}.tmp{os.getpid()}'
+    shutil.rmtree(tmp, ignore_errors=True)
+    outdir = str(app.outdir)
+    copy_tree(os.path.join(app.doctreedir, tree), os.path.join(tmp, 'doctrees', tree))
+    copy_tree(os.path.join(outdir, tree), os.path.join(tmp, 'html', tree))
+    copy_tree(os.path.join(outdir, '_sources', tree), os.path.join(tmp, 'html', '_sources', tree))
+    docnames = set(meta['docnames'])
+    fragments = {docname: fragment for docname, fragment in load_fragment_cache(app).items()
+                 if docname in docnames}
+    with open(os.path.join(tmp, FRAGMENTS_NAME), 'wb') as f:
+        pickle.dump(fragments, f, pickle.HIGHEST_PROTOCOL)
+    # The extracted texts llms-full.txt is assembled from; restored with the doctrees
+    text_dir = os.path.join(tmp, 'doctrees', generate_llms_txt.CACHE_DIR)
+    for docname, digest in generate_llms_txt.get_hash_index(app.env).items():
+        if docname in docnames:
+            os.makedirs(text_dir, exist_ok=True)
+            try:
+                shutil.copyfile(generate_llms_txt.cache_path(app, digest), os.path.join(text_dir, digest + '.md'))
+            except OSError:
+                pass
+    with open(os.path.join(tmp, META_NAME), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=1, sort_keys=True)
+    shutil.rmtree(entry, ignore_errors=True)
+    os.replace(tmp, entry)
+
+
+def prune_entries(tree_dir, keep):
+    """Keep the keep most recently stored entries of a tree."""
+    entries = []
+    for name in os.listdir(tree_dir):
+        meta = load_meta(os.path.join(tree_dir, name))
+        entries.append((meta['stored'] if meta else 0, name))
+    for _, name in sorted(entries, reverse=True)[keep:]:
+        shutil.rmtree(os.path.join(tree_dir, name), ignore_errors=True)
+
+
+def prune_environments(cache_dir):
+    """Delete the environment pickles no entry refers to any more."""
+    used = set()
+    for tree_name in os.listdir(cache_dir):
+        if tree_name == ENV_DIR or not os.path.isdir(os.path.join(cache_dir, tree_name)):
+            continue
+        for name in os.listdir(os.path.join(cache_dir, tree_name)):
+            meta = load_meta(os.path.join(cache_dir, tree_name, name))
+            if meta:
+                used.add(meta['env'])
+    for name in os.listdir(os.path.join(cache_dir, ENV_DIR)):
+        if name not in used:
+            os.remove(os.path.join(cache_dir, ENV_DIR, name))
+
+
+def setup(app):
+    # Directory of the cache of submodule trees, relative to conf.py; empty disables it
+    app.add_config_value('build_cache_dir', '', '', [str])
+    # Trees to cache, relative to the source dir; empty means every submodule below it
+    app.add_config_value('build_cache_trees', [], '', [list])
+    # Entries kept per tree (e.g. one for main and one for a PR's submodule bump)
+    app.add_config_value('build_cache_keep', 2, '', [int])
+
+    app.connect('builder-inited', restore_trees)
+    app.connect('env-before-read-docs', skip_restored_docs)
+    app.connect('env-updated', check_navigation)
+    app.connect('write-started', index_restored_docs)
+    # After every pass that rewrites the pages, so entries hold them as served
+    app.connect('build-finished', store_trees, priority=950)
+
+    return {
+        'version': '0.1',
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
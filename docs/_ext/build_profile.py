@@ -0,0 +1,279 @@
+"""
+Custom Sphinx extension that profiles our own build hooks.
+
+When ``build_profile`` is enabled (``sphinx-build -D build_profile=1``), every
+event handler and post-transform registered from conf.py or ``_ext`` is
+wrapped to record wall time, call count and the size of the source or page
+body it was given, per handler and per docname. At the end of the build a
+JSON report is written (by default ``build_profile.json`` in the doctree dir)
+and the slowest handlers and documents are logged.
+
+The report is written with sorted keys, one value per line, so two reports
+diff cleanly. To compare two builds, e.g. in CI::
+
+    python -m _ext.build_profile base.json head.json --threshold 0.2
+
+Handlers running in parallel write workers (``-j`` with the HTML writer) are
+not counted; handlers in parallel read workers are merged back via the env.
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+import time
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+REPORT_NAME = 'build_profile.json'
+REPORT_VERSION = 1
+
+
+def new_records():
+    return {'handlers': {}, 'docs': {}}
+
+
+def merge_records(records, other):
+    """Add the counters of other into records."""
+    for section in ('handlers', 'docs'):
+        for key, stats in other[section].items():
+            target = records[section].setdefault(key, dict.fromkeys(stats, 0))
+            for field, value in stats.items():
+                if field == 'max':
+                    target[field] = max(target[field], value)
+                else:
+                    target[field] += value
+
+
+def get_records(app):
+    """Return the records of the current process."""
+    if os.getpid() == app.build_profile_pid:
+        return app.build_profile_records
+    # A parallel read worker: collect into the env, which is merged back
+    env = app.env
+    worker = getattr(env, 'build_profile_worker', None)
+    if worker is None or worker['pid'] != os.getpid():
+        worker = env.build_profile_worker = {'pid': os.getpid(), 'records': new_records()}
+    return worker['records']
+
+
+def record(app, key, docname, size, elapsed):
+    records = get_records(app)
+    stats = records['handlers'].setdefault(key, {'calls': 0, 'time': 0.0, 'max': 0.0, 'bytes': 0})
+    stats['calls'] += 1
+    stats['time'] += elapsed
+    stats['max'] = max(stats['max'], elapsed)
+    stats['bytes'] += size
+    if docname:
+        doc = records['docs'].setdefault(docname, {'calls': 0, 'time': 0.0, 'bytes': 0})
+        doc['calls'] += 1
+        doc['time'] += elapsed
+        doc['bytes'] += size
+
+
+def text_size(text):
+    return len(text.encode('utf-8')) if isinstance(text, str) else 0
+
+
+def event_input(app, event, args):
+    """Return (docname, size in bytes) for a handler call, where the event has them."""
+    if event == 'source-read':
+        return args[0], text_size(args[1][0])
+    if event == 'html-page-context':
+        return args[0], text_size(args[2].get('body'))
+    if event in ('doctree-resolved', 'env-purge-doc'):
+        return args[-1], 0
+    if event == 'doctree-read':
+        return app.env.docname, 0
+    return None, 0
+
+
+def handler_name(app, func):
+    """Name a handler after its file below the conf dir, e.g. _ext.fix_links.setup."""
+    code = getattr(getattr(func, '__func__', func), '__code__', None)
+    if code is None:
+        return None
+    path = os.path.abspath(code.co_filename)
+    confdir = os.path.abspath(app.confdir)
+    if not path.startswith(confdir + os.sep) or path == os.path.abspath(__file__):
+        return None
+    module = os.path.splitext(os.path.relpath(path, confdir))[0].replace(os.sep, '.')
+    return f"{module}.{func.__qualname__}"
+
+
+def wrap_handler(event, name, handler):
+    key = f"{event} {name}"
+
+    @functools.wraps(handler)
+    def profiled(app, *args):
+        docname, size = event_input(app, event, args)
+        start = time.perf_counter()
+        try:
+            return handler(app, *args)
+        finally:
+            record(app, key, docname, size, time.perf_counter() - start)
+
+    return profiled
+
+
+def wrap_transform(app, name, transform):
+    key = f"post-transform {name}"
+
+    class Profiled(transform):
+        def apply(self, **kwargs):
+            start = time.perf_counter()
+            try:
+                return super().apply(**kwargs)
+            finally:
+                record(app, key, self.env.docname, 0, time.perf_counter() - start)
+
+    Profiled.__name__ = transform.__name__
+    Profiled.__qualname__ = transform.__qualname__
+    Profiled.__module__ = transform.__module__
+    return Profiled
+
+
+def install_profiling(app, config):
+    """Wrap our handlers and post-transforms; runs once all extensions are set up."""
+    if not config.build_profile:
+        return
+    app.build_profile_pid = os.getpid()
+    app.build_profile_records = new_records()
+    app.build_profile_start = time.perf_counter()
+
+    wrapped = 0
+    for event, listeners in app.events.listeners.items():
+        for i, listener in enumerate(listeners):
+            name = handler_name(app, listener.handler)
+            if name:
+                listeners[i] = listener._replace(handler=wrap_handler(event, name, listener.handler))
+                wrapped += 1
+
+    post_transforms = app.registry.post_transforms
+    for i, transform in enumerate(post_transforms):
+        if any(handler_name(app, getattr(transform, method, None)) for method in ('apply', 'run')):
+            name = f"{transform.__module__}.{transform.__qualname__}"
+            post_transforms[i] = wrap_transform(app, name, transform)
+            wrapped += 1
+
+    logger.info(f"Build profiling enabled for {wrapped} handlers")
+
+
+def merge_worker_records(app, env, docnames, other):
+    if not getattr(app, 'build_profile_records', None):
+        return
+    worker = getattr(other, 'build_profile_worker', None)
+    if worker and worker['pid'] != app.build_profile_pid:
+        merge_records(app.build_profile_records, worker['records'])
+
+
+def build_report(app):
+    records = app.build_profile_records
+    rounded = {
+        section: {
+            key: {field: round(value, 6) if isinstance(value, float) else value
+                  for field, value in stats.items()}
+            for key, stats in records[section].items()
+        }
+        for section in ('handlers', 'docs')
+    }
+    return {
+        'version': REPORT_VERSION,
+        'builder': app.builder.name,
+        'parallel': app.parallel,
+        'wall_time': round(time.perf_counter() - app.build_profile_start, 6),
+        'handlers': rounded['handlers'],
+        'docs': rounded['docs'],
+    }
+
+
+def top(stats, count):
+    return sorted(stats.items(), key=lambda item: item[1]['time'], reverse=True)[:count]
+
+
+def write_report(app, exception):
+    if exception or not getattr(app, 'build_profile_records', None):
+        return
+    report = build_report(app)
+    path = app.config.build_profile_report or os.path.join(app.doctreedir, REPORT_NAME)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+        f.write('\n')
+
+    count = app.config.build_profile_top
+    hook_time = sum(stats['time'] for stats in report['handlers'].values())
+    logger.info(f"Build profile written to {path}: {report['wall_time']:.3f}s wall time, "
+                f"{hook_time:.3f}s in {len(report['handlers'])} profiled handlers")
+    logger.info("Slowest handlers:")
+    for key, stats in top(report['handlers'], count):
+        logger.info(f"  {stats['time']:9.3f}s {stats['calls']:6d} calls {stats['bytes']:>11d} bytes  {key}")
+    if report['docs']:
+        logger.info("Slowest documents:")
+        for docname, stats in top(report['docs'], count):
+            logger.info(f"  {stats['time']:9.3f}s {stats['calls']:6d} calls {stats['bytes']:>11d} bytes  {docname}")
+
+
+def diff_reports(base, head, threshold, min_time):
+    """Return (rows, regressions) comparing handler times of two reports."""
+    rows = []
+    regressions = []
+    for key in sorted(set(base['handlers']) | set(head['handlers'])):
+        before = base['handlers'].get(key, {}).get('time', 0.0)
+        after = head['handlers'].get(key, {}).get('time', 0.0)
+        delta = after - before
+        ratio = delta / before if before else float('inf') if after else 0.0
+        rows.append((key, before, after, delta, ratio))
+        if delta > min_time and ratio > threshold:
+            regressions.append(key)
+    rows.sort(key=lambda row: abs(row[3]), reverse=True)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare two build profile reports.')
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative slowdown of a handler that counts as a regression')
+    parser.add_argument('--min-time', type=float, default=0.05,
+                        help='ignore handlers that got slower by less than this many seconds')
+    args = parser.parse_args(argv)
+
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.head, encoding='utf-8') as f:
+        head = json.load(f)
+
+    rows, regressions = diff_reports(base, head, args.threshold, args.min_time)
+    print(f"wall time: {base['wall_time']:.3f}s -> {head['wall_time']:.3f}s")
+    for key, before, after, delta, ratio in rows:
+        change = 'new' if ratio == float('inf') else f"{ratio:+.0%}"
+        flag = '  REGRESSION' if key in regressions else ''
+        print(f"{before:9.3f}s -> {after:9.3f}s {delta:+9.3f}s {change:>6}  {key}{flag}")
+    return 1 if regressions else 0
+
+
+def setup(app):
+    # Wrap our handlers and write a timing report at the end of the build
+    app.add_config_value('build_profile', False, '', [bool])
+    # Where to write the JSON report; defaults to build_profile.json in the doctree dir
+    app.add_config_value('build_profile_report', '', '', [str])
+    # Number of handlers and documents listed in the summary
+    app.add_config_value('build_profile_top', 10, '', [int])
+
+    # Runs after conf.py's setup(), so every handler is connected by then
+    app.connect('config-inited', install_profiling)
+    app.connect('env-merge-info', merge_worker_records)
+    app.connect('build-finished', write_report, priority=999)
+
+    return {
+        'version': '0.1',
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
+
+
+if __name__ == '__main__':
+    sys.exit(main())
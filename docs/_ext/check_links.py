@@ -0,0 +1,228 @@
+"""
+Offline checker for internal links and anchors in the built HTML.
+
+The linkcheck builder only checks external URLs, goes to the network and
+runs with ``linkcheck_anchors = False``, so a broken ``page.html#section``
+link (the kind fix_links repairs) is never caught. This checker reads
+every HTML file of a finished build once, in parallel, collecting the
+``id``/``name`` anchors each one defines and the internal ``href``/``src``
+links it contains. Every link is then resolved in memory: its file must
+exist in the output and its fragment must be an anchor of the target page.
+``_static/toc.html`` and its lazily loaded shards are checked like any
+other page.
+
+Run it on a build directory (from docs/)::
+
+    python -m _ext.check_links _build/html [--json] [--ignore REGEX]
+
+or set ``check_links = True`` to run it at the end of every HTML build,
+logging one warning per broken link.
+"""
+import argparse
+import html
+import json
+import os
+import re
+import sys
+import time
+from urllib.parse import unquote, urlsplit
+from sphinx.util import logging
+
+from .generate_toc_html import SHARD_DIR
+from .html_pass import format_rate, map_files, scan_files
+
+logger = logging.getLogger(__name__)
+
+# Anchors and links are taken from attributes of the written markup; the
+# HTML we generate always quotes attribute values
+ANCHOR_PATTERN = re.compile(r'\s(?:id|name)=(["\'])([^"\']*)\1')
+LINK_PATTERN = re.compile(r'<(?:a|area|link|iframe|img|script)\s[^>]*?\b(href|src)=(["\'])([^"\']*)\2',
+                          re.IGNORECASE)
+# Links that leave the build, or aren't links at all; root-relative paths
+# point outside the docs, which are served below a version prefix
+EXTERNAL_PREFIXES = ('/', 'data:', 'javascript:')
+SCHEME_PATTERN = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.-]*:')
+
+# Fragments the browser resolves without a matching anchor
+IMPLICIT_FRAGMENTS = ('', 'top')
+
+# Shards are inserted into toc.html, so their links are relative to it
+FRAGMENT_BASES = {f'_static/{SHARD_DIR}/': '_static/toc.html'}
+
+
+def scan_html_file(path):
+    """
+    Return (anchors, links) of one HTML file, or an error message string.
+
+    anchors is a list of anchor names; links is a list of (line, url) for
+    the internal links, with entities decoded. Runs in a worker process.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            content = f.read()
+    except OSError as e:
+        return f'error: {e}'
+    anchors = [html.unescape(match.group(2)) for match in ANCHOR_PATTERN.finditer(content)]
+    links = []
+    line = 1
+    last = 0
+    for match in LINK_PATTERN.finditer(content):
+        url = html.unescape(match.group(3)).strip()
+        if not url or url.startswith(EXTERNAL_PREFIXES) or SCHEME_PATTERN.match(url):
+            continue
+        line += content.count('\n', last, match.start())
+        last = match.start()
+        links.append((line, url))
+    return anchors, links
+
+
+def resolve_link(files, base, url):
+    """
+    Return (target relpath, fragment) for an internal link from base.
+
+    target is None when the link points at no file of the output; it is
+    base itself for a fragment-only link.
+    """
+    parts = urlsplit(url)
+    fragment = unquote(parts.fragment)
+    if not parts.path:
+        return base, fragment
+    target = os.path.normpath(os.path.join(os.path.dirname(base), unquote(parts.path)))
+    target = target.replace(os.sep, '/')
+    if target.startswith('../'):
+        return None, fragment
+    if target in files:
+        return target, fragment
+    # Directory URLs serve their index page
+    index = 'index.html' if target == '.' else f'{target}/index.html'
+    return (index if index in files else None), fragment
+
+
+def link_base(relpath):
+    for prefix, base in FRAGMENT_BASES.items():
+        if relpath.startswith(prefix):
+            return base
+    return relpath
+
+
+def check_links(outdir, workers=0, ignore=()):
+    """Scan the HTML below outdir and return a report dict."""
+    outdir = os.path.abspath(outdir)
+    start = time.perf_counter()
+    files = scan_files(outdir)
+    pages = sorted(relpath for relpath in files if relpath.endswith('.html'))
+    results, scan_time, used_workers = map_files(
+        scan_html_file, [os.path.join(outdir, relpath) for relpath in pages], workers)
+
+    anchors = {}
+    errors = []
+    for relpath, result in zip(pages, results):
+        if isinstance(result, str):
+            errors.append({'page': relpath, 'error': result[len('error: '):]})
+        else:
+            anchors[relpath] = set(result[0])
+
+    ignore_patterns = [re.compile(pattern) for pattern in ignore]
+    broken = []
+    checked = 0
+    check_start = time.perf_counter()
+    for relpath, result in zip(pages, results):
+        if isinstance(result, str):
+            continue
+        base = link_base(relpath)
+        for line, url in result[1]:
+            if any(pattern.search(url) for pattern in ignore_patterns):
+                continue
+            checked += 1
+            target, fragment = resolve_link(files, base, url)
+            if target is None:
+                broken.append({'page': relpath, 'line': line, 'href': url, 'reason': 'missing-file'})
+            elif fragment not in IMPLICIT_FRAGMENTS and target in anchors \
+                    and fragment not in anchors[target]:
+                broken.append({'page': relpath, 'line': line, 'href': url, 'reason': 'missing-anchor',
+                               'target': target})
+
+    return {
+        'outdir': outdir,
+        'pages': len(pages),
+        'anchors': sum(len(page_anchors) for page_anchors in anchors.values()),
+        'links': checked,
+        'broken': broken,
+        'errors': errors,
+        'timing': {
+            'scan': round(scan_time, 3),
+            'check': round(time.perf_counter() - check_start, 3),
+            'workers': used_workers,
+            'total': round(time.perf_counter() - start, 3),
+        },
+    }
+
+
+def summary(report):
+    timing = report['timing']
+    return (f"Checked {report['links']} internal links against {report['anchors']} anchors "
+            f"in {report['pages']} pages in {timing['total']:.3f}s "
+            f"(scan: {format_rate(report['pages'], timing['scan'])}, {timing['workers']} workers): "
+            f"{len(report['broken'])} broken")
+
+
+def describe(item):
+    if item['reason'] == 'missing-file':
+        return f"{item['page']}:{item['line']}: {item['href']}: no such file"
+    return f"{item['page']}:{item['line']}: {item['href']}: no anchor in {item['target']}"
+
+
+def check_built_links(app, exception):
+    if exception or app.builder.format != 'html' or not app.config.check_links:
+        return
+    report = check_links(app.outdir, app.config.check_links_workers, app.config.check_links_ignore)
+    for item in report['broken']:
+        logger.warning(describe(item))
+    for item in report['errors']:
+        logger.warning(f"{item['page']}: {item['error']}")
+    logger.info(summary(report))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check internal links and anchors of a built site.')
+    parser.add_argument('outdir', nargs='?', default='_build/html')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='processes used to scan the pages (0 means one per CPU)')
+    parser.add_argument('--ignore', action='append', default=[], metavar='REGEX',
+                        help='skip links matching this regular expression (repeatable)')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    report = check_links(args.outdir, args.workers, args.ignore)
+    if args.json:
+        json.dump(report, sys.stdout, indent=1, sort_keys=True)
+        print()
+    else:
+        for item in report['broken']:
+            print(describe(item))
+        for item in report['errors']:
+            print(f"{item['page']}: {item['error']}")
+        print(summary(report))
+    return 1 if report['broken'] or report['errors'] else 0
+
+
+def setup(app):
+    # Check internal links and anchors of the HTML output after each build
+    app.add_config_value('check_links', False, '', [bool])
+    # Number of processes used to scan the pages; 0 means one per CPU
+    app.add_config_value('check_links_workers', 0, '', [int])
+    # Regular expressions of links that are not checked
+    app.add_config_value('check_links_ignore', [], '', [list])
+
+    # After the passes that rewrite the output (toc.html, fix_links)
+    app.connect('build-finished', check_built_links, priority=850)
+
+    return {
+        'version': '0.1',
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
+
+
+if __name__ == '__main__':
+    sys.exit(main())
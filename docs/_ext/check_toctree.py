@@ -0,0 +1,290 @@
+"""
+Check toctree coverage of the docs without building them.
+
+Reads the sources directly, with the same toctree parsing and link
+resolution generate_toc_html uses for toc.html, and reports:
+
+- missing targets: toctree entries that point at no document;
+- duplicates: documents listed by more than one toctree entry;
+- cycles: documents that (indirectly) list themselves;
+- unreachable documents: not listed from the root document, and not
+  marked ``orphan`` in their own source.
+
+conf.py stamps ``orphan: true`` on every document during the build, so
+Sphinx no longer warns about documents missing from the navigation; this
+is the check that replaces that warning. Only the literal project settings
+in conf.py are read (source suffixes and include/exclude patterns); it is
+not executed, and no docutils parsing happens, so the check takes seconds
+and can run as a pre-commit hook or CI step.
+
+Usage (from docs/):
+    python -m _ext.check_toctree [--srcdir .] [--confdir SRCDIR] [--workers 0]
+        [--json] [--strict]
+
+Exits with status 1 when a problem is found (duplicates only count with
+--strict).
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import sys
+import time
+from types import SimpleNamespace
+from sphinx.project import EXCLUDE_PATHS, Project
+from sphinx.util.matching import patfilter
+
+from .generate_toc_html import (
+    extract_commented_toctree,
+    get_docname_from_link,
+    parse_toctree_entries,
+    parse_toctree_options,
+)
+from .html_pass import format_rate, map_files
+
+# conf.py settings read for document discovery, with Sphinx's defaults
+CONF_DEFAULTS = {
+    'root_doc': 'index',
+    'master_doc': None,
+    'source_suffix': ['.rst'],
+    'exclude_patterns': [],
+    'include_patterns': ['**'],
+    'templates_path': [],
+    'html_static_path': [],
+}
+
+# A reST toctree directive and its indented body
+RST_TOCTREE_PATTERN = re.compile(r'^\.\. toctree::[^\n]*\n((?:[ \t]+[^\n]*\n|[ \t]*\n)*)', re.MULTILINE)
+# An uncommented MyST toctree fence (backticks or colons)
+MYST_TOCTREE_PATTERN = re.compile(r'^(`{3,}|:{3,})\{toctree\}[^\n]*\n(.*?)^\1[ \t]*$',
+                                  re.MULTILINE | re.DOTALL)
+RTD_TOC_PATTERN = re.compile(r'<!-- RTD-TOC-START.*?RTD-TOC-END -->', re.DOTALL)
+# Explicit orphans: MyST frontmatter (up to its closing ---) or a reST field at the top of the file
+ORPHAN_PATTERN = re.compile(r'\A(?:\s*---\n(?:(?!---\s*\n).*\n)*?orphan:\s*true\s*\n|\s*:orphan:)')
+
+GLOB_CHARACTERS = ('*', '?', '[')
+
+
+def read_conf(confdir):
+    """Return the literal conf.py settings listed in CONF_DEFAULTS."""
+    settings = {key: value for key, value in CONF_DEFAULTS.items()}
+    with open(os.path.join(confdir, 'conf.py'), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 \
+                and isinstance(node.targets[0], ast.Name) and node.targets[0].id in settings:
+            try:
+                settings[node.targets[0].id] = ast.literal_eval(node.value)
+            except ValueError:
+                pass
+    if settings['master_doc']:
+        settings['root_doc'] = settings['master_doc']
+    return settings
+
+
+def discover_documents(srcdir, settings):
+    """Return (project, docnames) found the way Sphinx finds them for the HTML builder."""
+    suffixes = settings['source_suffix']
+    if isinstance(suffixes, str):
+        suffixes = [suffixes]
+    project = Project(srcdir, list(suffixes))
+    exclude_paths = (list(settings['exclude_patterns']) + list(settings['templates_path'])
+                     + list(settings['html_static_path']) + list(EXCLUDE_PATHS))
+    return project, project.discover(exclude_paths, settings['include_patterns'])
+
+
+def read_source(path):
+    """Read a source file, including the UTF-16LE ones conf.py converts."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data.startswith(b'\xff\xfe'):
+        return data[2:].decode('utf-16le', errors='replace')
+    return data.decode('utf-8-sig', errors='replace')
+
+
+def rst_toctree_body(block):
+    """Dedent a reST toctree body so options start their lines."""
+    lines = block.split('\n')
+    indent = min((len(line) - len(line.lstrip()) for line in lines if line.strip()), default=0)
+    return '\n'.join(line[indent:] for line in lines)
+
+
+def scan_source(path):
+    """
+    Return (toctrees, orphan) for one source file.
+
+    toctrees is a list of (options, entries) as parsed by generate_toc_html.
+    A commented RTD-TOC block comes first, followed by the document's other
+    toctrees, as in toc.html.
+    """
+    content = read_source(path).replace('\r\n', '\n')
+    orphan = bool(ORPHAN_PATTERN.match(content))
+    commented = extract_commented_toctree(content)
+    bodies = [commented] if commented is not None else []
+    content = RTD_TOC_PATTERN.sub('', content)
+    if path.endswith('.rst'):
+        bodies += [rst_toctree_body(match.group(1)) for match in RST_TOCTREE_PATTERN.finditer(content)]
+    else:
+        bodies += [match.group(2) for match in MYST_TOCTREE_PATTERN.finditer(content)]
+    toctrees = [(parse_toctree_options(body), parse_toctree_entries(body)) for body in bodies]
+    return toctrees, orphan
+
+
+def resolve_entries(env, docname, toctrees, docnames):
+    """Yield (link, target docname or None if missing) for a document's toctree entries."""
+    for options, entries in toctrees:
+        for _, link in entries:
+            if link == 'self' or link.startswith(('http://', 'https://', 'mailto:')):
+                continue
+            target = get_docname_from_link(env, docname, link)
+            if 'glob' in options and any(char in link for char in GLOB_CHARACTERS):
+                matches = sorted(patfilter(docnames, target))
+                if not matches:
+                    yield link, None
+                for match in matches:
+                    if match != docname:
+                        yield link, match
+            else:
+                yield link, target if target in docnames else None
+
+
+def find_cycles(graph):
+    """Return the distinct cycles of graph ({docname: [docname]}) as docname lists."""
+    cycles = []
+    seen_cycles = set()
+    state = {}
+    for start in sorted(graph):
+        if start in state:
+            continue
+        # Iterative DFS; path holds the docnames on the current branch
+        path = [start]
+        on_path = {start: 0}
+        stack = [iter(graph[start])]
+        state[start] = 'open'
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                done = path.pop()
+                del on_path[done]
+                state[done] = 'done'
+            elif child in on_path:
+                cycle = path[on_path[child]:]
+                # The same cycle is found from each of its documents; keep one
+                key = frozenset(cycle)
+                if key not in seen_cycles:
+                    seen_cycles.add(key)
+                    cycles.append(cycle + [child])
+            elif child not in state:
+                state[child] = 'open'
+                on_path[child] = len(path)
+                path.append(child)
+                stack.append(iter(graph.get(child, ())))
+    return cycles
+
+
+def reachable_from(graph, root):
+    seen = {root}
+    pending = [root]
+    while pending:
+        for child in graph.get(pending.pop(), ()):
+            if child not in seen:
+                seen.add(child)
+                pending.append(child)
+    return seen
+
+
+def check_toctree(srcdir, confdir=None, workers=0):
+    """Scan the sources below srcdir and return a report dict."""
+    srcdir = os.path.abspath(srcdir)
+    settings = read_conf(confdir or srcdir)
+    start = time.perf_counter()
+    project, docnames = discover_documents(srcdir, settings)
+    ordered = sorted(docnames)
+    paths = {docname: str(project.doc2path(docname, absolute=True)) for docname in ordered}
+    discovered = time.perf_counter() - start
+
+    results, scan_time, used_workers = map_files(scan_source, [paths[d] for d in ordered], workers)
+    env = SimpleNamespace(srcdir=srcdir, doc2path=lambda docname: paths[docname])
+
+    graph = {}
+    orphans = set()
+    missing = []
+    references = {}
+    for docname, (toctrees, orphan) in zip(ordered, results):
+        if orphan:
+            orphans.add(docname)
+        children = graph[docname] = []
+        for link, target in resolve_entries(env, docname, toctrees, docnames):
+            if target is None:
+                missing.append({'doc': docname, 'link': link})
+                continue
+            children.append(target)
+            references.setdefault(target, []).append(docname)
+
+    root = settings['root_doc']
+    reached = reachable_from(graph, root) if root in docnames else set()
+    return {
+        'srcdir': srcdir,
+        'root': root,
+        'documents': len(ordered),
+        'missing_root': root not in docnames,
+        'missing': missing,
+        'duplicates': {target: referrers for target, referrers in sorted(references.items())
+                       if len(referrers) > 1},
+        'cycles': find_cycles(graph),
+        'unreachable': [docname for docname in ordered if docname not in reached and docname not in orphans],
+        'timing': {
+            'discover': round(discovered, 3),
+            'scan': round(scan_time, 3),
+            'workers': used_workers,
+            'total': round(time.perf_counter() - start, 3),
+        },
+    }
+
+
+def has_errors(report, strict=False):
+    return bool(report['missing_root'] or report['missing'] or report['cycles'] or report['unreachable']
+                or (strict and report['duplicates']))
+
+
+def print_report(report):
+    if report['missing_root']:
+        print(f"Root document '{report['root']}' not found")
+    for item in report['missing']:
+        print(f"{item['doc']}: toctree entry '{item['link']}' points at no document")
+    for target, referrers in report['duplicates'].items():
+        print(f"{target}: listed {len(referrers)} times, by {', '.join(referrers)}")
+    for cycle in report['cycles']:
+        print(f"cycle: {' -> '.join(cycle)}")
+    for docname in report['unreachable']:
+        print(f"{docname}: not reachable from '{report['root']}' and not marked orphan")
+    timing = report['timing']
+    print(f"Checked {report['documents']} documents in {timing['total']:.3f}s "
+          f"(scan: {format_rate(report['documents'], timing['scan'])}, {timing['workers']} workers): "
+          f"{len(report['missing'])} missing, {len(report['duplicates'])} duplicated, "
+          f"{len(report['cycles'])} cycles, {len(report['unreachable'])} unreachable")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check toctree coverage without building the docs.')
+    parser.add_argument('--srcdir', default='.', help='directory holding the sources')
+    parser.add_argument('--confdir', help='directory holding conf.py (defaults to the srcdir)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='processes used to scan the sources (0 means one per CPU)')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('--strict', action='store_true', help='fail on duplicate entries too')
+    args = parser.parse_args(argv)
+
+    report = check_toctree(args.srcdir, args.confdir, args.workers)
+    if args.json:
+        json.dump(report, sys.stdout, indent=1, sort_keys=True)
+        print()
+    else:
+        print_report(report)
+    return 1 if has_errors(report, args.strict) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
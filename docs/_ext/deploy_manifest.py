@@ -0,0 +1,204 @@
+"""
+Custom Sphinx extension that writes a deploy manifest of the HTML output.
+
+At the end of an HTML build, ``deploy-manifest.json`` lists every output
+file with the SHA-256 of its content, and ``deploy-manifest-diff.json``
+lists the files added, changed and removed since the previous manifest
+(the one left in the output dir by the last build, or the one named by
+``deploy_manifest_previous``, e.g. downloaded from the live site). Deploy
+tooling uploads the added and changed files and deletes the removed ones.
+
+Only content counts, so a page Sphinx or a post-build pass rewrote with
+the same bytes is not in the diff; the output is byte-stable for unchanged
+inputs (toc.html checkbox ids are derived from the entries, compressed
+siblings carry no timestamp). Files whose size and mtime match the last
+build keep their recorded hash, so only rewritten files are read.
+
+Build reports that differ on every run (``deploy_manifest_exclude``) are
+left out. The manifest can also be made for any directory::
+
+    python -m _ext.deploy_manifest _build/html [--previous OLD.json] [--json]
+"""
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import sys
+from sphinx.util import logging
+
+from .html_pass import format_rate, map_files, scan_files
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'deploy-manifest.json'
+DIFF_NAME = 'deploy-manifest-diff.json'
+MANIFEST_VERSION = 1
+
+# Hashes by (mtime_ns, size) of the last build, kept next to the doctrees
+SIGNATURES_NAME = 'deploy_manifest_signatures.json'
+
+DEFAULT_EXCLUDE = [
+    '.buildinfo',
+    '.buildinfo.bak',
+    '.doctrees/*',
+    'sphinx-reading-durations.json',
+    '*.tmp',
+]
+
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of a file, or an error message string. Runs in a worker process."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    except OSError as e:
+        return f'error: {e}'
+    return digest.hexdigest()
+
+
+def load_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def build_manifest(outdir, exclude=DEFAULT_EXCLUDE, signatures=None, workers=0):
+    """
+    Hash the files below outdir.
+
+    signatures maps relpath -> [mtime_ns, size, sha256] from an earlier run;
+    files whose stat still matches are not read again. Returns (manifest,
+    new signatures, number of files hashed, elapsed, workers, errors).
+    """
+    signatures = signatures or {}
+    exclude = list(exclude) + [MANIFEST_NAME, DIFF_NAME]
+    files = {relpath: signature for relpath, signature in scan_files(outdir).items()
+             if not any(fnmatch.fnmatch(relpath, pattern) for pattern in exclude)}
+    hashes = {}
+    to_hash = []
+    for relpath, (mtime_ns, size) in files.items():
+        known = signatures.get(relpath)
+        if known and known[:2] == [mtime_ns, size]:
+            hashes[relpath] = known[2]
+        else:
+            to_hash.append(relpath)
+    results, elapsed, workers = map_files(hash_file, [os.path.join(outdir, relpath) for relpath in to_hash],
+                                          workers)
+    errors = []
+    for relpath, result in zip(to_hash, results):
+        if result.startswith('error: '):
+            errors.append(f"{relpath}: {result[len('error: '):]}")
+            del files[relpath]
+        else:
+            hashes[relpath] = result
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'files': {relpath: {'sha256': hashes[relpath], 'size': files[relpath][1]} for relpath in sorted(files)},
+    }
+    new_signatures = {relpath: [*files[relpath], hashes[relpath]] for relpath in files}
+    return manifest, new_signatures, len(to_hash), elapsed, workers, errors
+
+
+def diff_manifests(previous, current):
+    """Return the added, changed and removed files between two manifests."""
+    old = previous.get('files', {}) if previous else {}
+    new = current['files']
+    return {
+        'version': MANIFEST_VERSION,
+        'previous': bool(previous),
+        'added': sorted(new.keys() - old.keys()),
+        'changed': sorted(relpath for relpath in new.keys() & old.keys()
+                          if new[relpath]['sha256'] != old[relpath]['sha256']),
+        'removed': sorted(old.keys() - new.keys()),
+        'unchanged': sum(1 for relpath in new.keys() & old.keys()
+                         if new[relpath]['sha256'] == old[relpath]['sha256']),
+    }
+
+
+def summary(diff, total):
+    return (f"{total} files: {len(diff['added'])} added, {len(diff['changed'])} changed, "
+            f"{len(diff['removed'])} removed, {diff['unchanged']} unchanged")
+
+
+def write_deploy_manifest(app, exception):
+    if exception or app.builder.format != 'html' or not app.config.deploy_manifest:
+        return
+    outdir = str(app.outdir)
+    signatures_path = os.path.join(app.doctreedir, SIGNATURES_NAME)
+    manifest, signatures, hashed, elapsed, workers, errors = build_manifest(
+        outdir, app.config.deploy_manifest_exclude, load_json(signatures_path),
+        app.config.deploy_manifest_workers)
+    for error in errors:
+        logger.warning(f"Deploy manifest: could not hash {error}")
+
+    previous_path = app.config.deploy_manifest_previous or os.path.join(outdir, MANIFEST_NAME)
+    diff = diff_manifests(load_json(previous_path), manifest)
+    write_json(os.path.join(outdir, MANIFEST_NAME), manifest)
+    write_json(os.path.join(outdir, DIFF_NAME), diff)
+    write_json(signatures_path, signatures)
+    logger.info(f"Deploy manifest: {summary(diff, len(manifest['files']))} "
+                f"(hashed {format_rate(hashed, elapsed)}, {workers} worker(s))")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write the deploy manifest of a built site.')
+    parser.add_argument('outdir', nargs='?', default='_build/html')
+    parser.add_argument('--previous', help=f'manifest to diff against (default: the {MANIFEST_NAME} in outdir)')
+    parser.add_argument('--exclude', action='append', default=[], metavar='GLOB',
+                        help='also leave out files matching this pattern (repeatable)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='processes used to hash the files (0 means one per CPU)')
+    parser.add_argument('--json', action='store_true', help='print the diff as JSON')
+    args = parser.parse_args(argv)
+
+    manifest, _, _, _, _, errors = build_manifest(args.outdir, DEFAULT_EXCLUDE + args.exclude,
+                                                  workers=args.workers)
+    diff = diff_manifests(load_json(args.previous or os.path.join(args.outdir, MANIFEST_NAME)), manifest)
+    write_json(os.path.join(args.outdir, MANIFEST_NAME), manifest)
+    write_json(os.path.join(args.outdir, DIFF_NAME), diff)
+    for error in errors:
+        print(f"could not hash {error}")
+    if args.json:
+        json.dump(diff, sys.stdout, indent=1, sort_keys=True)
+        print()
+    else:
+        print(summary(diff, len(manifest['files'])))
+    return 1 if errors else 0
+
+
+def setup(app):
+    # Write deploy-manifest.json and deploy-manifest-diff.json after each HTML build
+    app.add_config_value('deploy_manifest', True, '', [bool])
+    # Manifest to diff against; defaults to the one the last build left in the output dir
+    app.add_config_value('deploy_manifest_previous', '', '', [str])
+    # Globs of output files that aren't deployed
+    app.add_config_value('deploy_manifest_exclude', DEFAULT_EXCLUDE, '', [list])
+    # Number of processes used to hash files; 0 means one per CPU
+    app.add_config_value('deploy_manifest_workers', 0, '', [int])
+
+    # After every pass that writes to the output (static assets, link check)
+    app.connect('build-finished', write_deploy_manifest, priority=900)
+
+    return {
+        'version': '0.1',
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,87 +1,272 @@
 """
 Custom Sphinx extension to fix relative links with fragment identifiers.
+
+By default the fixes are applied to ``reference`` nodes by a post-transform,
+before any HTML is written. Setting ``fix_links_mode = 'post-process'`` falls
+back to rewriting the finished HTML files after the build.
 """
 from sphinx.util import logging
-import re
+import json
 import os
+import re
+from docutils import nodes
 from sphinx.application import Sphinx
+from sphinx.transforms.post_transforms import SphinxPostTransform
+
+from .html_pass import format_rate, map_files, scan_files
 
 logger = logging.getLogger(__name__)
 
+# Matches every quoted href attribute; both fixes are applied to the URL in one scan.
+HREF_PATTERN = re.compile(r'href=(["\'])([^"\']+)\1')
+
+# A file can only need fixing if it contains one of these byte sequences.
+FRAGMENT_MARKERS = (b'href="#', b"href='#")
+AMPERSAND_MARKER = b'&amp;amp;'
+
+# Records the (mtime, size) of every HTML file as we left it, so the next build
+# only has to look at pages Sphinx wrote since then. Lives in the doctree dir
+# so it is never deployed with the site.
+MANIFEST_NAME = 'fix_links_manifest.json'
+MANIFEST_VERSION = 1
+
+
+def fix_href(url):
+    """Return the repaired form of a single href value."""
+    # Fix any href="#something" where something looks like a path (contains / or .html)
+    if url.startswith('#') and len(url) > 1:
+        # The path runs up to the first later '#' that starts a non-empty fragment
+        path = url[1:]
+        split = path.find('#', 1)
+        if 0 < split < len(path) - 1:
+            path = path[:split]
+        # Only rewrite if path looks like a file or path, not just a fragment
+        if '/' in path or '.html' in path:
+            url = url[1:]
+
+    # Fix &amp; in URLs (and other query strings in href attributes)
+    # MyST-Parser incorrectly double-escapes & to &amp;amp; in href attributes
+    # See https://github.com/executablebooks/MyST-Parser/issues/1028 for more details
+    # Only fix URLs that have a query string (contain ?)
+    if '?' in url:
+        # Fix double-escaped ampersands (&amp;amp; -> &amp;)
+        # Single &amp; is valid HTML in href attributes
+        while '&amp;amp;' in url:
+            url = url.replace('&amp;amp;', '&amp;')
+    return url
+
+
+def fix_link_target(target):
+    """
+    Return the repaired form of an unescaped link target.
+
+    This is the doctree counterpart of fix_href: the HTML writer escapes
+    ``&`` to ``&amp;``, so a double-escaped ``&amp;amp;`` in the output is a
+    literal ``&amp;`` in the node.
+    """
+    if '?' in target:
+        while '&amp;' in target:
+            target = target.replace('&amp;', '&')
+    return target
+
+
+def fix_reference(node):
+    """Apply the link fixes to a single reference node. Returns True if it changed."""
+    if 'refuri' in node:
+        refuri = node['refuri']
+        fixed_uri = fix_link_target(fix_href(refuri))
+        if fixed_uri == refuri:
+            return False
+        node['refuri'] = fixed_uri
+        return True
+
+    if 'refid' in node:
+        # MyST turns unresolvable links into local references, written as href="#<refid>"
+        refid = node['refid']
+        fixed_uri = fix_href('#' + refid)
+        if fixed_uri.startswith('#'):
+            return False
+        del node['refid']
+        node['refuri'] = fix_link_target(fixed_uri)
+        # Keep the "reference internal" class the HTML writer gave it before
+        node['internal'] = True
+        return True
+
+    return False
+
+
+class FixLinksTransform(SphinxPostTransform):
+    """Repair MyST link targets in the doctree before HTML is written."""
+    default_priority = 500
+    formats = ('html',)
+
+    def run(self, **kwargs):
+        if self.config.fix_links_mode != 'transform':
+            return
+
+        for node in self.document.findall(nodes.reference):
+            fix_reference(node)
+
+        # Raw HTML is written out verbatim, so fix its hrefs as text
+        for node in list(self.document.findall(nodes.raw)):
+            if 'html' not in node.get('format', '').split():
+                continue
+            text = node.astext()
+            fixed_text = fix_html(text)
+            if fixed_text != text:
+                node.replace_self(nodes.raw('', fixed_text, **node.attributes))
+
+
+def fix_html(content):
+    """Apply both link fixes to an HTML document in a single pass."""
+    def repl(match):
+        quote, url = match.group(1), match.group(2)
+        fixed_url = fix_href(url)
+        if fixed_url == url:
+            return match.group(0)
+        return f'href={quote}{fixed_url}{quote}'
+
+    return HREF_PATTERN.sub(repl, content)
+
+
+def needs_fixing(data):
+    """Cheap byte-level check for whether a file could contain a fixable link."""
+    return AMPERSAND_MARKER in data or any(marker in data for marker in FRAGMENT_MARKERS)
+
+
+def fix_html_file(filepath):
+    """
+    Fix the links in one HTML file, rewriting it only if something changed.
+
+    Runs in a worker process. Returns 'skipped', 'unchanged' or 'fixed', or
+    an error message string prefixed with 'error: '.
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            data = f.read()
+        if not needs_fixing(data):
+            return 'skipped'
+
+        content = data.decode('utf-8')
+        fixed_content = fix_html(content)
+        if fixed_content == content:
+            return 'unchanged'
+
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(fixed_content)
+        return 'fixed'
+    except Exception as e:
+        return f'error: {e}'
+
+
+def load_manifest(app):
+    """Load the file signatures recorded by the previous build, if usable."""
+    path = os.path.join(app.doctreedir, MANIFEST_NAME)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('outdir') != str(app.outdir):
+        return {}
+    return {relpath: tuple(signature) for relpath, signature in manifest['files'].items()}
+
+
+def save_manifest(app, signatures):
+    """Persist the current file signatures for the next build."""
+    path = os.path.join(app.doctreedir, MANIFEST_NAME)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'outdir': str(app.outdir),
+        'files': signatures,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'), sort_keys=True)
+
+
+def note_rewritten_pages(app, changes):
+    """
+    Record pages a later build-finished pass rewrote after ours.
+
+    changes maps relpath -> (signature before, signature after). A page is
+    only updated if we had left it with the signature before, so pages we
+    haven't looked at are still post-processed next time.
+    """
+    if app.config.fix_links_mode != 'post-process' or not changes:
+        return
+    signatures = load_manifest(app)
+    updated = False
+    for relpath, (before, after) in changes.items():
+        if signatures.get(relpath) == tuple(before):
+            signatures[relpath] = tuple(after)
+            updated = True
+    if updated:
+        save_manifest(app, signatures)
+
+
 def fix_md_links_post_process(app, exception):
     """
     Post-processing to fix links in the HTML output files.
     This is our main function that runs after the build is complete.
+
+    Only pages whose size or mtime changed since the previous build (i.e. pages
+    Sphinx rewrote) are read, unless ``fix_links_incremental`` is disabled.
     """
     if exception:
         return
 
-    # Only run in HTML builder
-    if app.builder.name != 'html':
+    # Only run in HTML builder, and only when the transform isn't doing the work
+    if app.builder.name != 'html' or app.config.fix_links_mode != 'post-process':
         return
 
-    output_dir = app.builder.outdir
+    output_dir = str(app.builder.outdir)
     logger.info(f"[DEBUG] Post-processing HTML files in {output_dir}")
 
-    count = 0
+    signatures = scan_files(output_dir, '.html')
+    previous = load_manifest(app) if app.config.fix_links_incremental else {}
+    relpaths = [relpath for relpath, signature in signatures.items()
+                if previous.get(relpath) != signature]
+    paths = [os.path.join(output_dir, relpath) for relpath in relpaths]
+    results, elapsed, workers = map_files(fix_html_file, paths, app.config.fix_links_workers)
+
     fixed = 0
+    skipped = 0
+    for relpath, filepath, result in zip(relpaths, paths, results):
+        if result == 'fixed':
+            fixed += 1
+            logger.info(f"[DEBUG] Fixed file: {filepath}")
+            st = os.stat(filepath)
+            signatures[relpath] = (st.st_mtime_ns, st.st_size)
+        elif result == 'skipped':
+            skipped += 1
+        elif result.startswith('error: '):
+            logger.info(f"[DEBUG] Error processing {filepath}: {result[len('error: '):]}")
+            # Retry on the next build
+            del signatures[relpath]
 
-    # Walk through ALL HTML files in the output directory
-    for root, _, files in os.walk(output_dir):
-        for filename in files:
-            if filename.endswith('.html'):
-                filepath = os.path.join(root, filename)
-                count += 1
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    original_content = content
-
-                    # Fix any href="#something" where something looks like a path (contains / or .html)
-                    pattern = r'href=(["\'])#([^"\']+?)(#[^"\']+)?\1'
-                    def repl(match):
-                        quote, path, fragment = match.group(1), match.group(2), match.group(3) or ''
-                        # Only rewrite if path looks like a file or path, not just a fragment
-                        if '/' in path or '.html' in path:
-                            return f'href={quote}{path}{fragment}{quote}'
-                        else:
-                            return match.group(0)  # leave as is for pure fragments
-
-                    content = re.sub(pattern, repl, content)
-
-                    # Fix &amp; in URLs (and other query strings in href attributes)
-                    # MyST-Parser incorrectly double-escapes & to &amp;amp; in href attributes
-                    # See https://github.com/executablebooks/MyST-Parser/issues/1028 for more details
-                    def fix_ampersands_in_href(match):
-                        quote = match.group(1)
-                        url = match.group(2)
-                        # Only fix URLs that have a query string (contain ?)
-                        if '?' in url:
-                            # Fix double-escaped ampersands (&amp;amp; -> &amp;)
-                            # Single &amp; is valid HTML in href attributes
-                            fixed_url = url
-                            while '&amp;amp;' in fixed_url:
-                                fixed_url = fixed_url.replace('&amp;amp;', '&amp;')
-                            return f'href={quote}{fixed_url}{quote}'
-                        return match.group(0)
-
-                    href_pattern = r'href=(["\'])([^"\']+)\1'
-                    content = re.sub(href_pattern, fix_ampersands_in_href, content)
-
-                    if content != original_content:
-                        with open(filepath, 'w', encoding='utf-8') as f:
-                            f.write(content)
-                        fixed += 1
-                        logger.info(f"[DEBUG] Fixed file: {filepath}")
-
-                except Exception as e:
-                    logger.info(f"[DEBUG] Error processing {filepath}: {e}")
-    logger.info(f"[DEBUG] Post-processed {count} HTML files, fixed {fixed} files")
+    save_manifest(app, signatures)
+
+    logger.info(f"[DEBUG] Post-processed {len(paths)} of {len(signatures)} HTML files "
+                f"(others unchanged since the last build), fixed {fixed} files, "
+                f"skipped {skipped} without candidate links")
+    logger.info(f"[DEBUG] Link fixing took {format_rate(len(paths), elapsed)} "
+                f"using {workers} worker(s)")
 
 
 def setup(app: Sphinx):
     """Set up the extension."""
-    logger.info("[DEBUG] Registering link fixer extension (post-processing only)")
+    logger.info("[DEBUG] Registering link fixer extension")
+
+    # 'transform' fixes reference nodes before writing; 'post-process' rewrites
+    # the HTML files on disk after the build
+    app.add_config_value('fix_links_mode', 'transform', 'html', [str])
+    # Number of processes used to post-process HTML files; 0 means one per CPU
+    app.add_config_value('fix_links_workers', 0, '', [int])
+    # Only post-process pages written since the previous build
+    app.add_config_value('fix_links_incremental', True, '', [bool])
+
+    app.add_post_transform(FixLinksTransform)
 
     # Register post-processing function to run after the build is complete
     app.connect('build-finished', fix_md_links_post_process)
@@ -90,4 +275,4 @@ def setup(app: Sphinx):
         'version': '0.1',
         'parallel_read_safe': True,
         'parallel_write_safe': True,
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,506 @@
+"""
+Custom Sphinx extension that writes llms-full.txt style files for LLM agents.
+
+While a document is read, its preprocessed Markdown (after the conf.py
+source-read hooks) is cleaned up and stored in a cache under the doctree
+dir, keyed by a hash of its content; only that hash is kept in the
+environment. At the end of the build the cached texts are streamed into
+each output file in TOC order, using the same navigation traversal as
+toc.html. Unchanged documents are never re-read or re-extracted.
+
+Each output can also be split into shards of at most a given number of
+bytes or (estimated) tokens, with a JSON index listing what each shard
+holds, so agents can load one part of the docs at a time.
+
+Every page also gets its text next to its HTML (``page.html`` -> ``page.md``;
+``page.txt`` for reST sources or with ``llms_txt_page_suffix = '.txt'``),
+advertised by a ``<link rel="alternate">`` in the page head, and each output
+gets an index (``llms-full-index.json``) mapping every document, and every
+heading anchor in it, to its byte range in the output::
+
+    {"source": "llms-full.txt", "bytes": 41234, "docs": {"first-slang-shader": {
+        "title": ..., "url": ..., "page": "first-slang-shader.md", "start": 1024, "end": 9876,
+        "sections": {"compile-the-shader": {"title": ..., "level": 2, "start": 4096, "end": 6144}}}}}
+
+Ranges are half-open like Python slices, so a section is fetched with
+``Range: bytes={start}-{end - 1}``. A document's range holds the same bytes
+as its page text. Headings are matched to the anchors of the doctree
+sections by title, in order; headings that aren't sections (inside
+directives, or in reST documents) have no entry.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import re
+from docutils import nodes
+from sphinx.config import ENUM
+from sphinx.util import logging
+
+from .generate_toc_html import get_master_doc, get_navigation, navigation_digest
+
+logger = logging.getLogger(__name__)
+
+# Cached per-document texts, named by content hash, below the doctree dir
+CACHE_DIR = 'llms_txt'
+# Bump when the extraction below changes so cached texts are redone
+EXTRACT_VERSION = 1
+
+# Digest of the inputs of the last written outputs, next to the doctrees
+DIGEST_NAME = 'llms_txt.digest'
+# Page texts written by the last build, so those of removed pages are deleted
+PAGES_NAME = 'llms_txt_pages.json'
+
+FRONTMATTER_PATTERN = re.compile(r'\A\s*---\n.*?\n---[ \t]*\n', re.DOTALL)
+TOC_COMMENT_PATTERN = re.compile(r'<!-- RTD-TOC-START.*?RTD-TOC-END -->\n?', re.DOTALL)
+BLANK_LINES_PATTERN = re.compile(r'\n{3,}')
+SHARD_NAME_PATTERN = r'{stem}-\d{{3}}\.txt|{stem}-shards\.json'
+FENCE_PATTERN = re.compile(r' {0,3}(`{3,}|~{3,})')
+HEADING_PATTERN = re.compile(r' {0,3}(#{1,6})[ \t]+(.*?)(?:[ \t]+#+)?[ \t]*$')
+SETEXT_PATTERN = re.compile(r' {0,3}(=+|-+)[ \t]*$')
+MARKDOWN_LINK_PATTERN = re.compile(r'!?\[([^\]]*)\]\([^)]*\)')
+# The doctree titles have been through smartquotes
+SMART_QUOTES = str.maketrans({'\u2018': "'", '\u2019': "'", '\u201c': '"', '\u201d': '"'})
+
+
+def get_hash_index(env):
+    """Return {docname: content hash} of the cached text of every document."""
+    if not hasattr(env, 'llms_txt_hashes'):
+        env.llms_txt_hashes = {}
+    return env.llms_txt_hashes
+
+
+def get_section_index(env):
+    """Return {docname: [[title, anchor], ...]} of the sections of every document."""
+    if not hasattr(env, 'llms_txt_sections'):
+        env.llms_txt_sections = {}
+    return env.llms_txt_sections
+
+
+def extract_text(source):
+    """Turn a preprocessed source into the text written for it."""
+    text = FRONTMATTER_PATTERN.sub('', source, count=1)
+    # The navigation is already given by the order of the documents
+    text = TOC_COMMENT_PATTERN.sub('', text)
+    return BLANK_LINES_PATTERN.sub('\n\n', text).strip() + '\n'
+
+
+def cache_path(app, digest):
+    return os.path.join(app.doctreedir, CACHE_DIR, digest + '.md')
+
+
+def collect_text(app, docname, source):
+    """Cache the text of a document while its source is in memory."""
+    digest = hashlib.sha256(f"{EXTRACT_VERSION}\0{source[0]}".encode('utf-8')).hexdigest()
+    get_hash_index(app.env)[docname] = digest
+    path = cache_path(app, digest)
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Parallel readers may write the same entry; renaming keeps it whole
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(extract_text(source[0]))
+    os.replace(tmp_path, path)
+
+
+def collect_sections(app, doctree):
+    """Record the title and anchor of each section, in document order."""
+    get_section_index(app.env)[app.env.docname] = [
+        [section[0].astext(), section['ids'][0]]
+        for section in doctree.findall(nodes.section)
+        if section['ids'] and len(section) and isinstance(section[0], nodes.title)
+    ]
+
+
+def purge_text(app, env, docname):
+    get_hash_index(env).pop(docname, None)
+    get_section_index(env).pop(docname, None)
+
+
+def merge_text(app, env, docnames, other):
+    for index, other_index in ((get_hash_index(env), get_hash_index(other)),
+                               (get_section_index(env), get_section_index(other))):
+        for docname in docnames:
+            if docname in other_index:
+                index[docname] = other_index[docname]
+
+
+def documents_in_toc_order(sections, seen=None):
+    """Yield (docname, title, link) for the internal entries of the TOC, each once."""
+    if seen is None:
+        seen = set()
+    for _, entries in sections:
+        for entry in entries:
+            docname = entry.get('docname')
+            if docname and docname not in seen:
+                seen.add(docname)
+                yield docname, entry['title'], entry['link']
+            yield from documents_in_toc_order(entry['children'], seen)
+
+
+def extra_documents(app, documents):
+    """Yield (docname, title, link) for the documents with a text that aren't in the TOC."""
+    env = app.builder.env
+    in_toc = {docname for docname, _, _ in documents}
+    for docname in sorted(get_hash_index(env).keys() - in_toc):
+        title = env.titles[docname].astext() if docname in env.titles else docname
+        yield docname, title, app.builder.get_target_uri(docname)
+
+
+def page_url(app, link):
+    """Turn a TOC link (relative to _static/) into a page URL."""
+    path = link[3:] if link.startswith('../') else link
+    base_url = app.config.html_baseurl
+    return base_url.rstrip('/') + '/' + path if base_url else path
+
+
+def page_path(app, docname):
+    """Path of the text of a page, relative to the output dir, next to its HTML file."""
+    html_path = os.path.relpath(app.builder.get_outfilename(docname), app.outdir)
+    suffix = app.config.llms_txt_page_suffix
+    if suffix == '.md' and not str(app.builder.env.doc2path(docname)).endswith('.md'):
+        # reST sources aren't Markdown; serve them as plain text
+        suffix = '.txt'
+    return os.path.splitext(html_path)[0] + suffix
+
+
+def find_headings(text):
+    """Yield (level, title, offset) of the ATX and setext headings of a Markdown text, skipping code fences."""
+    fence = None
+    offset = 0
+    previous = None
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        fence_match = FENCE_PATTERN.match(line)
+        heading = HEADING_PATTERN.match(line.rstrip('\n'))
+        paragraph = None
+        if fence:
+            if stripped.startswith(fence) and not stripped.strip(fence[0]):
+                fence = None
+        elif fence_match:
+            fence = fence_match.group(1)
+        elif heading:
+            yield len(heading.group(1)), heading.group(2), offset
+        elif previous and SETEXT_PATTERN.match(line):
+            yield 1 if stripped[0] == '=' else 2, previous[0], previous[1]
+        elif stripped:
+            paragraph = (stripped, offset)
+        previous = paragraph
+        offset += len(line)
+
+
+def normalize_title(title):
+    title = MARKDOWN_LINK_PATTERN.sub(r'\1', title).translate(SMART_QUOTES)
+    return ' '.join(re.sub(r'[`*_\\]', '', title).split()).casefold()
+
+
+def section_ranges(text, sections):
+    """
+    Match the headings of a text to the doctree sections, in order.
+
+    The heading the text starts with is taken for the document title when no
+    section has its title (the doctree's came from frontmatter).
+
+    Returns (anchor, title, level, start, end) with character offsets into
+    text; a section ends where the next heading of the same or a higher
+    level starts.
+    """
+    headings = list(find_headings(text))
+    keys = [normalize_title(title) for title, _ in sections]
+    ranges = []
+    position = 0
+    for i, (level, title, start) in enumerate(headings):
+        key = normalize_title(title)
+        match = next((j for j in range(position, len(keys)) if keys[j] == key), None)
+        if match is None and start == 0 and keys:
+            match = 0
+        if match is None:
+            continue
+        position = match + 1
+        end = next((offset for other, _, offset in headings[i + 1:] if other <= level), len(text))
+        ranges.append((sections[match][1], sections[match][0], level, start, end))
+    return ranges
+
+
+def estimate_tokens(size):
+    """Rough token count for size bytes of English text and code."""
+    return (size + 3) // 4
+
+
+class ShardWriter:
+    """Stream documents into numbered shard files that stay within a budget."""
+
+    def __init__(self, directory, stem, budget, unit):
+        self.directory = directory
+        self.stem = stem
+        self.budget = budget
+        self.unit = unit
+        self.shards = []
+        self.file = None
+
+    def cost(self, size):
+        return estimate_tokens(size) if self.unit == 'tokens' else size
+
+    def add(self, docname, title, data):
+        shard = self.shards[-1] if self.shards else None
+        # An oversized document gets a shard of its own rather than being split
+        if shard is None or (shard['docs'] and shard[self.unit] + self.cost(len(data)) > self.budget):
+            self.close()
+            name = f"{self.stem}-{len(self.shards) + 1:03d}.txt"
+            shard = {'file': name, 'docs': [], 'titles': [], 'bytes': 0, 'tokens': 0}
+            self.shards.append(shard)
+            self.file = open(os.path.join(self.directory, name), 'wb')
+        self.file.write(data)
+        shard['docs'].append(docname)
+        shard['titles'].append(title)
+        shard['bytes'] += len(data)
+        shard['tokens'] += estimate_tokens(len(data))
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+def remove_shards(directory, stem):
+    """Delete the shards and shard index of a previous build."""
+    pattern = re.compile(SHARD_NAME_PATTERN.format(stem=re.escape(stem)))
+    for name in os.listdir(directory):
+        if pattern.fullmatch(name):
+            os.remove(os.path.join(directory, name))
+
+
+def load_chunks(app, documents):
+    """Return {docname: (data, text)}: what is written for each document, and its text."""
+    hashes = get_hash_index(app.builder.env)
+    chunks = {}
+    for docname, title, link in documents:
+        if docname not in hashes:
+            continue
+        try:
+            with open(cache_path(app, hashes[docname]), 'r', encoding='utf-8') as f:
+                text = f.read()
+        except OSError:
+            logger.warning(f"No cached text for {docname}; rebuild with -E to regenerate the LLM text files")
+            continue
+        if not text.startswith('# '):
+            # The title came from frontmatter, which isn't part of the text
+            text = f"# {title}\n\n{text}"
+        data = f"---\ndoc: {docname}\nurl: {page_url(app, link)}\n---\n\n{text}\n".encode('utf-8')
+        chunks[docname] = (data, text)
+    return chunks
+
+
+def index_entry(app, docname, title, link, start, data, text):
+    """Byte ranges of a document and of its sections, for the index of an output."""
+    # The text sits between the frontmatter and the final newline
+    text_start = start + len(data) - len(text.encode('utf-8')) - 1
+    sections = {}
+    for anchor, section_title, level, begin, end in section_ranges(
+            text, get_section_index(app.builder.env).get(docname, [])):
+        sections[anchor] = {
+            'title': section_title,
+            'level': level,
+            'start': text_start + len(text[:begin].encode('utf-8')),
+            'end': text_start + len(text[:end].encode('utf-8')),
+        }
+    entry = {'title': title, 'url': page_url(app, link)}
+    if app.config.llms_txt_page_suffix:
+        entry['page'] = page_url(app, page_path(app, docname).replace(os.sep, '/'))
+    entry.update({'start': start, 'end': start + len(data), 'sections': sections})
+    return entry
+
+
+def index_name(name):
+    return f"{os.path.splitext(name)[0]}-index.json"
+
+
+def write_output(app, name, prefix, documents, chunks):
+    """Write one output file (its shards and its index); returns (documents written, bytes)."""
+    out_path = os.path.join(app.outdir, name)
+    stem = os.path.splitext(name)[0]
+    remove_shards(app.outdir, stem)
+    budget = app.config.llms_txt_shard_budget
+    shards = ShardWriter(app.outdir, stem, budget, app.config.llms_txt_shard_unit) if budget else None
+
+    docs = {}
+    size = 0
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'wb') as out:
+        header = f"# {app.config.project}\n\n".encode('utf-8')
+        out.write(header)
+        size += len(header)
+        for docname, title, link in documents:
+            if not docname.startswith(prefix) or docname not in chunks:
+                continue
+            data, text = chunks[docname]
+            docs[docname] = index_entry(app, docname, title, link, size, data, text)
+            out.write(data)
+            size += len(data)
+            if shards:
+                shards.add(docname, title, data)
+    os.replace(tmp_path, out_path)
+
+    index_path = os.path.join(app.outdir, index_name(name))
+    with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'source': name, 'bytes': size, 'docs': docs}, f, indent=1)
+    os.replace(index_path + '.tmp', index_path)
+
+    if shards:
+        shards.close()
+        with open(os.path.join(app.outdir, f"{stem}-shards.json"), 'w', encoding='utf-8') as f:
+            json.dump({'source': name, 'unit': shards.unit, 'budget': budget, 'shards': shards.shards},
+                      f, indent=1)
+        logger.info(f"Split {name} into {len(shards.shards)} shards of at most {budget} {shards.unit}")
+    return len(docs), size
+
+
+def write_pages(app, pages, chunks):
+    """
+    Write the text of each page next to its HTML file, leaving unchanged ones
+    alone, and delete those of pages that are gone. Returns (pages, rewritten).
+    """
+    record_path = os.path.join(app.doctreedir, PAGES_NAME)
+    try:
+        with open(record_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = []
+    written = []
+    rewritten = 0
+    for docname, _, _ in pages:
+        if docname not in chunks:
+            continue
+        relpath = page_path(app, docname)
+        path = os.path.join(app.outdir, relpath)
+        data = chunks[docname][0]
+        try:
+            with open(path, 'rb') as f:
+                unchanged = f.read() == data
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(path + '.tmp', path)
+            rewritten += 1
+        written.append(relpath)
+    for relpath in set(previous) - set(written):
+        try:
+            os.remove(os.path.join(app.outdir, relpath))
+        except OSError:
+            pass
+    with open(record_path, 'w', encoding='utf-8') as f:
+        json.dump(sorted(written), f, indent=1)
+    return len(written), rewritten
+
+
+def llms_txt_digest(app, documents, pages):
+    """Hash the navigation, the texts in order, the section anchors and the output settings."""
+    hashes = get_hash_index(app.builder.env)
+    sections = get_section_index(app.builder.env)
+    inputs = {
+        'navigation': navigation_digest(app, get_master_doc(app)),
+        'texts': [[docname, hashes.get(docname), link] for docname, _, link in documents],
+        'pages': [[docname, hashes.get(docname), link] for docname, _, link in pages],
+        'sections': {docname: sections.get(docname) for docname, _, _ in pages or documents},
+        'outputs': app.config.llms_txt_outputs,
+        'page_suffix': app.config.llms_txt_page_suffix,
+        'budget': app.config.llms_txt_shard_budget,
+        'unit': app.config.llms_txt_shard_unit,
+        'project': app.config.project,
+        'base_url': app.config.html_baseurl,
+    }
+    digest = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8'))
+    with open(__file__, 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def prune_cache(app):
+    """Remove cached texts no document refers to any more."""
+    cache_dir = os.path.join(app.doctreedir, CACHE_DIR)
+    live = {digest + '.md' for digest in get_hash_index(app.builder.env).values()}
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return
+    for name in names:
+        if name not in live:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+
+def generate_llms_txt(app, exception):
+    if exception or app.builder.format != 'html' or not app.config.llms_txt_outputs:
+        return
+    env = app.builder.env
+    if get_master_doc(app) not in env.found_docs:
+        return
+
+    documents = list(documents_in_toc_order(get_navigation(app)['sections']))
+    pages = documents + list(extra_documents(app, documents)) if app.config.llms_txt_page_suffix else []
+    digest = llms_txt_digest(app, documents, pages)
+    digest_path = os.path.join(app.doctreedir, DIGEST_NAME)
+    try:
+        with open(digest_path, 'r', encoding='utf-8') as f:
+            previous = f.read().strip()
+    except OSError:
+        previous = None
+    outputs = app.config.llms_txt_outputs
+    if previous == digest and all(os.path.exists(os.path.join(app.outdir, path))
+                                  for name in outputs for path in (name, index_name(name))):
+        logger.info(f"LLM text files reused: inputs unchanged (digest {digest[:12]})")
+        return
+
+    chunks = load_chunks(app, pages or documents)
+    for name, prefix in outputs.items():
+        written, size = write_output(app, name, prefix or '', documents, chunks)
+        logger.info(f"Generated {os.path.join(app.outdir, name)}: {written} documents, {size} bytes")
+    if pages:
+        written, rewritten = write_pages(app, pages, chunks)
+        logger.info(f"Wrote the texts of {written} pages, {rewritten} changed")
+    prune_cache(app)
+    with open(digest_path, 'w', encoding='utf-8') as f:
+        f.write(digest)
+
+
+def add_page_alternate(app, pagename, templatename, context, doctree):
+    """Point each page at its text."""
+    suffix = app.config.llms_txt_page_suffix
+    if not suffix or not app.config.llms_txt_outputs or pagename not in get_hash_index(app.builder.env):
+        return
+    href = os.path.basename(page_path(app, pagename))
+    content_type = mimetypes.guess_type(href)[0] or 'text/plain'
+    context['metatags'] = (context.get('metatags', '') +
+                           f'\n<link rel="alternate" type="{content_type}" href="{href}">')
+
+
+def setup(app):
+    # Output file name -> docname prefix of the documents it holds ('' for all)
+    app.add_config_value('llms_txt_outputs', {'llms-full.txt': ''}, '', [dict])
+    # Split each output into shards of at most this many units (0 disables)
+    app.add_config_value('llms_txt_shard_budget', 0, '', [int])
+    # 'bytes' or 'tokens' (estimated as bytes / 4)
+    app.add_config_value('llms_txt_shard_unit', 'tokens', '', ENUM('bytes', 'tokens'))
+    # Suffix of the text written next to each page's HTML ('.md', '.txt'; '' disables)
+    app.add_config_value('llms_txt_page_suffix', '.md', 'html', [str])
+
+    # Run after the conf.py hooks so the text is what MyST parses
+    app.connect('source-read', collect_text, priority=900)
+    app.connect('doctree-read', collect_sections)
+    app.connect('env-purge-doc', purge_text)
+    app.connect('env-merge-info', merge_text)
+    app.connect('html-page-context', add_page_alternate)
+    app.connect('build-finished', generate_llms_txt)
+
+    return {
+        'version': '0.1',
+        'env_version': 2,
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
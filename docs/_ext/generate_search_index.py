@@ -0,0 +1,203 @@
+"""
+Custom Sphinx extension that writes a prebuilt index for the sidebar search.
+
+The index lists every navigation entry and section heading with an integer
+id, its link and a precomputed breadcrumb, plus a sorted table of terms
+mapping to those ids. ``_static/search.js`` answers queries by binary search
+over the term table instead of walking the TOC DOM on every keystroke.
+"""
+import hashlib
+import json
+import os
+import re
+from docutils import nodes
+from sphinx.util import logging
+
+from .generate_toc_html import get_master_doc, get_navigation, navigation_digest, write_precompressed
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = 'toc-search-index.json'
+INDEX_VERSION = 1
+
+# Digest of the inputs used for the last index, kept next to the doctrees
+DIGEST_NAME = 'toc_search_index.digest'
+
+TERM_PATTERN = re.compile(r'[a-z0-9_]+')
+
+
+def get_heading_index(env):
+    if not hasattr(env, 'toc_search_headings'):
+        env.toc_search_headings = {}
+    return env.toc_search_headings
+
+
+def collect_headings(app, doctree):
+    """Record the section headings of a document (below its title)."""
+    max_depth = app.config.toc_search_heading_depth
+    headings = []
+    for section in doctree.findall(nodes.section):
+        depth = 0
+        parent = section.parent
+        while parent is not None:
+            if isinstance(parent, nodes.section):
+                depth += 1
+            parent = parent.parent
+        # depth 0 is the document title, which the TOC entry already covers
+        if depth == 0 or depth > max_depth or not section['ids']:
+            continue
+        if section.children and isinstance(section[0], nodes.title):
+            headings.append((section[0].astext(), section['ids'][0]))
+    get_heading_index(app.env)[app.env.docname] = headings
+
+
+def purge_headings(app, env, docname):
+    get_heading_index(env).pop(docname, None)
+
+
+def merge_headings(app, env, docnames, other):
+    index = get_heading_index(env)
+    other_index = get_heading_index(other)
+    for docname in docnames:
+        if docname in other_index:
+            index[docname] = other_index[docname]
+
+
+def breadcrumb(title, ancestors):
+    """
+    Build the display string search.js used to assemble from the DOM.
+
+    ancestors are the titles of the enclosing internal entries, nearest
+    first. The rules match getFullText in search.js: stop at the first
+    ancestor title containing a space (or named Interfaces/Types), then drop
+    the two outermost names if more than two were collected.
+    """
+    parts = [title]
+    for token in [title] + ancestors:
+        if ' ' in token or token in ('Interfaces', 'Types'):
+            break
+        if parts[-1] != token:
+            parts.append(token)
+    if len(parts) > 2:
+        parts.pop()
+        parts.pop()
+    parts.reverse()
+    return '.'.join(parts)
+
+
+def terms_for(*texts):
+    terms = set()
+    for text in texts:
+        terms.update(TERM_PATTERN.findall(text.lower()))
+    return terms
+
+
+def build_search_index(sections, headings):
+    """
+    Return the index as a dict: docs is a list of [display, href, title] rows
+    and terms/postings is a sorted term table mapping each term to doc ids.
+    """
+    docs = []
+    postings = {}
+    seen = set()
+
+    def add(display, href, title, terms):
+        if (display, href) in seen:
+            return
+        seen.add((display, href))
+        doc_id = len(docs)
+        docs.append([display, href, title])
+        for term in terms:
+            postings.setdefault(term, []).append(doc_id)
+
+    def walk(sections, ancestors):
+        for _, entries in sections:
+            for entry in entries:
+                title = entry['title']
+                href = entry['link']
+                if href.startswith(('http://', 'https://', 'mailto:')):
+                    continue
+                display = breadcrumb(title, ancestors)
+                add(display, href, title, terms_for(title, *ancestors))
+                docname = entry.get('docname')
+                for heading, anchor in headings.get(docname, ()) if docname else ():
+                    add(f'{heading} - {title}', f'{href}#{anchor}', heading,
+                        terms_for(heading, title))
+                if entry['children']:
+                    walk(entry['children'], [title] + ancestors)
+
+    walk(sections, [])
+    terms = sorted(postings)
+    return {
+        'version': INDEX_VERSION,
+        'docs': docs,
+        'terms': terms,
+        'postings': [postings[term] for term in terms],
+    }
+
+
+def search_index_digest(app):
+    """Hash the navigation inputs, the collected headings and this module's code."""
+    headings = get_heading_index(app.builder.env)
+    digest = hashlib.sha256(navigation_digest(app, get_master_doc(app)).encode('utf-8'))
+    digest.update(json.dumps([[docname, headings[docname]] for docname in sorted(headings)]).encode('utf-8'))
+    with open(__file__, 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def generate_search_index(app, exception):
+    if exception or app.builder.format != 'html':
+        return
+    env = app.builder.env
+    if get_master_doc(app) not in env.found_docs:
+        return
+
+    out_path = os.path.join(app.outdir, '_static', INDEX_NAME)
+    digest_path = os.path.join(app.doctreedir, DIGEST_NAME)
+    digest = search_index_digest(app)
+    try:
+        with open(digest_path, 'r', encoding='utf-8') as f:
+            unchanged = f.read().strip() == digest and os.path.exists(out_path)
+    except OSError:
+        unchanged = False
+    if unchanged:
+        # Skip the traversal and keep the file's mtime so caches stay valid
+        logger.info(f"Search index reused: inputs unchanged (digest {digest[:12]})")
+        return
+
+    index = build_search_index(get_navigation(app)['sections'], get_heading_index(env))
+    data = json.dumps(index, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    budget = app.config.toc_search_index_budget
+    if budget and len(data) > budget:
+        logger.warning(f"Search index is {len(data)} bytes, over the budget of {budget} bytes")
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, 'wb') as f:
+        f.write(data)
+    if app.config.toc_html_precompress:
+        write_precompressed(out_path, data)
+    with open(digest_path, 'w', encoding='utf-8') as f:
+        f.write(digest)
+    logger.info(f"Generated {out_path}: {len(index['docs'])} entries, "
+                f"{len(index['terms'])} terms, {len(data)} bytes")
+
+
+def setup(app):
+    # Section headings deeper than this are not indexed (1 = top-level sections)
+    app.add_config_value('toc_search_heading_depth', 2, 'env', [int])
+    # Warn when the serialized index grows past this many bytes (0 disables)
+    app.add_config_value('toc_search_index_budget', 1024 * 1024, '', [int])
+
+    app.connect('doctree-read', collect_headings)
+    app.connect('env-purge-doc', purge_headings)
+    app.connect('env-merge-info', merge_headings)
+    app.connect('build-finished', generate_search_index)
+
+    return {
+        'version': '0.1',
+        'env_version': 1,
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
@@ -1,9 +1,125 @@
+import argparse
+import functools
 import re
+import gzip
+import hashlib
+import json
+import pickle
 from pathlib import Path
 from sphinx.util import logging
 from sphinx import addnodes
+from sphinx.util.osutil import relative_uri
 from docutils import nodes
 import os
+import sys
+import time
+from urllib.parse import quote
+
+# Digest of the navigation inputs used for the last toc.html, kept next to the
+# doctrees so an unchanged navigation graph skips traversal and the write
+DIGEST_NAME = 'toc_html.digest'
+
+# Rendered HTML of each document's subtree from the last build, and the shard
+# files it relies on, keyed by docname
+FRAGMENT_CACHE_NAME = 'toc_html_fragments.pickle'
+
+# Directory under _static holding the lazily loaded subtrees in shard mode
+SHARD_DIR = 'toc'
+
+# Stands for the path from a page to the site root in the inline sidebar
+SIDEBAR_ROOT = '{{toc-root}}/'
+
+# Where the inline sidebar marks the current page, while it is rendered
+MARK_PATTERN = re.compile(r'\x00(\d+)\x00')
+
+# The sidebar search box, driven by _static/search.js
+TOC_SEARCH_PANEL = """    <div id="tocSearchPanel">
+        <div id="tocSearchPanelInner">
+            <input type="text" id="txtSearch" placeholder="Search..." autocomplete="off" />
+        </div>
+        <div id="tocSearchResult" style="display: none;"></div>
+    </div>
+"""
+
+# The page around the rendered tree in _static/toc.html
+TOC_PAGE_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Table of Contents</title>
+    <link rel="stylesheet" href="styles/furo.css">
+    <link rel="stylesheet" href="styles/furo-extensions.css">
+    <link rel="stylesheet" href="theme_overrides.css">
+    <style>
+        /* Make iframe body fill height and be scrollable */
+        html, body {
+            height: 100%;
+            margin: 0;
+            padding: 0;
+            overflow: hidden;
+            background: var(--color-sidebar-background);
+        }
+        
+        /* Keep search panel fixed at top */
+        #tocSearchPanel {
+            position: sticky;
+            top: 0;
+            z-index: 10;
+            background: var(--color-sidebar-background, #f8f9fb);
+        }
+        
+        /* Use flexbox for proper layout */
+        .content-container {
+            height: 100vh;
+            display: flex;
+            flex-direction: column;
+            background: var(--color-sidebar-background);
+        }
+        
+        /* Search panel takes its natural height */
+        #tocSearchPanel {
+            flex-shrink: 0;
+        }
+        
+        /* TOC content fills remaining space and scrolls */
+        .toc-content {
+            flex: 1;
+            overflow-y: auto;
+            overflow-x: hidden;
+            background: var(--color-sidebar-background);
+        }
+        
+        /* Style for current page */
+        .sidebar-tree .current-page > .reference {
+            font-weight: bold;
+        }
+    </style>
+    
+    <!-- SVG symbol definitions for navigation arrows (matching Sphinx/Furo) -->
+    <svg style="display: none;">
+      <symbol id="svg-arrow-right" viewBox="0 0 24 24">
+        <title>Expand</title>
+        <svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="none" stroke="currentColor"
+          stroke-width="2" stroke-linecap="round" stroke-linejoin="round" class="feather-chevron-right">
+          <polyline points="9 18 15 12 9 6"></polyline>
+        </svg>
+      </symbol>
+    </svg>
+    <script src="iframe_theme_receiver.js"></script>
+</head>
+<body data-theme="auto">
+<div class="content-container">
+""" + TOC_SEARCH_PANEL + """    <div class="toc-content">
+"""
+
+TOC_PAGE_TAIL = """
+    </div>
+</div>
+<script src="toc-highlight.js"></script>
+<script src="search.js"></script>
+</body>
+</html>"""
 
 def extract_commented_toctree(content):
     """Extract the toctree content from a commented block."""
@@ -51,11 +167,49 @@ def parse_toctree_entries(content):
                 entries.append((None, link))
     return entries
 
+def get_toc_index(env):
+    """Return the per-document toctree/title index stored on the environment."""
+    if not hasattr(env, 'toc_html_index'):
+        env.toc_html_index = {}
+    return env.toc_html_index
+
+def collect_commented_toctree(app, docname, source):
+    """Record a document's commented toctree block while its source is in memory."""
+    entry = get_toc_index(app.env).setdefault(docname, {})
+    entry['commented'] = extract_commented_toctree(source[0])
+
+def collect_toc_index(app, doctree):
+    """Record a document's title and toctrees once it has been parsed."""
+    entry = get_toc_index(app.env).setdefault(app.env.docname, {})
+    entry['title'] = None
+    for node in doctree.findall(nodes.title):
+        entry['title'] = node.astext()
+        break
+    entry['toctrees'] = [
+        {
+            'caption': node.get('caption'),
+            'maxdepth': node.get('maxdepth'),
+            'entries': list(node['entries']),
+        }
+        for node in doctree.findall(addnodes.toctree)
+    ]
+
+def purge_toc_index(app, env, docname):
+    get_toc_index(env).pop(docname, None)
+
+def merge_toc_index(app, env, docnames, other):
+    """Merge the index built by a parallel reader process."""
+    index = get_toc_index(env)
+    other_index = get_toc_index(other)
+    for docname in docnames:
+        if docname in other_index:
+            index[docname] = other_index[docname]
+
 def get_title(env, docname):
-    """Get the title of a document from its doctree."""
-    doctree = env.get_doctree(docname)
-    for node in doctree.traverse(nodes.title):
-        return node.astext()
+    """Get the title of a document from the toc index."""
+    entry = get_toc_index(env).get(docname)
+    if entry and entry.get('title'):
+        return entry['title']
     return docname
 
 def get_docname_from_link(env, current_doc, link):
@@ -76,10 +230,17 @@ def get_docname_from_link(env, current_doc, link):
         docname = docname.rsplit('.', 1)[0]
     return docname
 
-def process_document(env, docname, parent_maxdepth=1, processed_docs=None):
-    """Process a single document for both commented and uncommented toctrees."""
+def process_document(env, docname, parent_maxdepth=1, processed_docs=None, target_uri=None):
+    """
+    Process a single document for both commented and uncommented toctrees.
+
+    target_uri(docname) gives the URI of a document relative to the site
+    root; it defaults to the current builder's get_target_uri.
+    """
     if processed_docs is None:
         processed_docs = set()
+    if target_uri is None:
+        target_uri = env.app.builder.get_target_uri
     
     if docname in processed_docs:
         return []
@@ -88,15 +249,11 @@ def process_document(env, docname, parent_maxdepth=1, processed_docs=None):
     logger = logging.getLogger(__name__)
     sections = []
     
-    # Get the document's doctree
-    doctree = env.get_doctree(docname)
+    # Everything we need was recorded in the toc index while the document was read
+    doc_index = get_toc_index(env).get(docname, {})
     
     # First check for commented toctree
-    doc_path = env.doc2path(docname)
-    with open(doc_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    toctree_content = extract_commented_toctree(content)
+    toctree_content = doc_index.get('commented')
     if toctree_content:
         logger.info(f"Found commented toctree in {docname}")
         # Parse toctree options and entries
@@ -119,28 +276,28 @@ def process_document(env, docname, parent_maxdepth=1, processed_docs=None):
                 ref = get_docname_from_link(env, docname, link)
                 if ref in env.found_docs:
                     # Recursively process the referenced document
-                    sub_sections = process_document(env, ref, parent_maxdepth, processed_docs)
+                    sub_sections = process_document(env, ref, parent_maxdepth, processed_docs, target_uri)
                     processed_entries.append({
                         'title': title or get_title(env, ref),
-                        'link': '../' + env.app.builder.get_target_uri(ref).lstrip('/'),
+                        'link': '../' + target_uri(ref).lstrip('/'),
+                        'docname': ref,
                         'children': sub_sections
                     })
                 else:
                     # Link not found
                     processed_entries.append({
                         'title': title or link,
-                        'link': '../' + env.app.builder.get_target_uri(link).lstrip('/'), # Use original link for not found
+                        'link': '../' + target_uri(link).lstrip('/'), # Use original link for not found
                         'children': []
                     })
         sections.append((None, processed_entries))
     
     # Then process uncommented toctrees
-    uncommented_toctrees = list(doctree.traverse(addnodes.toctree))
-    for node in uncommented_toctrees:
-        caption = node.get('caption')
-        maxdepth = node.get('maxdepth', parent_maxdepth)
+    for toctree in doc_index.get('toctrees', []):
+        caption = toctree['caption']
+        maxdepth = toctree['maxdepth'] if toctree['maxdepth'] is not None else parent_maxdepth
         entries = []
-        for (title, link) in node['entries']:
+        for (title, link) in toctree['entries']:
             if link.startswith(('http://', 'https://', 'mailto:')):
                 # External link
                 entries.append({
@@ -153,44 +310,178 @@ def process_document(env, docname, parent_maxdepth=1, processed_docs=None):
                 ref = get_docname_from_link(env, docname, link)
                 if ref in env.found_docs:
                     # Recursively process the referenced document
-                    sub_sections = process_document(env, ref, maxdepth, processed_docs)
+                    sub_sections = process_document(env, ref, maxdepth, processed_docs, target_uri)
                     entries.append({
                         'title': title or get_title(env, ref),
-                        'link': '../' + env.app.builder.get_target_uri(ref).lstrip('/'),
+                        'link': '../' + target_uri(ref).lstrip('/'),
+                        'docname': ref,
                         'children': sub_sections
                     })
                 else:
                     # Link not found
                     entries.append({
                         'title': title or link,
-                        'link': '../' + env.app.builder.get_target_uri(link).lstrip('/'), # Use original link for not found
+                        'link': '../' + target_uri(link).lstrip('/'), # Use original link for not found
                         'children': []
                     })
         sections.append((caption, entries))
     
     return sections
 
-def render_toc_html_from_doctree(sections):
-    """Render the TOC as HTML using Sphinx's native toctree structure."""
-    html = ['<div class="sidebar-tree">']
-    checkbox_counter = {'value': 1}  # Use a mutable container to track counter
-    
+class LineWriter:
+    """Stream lines to write(), separated by newlines, without building a list."""
+    def __init__(self, write):
+        self.write = write
+        self.first = True
+
+    def __call__(self, line):
+        if self.first:
+            self.first = False
+        else:
+            self.write('\n')
+        self.write(line)
+
+def entry_token(entry):
+    """
+    Return a short token that depends only on the entry itself.
+
+    It names the entry's checkbox and, in shard mode, its shard file. A running
+    counter would renumber every later checkbox whenever one branch changes,
+    which would invalidate all cached fragments after it.
+    """
+    seed = entry.get('docname') or entry['link']
+    return hashlib.sha1(seed.encode('utf-8')).hexdigest()[:10]
+
+def checkbox_id_for(entry):
+    return 'toctree-checkbox-' + entry_token(entry)
+
+def shard_path_for(entry):
+    """Path of the file holding an entry's children, relative to _static."""
+    return f'{SHARD_DIR}/{entry_token(entry)}.html'
+
+def is_shard_root(level, shard_depth):
+    """Whether the children of an entry at this level are loaded lazily."""
+    return bool(shard_depth) and level % shard_depth == 0
+
+def compute_shard_chains(sections, shard_depth, level=1, chain=(), chains=None):
+    """
+    Map each docname to the shards that must be loaded, in order, to show its
+    entry in the sidebar and expand its children.
+    """
+    if chains is None:
+        chains = {}
+    for _, entries in sections:
+        for entry in entries:
+            child_chain = chain
+            if entry['children'] and is_shard_root(level, shard_depth):
+                child_chain = chain + (shard_path_for(entry),)
+            docname = entry.get('docname')
+            if docname and docname not in chains:
+                chains[docname] = list(child_chain)
+            if entry['children']:
+                compute_shard_chains(entry['children'], shard_depth, level + 1, child_chain, chains)
+    return chains
+
+@functools.lru_cache(maxsize=None)
+def code_digest():
+    """Hash of this module's code, so output rendered by an older version isn't reused."""
+    with open(__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def compute_fragment_keys(sections, level, keys, shard_depth=0):
+    """
+    Fill keys with {id(entry): key} for every entry that has children.
+
+    A key covers everything the entry's rendered HTML depends on, including the
+    keys of its children and the renderer's code, so an unchanged key means an
+    unchanged fragment.
+    """
+    parts = []
+    for caption, entries in sections:
+        entry_parts = []
+        for entry in entries:
+            child_key = None
+            if entry['children']:
+                child_key = compute_fragment_keys(entry['children'], level + 1, keys, shard_depth)
+                keys[id(entry)] = hashlib.sha1(json.dumps(
+                    [code_digest(), level, shard_depth, entry['title'], entry['link'], entry.get('docname'),
+                     child_key]
+                ).encode('utf-8')).hexdigest()
+            entry_parts.append([entry['title'], entry['link'], child_key and keys[id(entry)]])
+        parts.append([caption, entry_parts])
+    return hashlib.sha1(json.dumps(parts).encode('utf-8')).hexdigest()
+
+def render_toc_html_from_doctree(sections, write=None, fragment_cache=None,
+                                 shard_depth=0, write_shard=None, has_shard=None, shards=None,
+                                 marks=None):
+    """
+    Render the TOC as HTML using Sphinx's native toctree structure.
+
+    The HTML is streamed to write() when given, otherwise it is returned as a
+    string. fragment_cache maps docname -> (key, html, shard paths) for
+    subtrees rendered by a previous call; unchanged subtrees are copied from
+    it instead of being rendered again, and re-rendered ones are stored back
+    into it.
+
+    With a shard_depth, the children of entries at every shard_depth-th level
+    are not inlined; they are passed to write_shard(path, html) instead and
+    the entry points at them with a data-toc-shard attribute. A cached
+    fragment is only reused if has_shard(path) is true for every shard below
+    it. The paths of all the shards the TOC refers to are appended to shards.
+
+    With a marks list, a numbered placeholder (see MARK_PATTERN) is left
+    wherever the inline sidebar marks the current page, and mark number n is
+    (id(entry), slot) at marks[n] (see TocRenderContext.mark).
+    """
+    render = TocRenderContext(fragment_cache, shard_depth, write_shard, has_shard, marks)
+    chunks = None
+    if write is None:
+        chunks = []
+        write = chunks.append
+    emit = LineWriter(write)
+
+    if fragment_cache is not None:
+        compute_fragment_keys(sections, 1, render.keys, shard_depth)
+
+    emit('<div class="sidebar-tree">')
     for caption, entries in sections:
         if caption:
-            html.append(f'  <p class="caption" role="heading"><span class="caption-text">{caption}</span></p>')
-            html.append('<ul>')
-            for entry in entries:
-                html.extend(render_entry(entry, level=1, indent=0, checkbox_counter=checkbox_counter))
-            html.append('</ul>')
-        else:
-            html.append('<ul>')
-            for entry in entries:
-                html.extend(render_entry(entry, level=1, indent=0, checkbox_counter=checkbox_counter))
-            html.append('</ul>')
-    html.append('</div>')
-    return '\n'.join(html)
-
-def render_entry(entry, level=1, indent=0, checkbox_counter=None):
+            emit(f'  <p class="caption" role="heading"><span class="caption-text">{caption}</span></p>')
+        emit('<ul>')
+        for entry in entries:
+            render_entry(entry, emit, 1, render)
+        emit('</ul>')
+    emit('</div>')
+
+    if shards is not None:
+        shards.extend(render.shards)
+    if chunks is not None:
+        return ''.join(chunks)
+
+class TocRenderContext:
+    """Settings and caches shared by all render_entry calls of one render."""
+    def __init__(self, fragment_cache=None, shard_depth=0, write_shard=None, has_shard=None, marks=None):
+        self.fragment_cache = fragment_cache
+        self.shard_depth = shard_depth if write_shard else 0
+        self.write_shard = write_shard
+        self.has_shard = has_shard or (lambda path: True)
+        self.keys = {}
+        # Shards written or relied on so far, in render order
+        self.shards = []
+        self.marks = marks
+
+    def mark(self, entry, slot):
+        """
+        Placeholder for where the inline sidebar marks entry as current: the
+        end of its <li> classes ('li'), the start of its <a> classes ('a') or
+        the end of its checkbox tag ('checkbox'). Empty unless recording marks.
+        """
+        if self.marks is None:
+            return ''
+        self.marks.append((id(entry), slot))
+        return f'\x00{len(self.marks) - 1}\x00'
+
+def render_entry(entry, emit, level=1, render=None):
     """Render a single TOC entry with Sphinx's native CSS classes and structure."""
     # Determine if this entry has children
     has_children = bool(entry['children'])
@@ -200,150 +491,465 @@ def render_entry(entry, level=1, indent=0, checkbox_counter=None):
     if has_children:
         classes.append('has-children')
     
-    html = []
-    
-    if has_children:
-        # For entries with children, use single-line compact format like example.html
-        checkbox_id = f'toctree-checkbox-{checkbox_counter["value"]}'
-        checkbox_counter['value'] += 1
-        
-        # Build the complete line in one go
-        if entry['link'].startswith(('http://', 'https://', 'mailto:')):
-            # External link
-            line = f'<li class="{" ".join(classes)}"><a class="reference external" href="{entry["link"]}" target="_parent">{entry["title"]}</a><input class="toctree-checkbox" id="{checkbox_id}" name="{checkbox_id}" role="switch" type="checkbox"/><label for="{checkbox_id}"><div class="visually-hidden">Toggle navigation of {entry["title"]}</div><i class="icon"><svg><use href="#svg-arrow-right"></use></svg></i></label><ul>'
-        else:
-            # Internal link
-            line = f'<li class="{" ".join(classes)}"><a class="reference internal" href="{entry["link"]}" target="_parent">{entry["title"]}</a><input class="toctree-checkbox" id="{checkbox_id}" name="{checkbox_id}" role="switch" type="checkbox"/><label for="{checkbox_id}"><div class="visually-hidden">Toggle navigation of {entry["title"]}</div><i class="icon"><svg><use href="#svg-arrow-right"></use></svg></i></label><ul>'
-        
-        html.append(line)
-        
-        # Add children
-        for child_caption, child_entries in entry['children']:
-            if child_caption:
-                html.append(f'<p class="caption" role="heading"><span class="caption-text">{child_caption}</span></p>')
-                for child in child_entries:
-                    html.extend(render_entry(child, level=level+1, indent=0, checkbox_counter=checkbox_counter))
-            else:
-                for child in child_entries:
-                    html.extend(render_entry(child, level=level+1, indent=0, checkbox_counter=checkbox_counter))
-        html.append('</ul>')
-        html.append('</li>')
+    if render is None:
+        render = TocRenderContext()
+
+    if entry['link'].startswith(('http://', 'https://', 'mailto:')):
+        anchor = f'<a class="reference external" href="{entry["link"]}" target="_parent">{entry["title"]}</a>'
     else:
+        anchor = (f'<a class="{render.mark(entry, "a")}reference internal" href="{entry["link"]}" '
+                  f'target="_parent">{entry["title"]}</a>')
+    classes = ' '.join(classes) + render.mark(entry, 'li')
+
+    if not has_children:
         # For simple entries without children, use single-line format like example.html
-        if entry['link'].startswith(('http://', 'https://', 'mailto:')):
-            # External link
-            html.append(f'<li class="{" ".join(classes)}"><a class="reference external" href="{entry["link"]}" target="_parent">{entry["title"]}</a></li>')
-        else:
-            # Internal link
-            html.append(f'<li class="{" ".join(classes)}"><a class="reference internal" href="{entry["link"]}" target="_parent">{entry["title"]}</a></li>')
-    
-    return html
+        emit(f'<li class="{classes}">{anchor}</li>')
+        return
+
+    # Reuse the fragment from a previous render if nothing below this entry changed
+    docname = entry.get('docname')
+    key = render.keys.get(id(entry))
+    if render.fragment_cache is not None and docname and key:
+        cached = render.fragment_cache.get(docname)
+        # Entries from before shard paths were recorded have two fields
+        if cached and len(cached) == 3 and cached[0] == key and all(map(render.has_shard, cached[2])):
+            render.shards.extend(cached[2])
+            emit(cached[1])
+            return
+        lines = []
+        first_shard = len(render.shards)
+        render_entry_with_children(entry, classes, anchor, LineWriter(lines.append), level, render)
+        fragment = ''.join(lines)
+        render.fragment_cache[docname] = (key, fragment, render.shards[first_shard:])
+        emit(fragment)
+        return
+
+    render_entry_with_children(entry, classes, anchor, emit, level, render)
+
+def render_entry_with_children(entry, classes, anchor, emit, level, render):
+    # For entries with children, use single-line compact format like example.html
+    checkbox_id = checkbox_id_for(entry)
+    toggle = f'<input class="toctree-checkbox" id="{checkbox_id}" name="{checkbox_id}" role="switch" type="checkbox"{render.mark(entry, "checkbox")}/><label for="{checkbox_id}"><div class="visually-hidden">Toggle navigation of {entry["title"]}</div><i class="icon"><svg><use href="#svg-arrow-right"></use></svg></i></label>'
+
+    if is_shard_root(level, render.shard_depth):
+        # Children live in their own file, fetched by toc-highlight.js on demand
+        shard_path = shard_path_for(entry)
+        emit(f'<li class="{classes}" data-toc-shard="{shard_path}">{anchor}{toggle}<ul>')
+        lines = []
+        render_children(entry, LineWriter(lines.append), level, render)
+        render.write_shard(shard_path, ''.join(lines))
+        render.shards.append(shard_path)
+    else:
+        emit(f'<li class="{classes}">{anchor}{toggle}<ul>')
+        render_children(entry, emit, level, render)
+    emit('</ul>')
+    emit('</li>')
+
+def render_children(entry, emit, level, render):
+    for child_caption, child_entries in entry['children']:
+        if child_caption:
+            emit(f'<p class="caption" role="heading"><span class="caption-text">{child_caption}</span></p>')
+        for child in child_entries:
+            render_entry(child, emit, level + 1, render)
+
+def navigation_digest(app, master_doc):
+    """
+    Hash everything toc.html is built from: the toctree/title index, the set
+    of known documents, how target URIs are formed, and this module's code.
+    """
+    env = app.builder.env
+    index = get_toc_index(env)
+    inputs = {
+        'master_doc': master_doc,
+        'srcdir': str(env.srcdir),
+        'builder': app.builder.name,
+        'link_suffix': getattr(app.builder, 'link_suffix', None),
+        'shard_depth': app.config.toc_html_shard_depth,
+        'precompress': app.config.toc_html_precompress,
+        'found_docs': sorted(env.found_docs),
+        'index': [[docname, index[docname]] for docname in sorted(index)],
+        'code': code_digest(),
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def read_previous_digest(app):
+    """Return the digest of the last written TOC and the shard paths it refers to."""
+    try:
+        with open(os.path.join(app.doctreedir, DIGEST_NAME), 'r', encoding='utf-8') as f:
+            lines = f.read().split()
+    except OSError:
+        return None, []
+    return (lines[0] if lines else None), lines[1:]
+
+def write_digest(app, digest, shards=()):
+    os.makedirs(app.doctreedir, exist_ok=True)
+    with open(os.path.join(app.doctreedir, DIGEST_NAME), 'w', encoding='utf-8') as f:
+        f.write('\n'.join([digest, *shards]))
+
+def toc_files_present(out_path, shards, precompress):
+    """Whether toc.html, its shards and (when precompressing) their .gz copies are all on disk."""
+    static_dir = os.path.dirname(out_path)
+    paths = [out_path] + [os.path.join(static_dir, shard_path) for shard_path in shards]
+    return all(os.path.exists(path) and (not precompress or os.path.exists(path + '.gz')) for path in paths)
+
+def get_master_doc(app):
+    return app.config.master_doc if hasattr(app.config, 'master_doc') else 'index'
+
+def get_navigation(app):
+    """
+    Return the navigation tree for the current build as a dict with
+    'sections' and, in shard mode, 'chains' (see compute_shard_chains).
+
+    Computed at most once per build; reset_navigation clears it when the
+    environment changes.
+    """
+    navigation = getattr(app, 'toc_html_navigation', None)
+    if navigation is None:
+        env = app.builder.env
+        sections = process_document(env, get_master_doc(app))
+        navigation = {'sections': sections, 'chains': {}}
+        if app.config.toc_html_shard_depth:
+            navigation['chains'] = compute_shard_chains(sections, app.config.toc_html_shard_depth)
+        app.toc_html_navigation = navigation
+    return navigation
+
+def reset_navigation(app, env):
+    app.toc_html_navigation = None
+    app.toc_html_sidebar = None
+    # Pages need their shard chains or inline sidebar while they are written,
+    # possibly in forked writer processes, so build them up front
+    if get_master_doc(app) in env.found_docs:
+        if app.config.toc_html_shard_depth:
+            get_navigation(app)
+        if app.config.toc_html_inline_sidebar:
+            get_inline_sidebar(app)
+
+def add_toc_shard_meta(app, pagename, templatename, context, doctree):
+    """Tell the sidebar which shards to load to reveal the current page."""
+    if not app.config.toc_html_shard_depth or get_master_doc(app) not in app.builder.env.found_docs:
+        return
+    chain = get_navigation(app)['chains'].get(pagename)
+    if chain:
+        context['metatags'] = context.get('metatags', '') + f'\n<meta name="toc-shards" content="{" ".join(chain)}">'
+
+def compute_ancestor_chains(sections, level=1, chain=(), chains=None):
+    """Map each docname to the (level, entry) pairs from the top of the tree down to its entry."""
+    if chains is None:
+        chains = {}
+    for _, entries in sections:
+        for entry in entries:
+            entry_chain = chain + ((level, entry),)
+            docname = entry.get('docname')
+            if docname and docname not in chains:
+                chains[docname] = entry_chain
+            if entry['children']:
+                compute_ancestor_chains(entry['children'], level + 1, entry_chain, chains)
+    return chains
+
+def get_inline_sidebar(app):
+    """
+    Return the sidebar inlined into pages as a dict with 'html', 'slots' and 'chains'.
+
+    The tree is rendered once per build, in full, with internal links relative
+    to the site root behind SIDEBAR_ROOT; inline_sidebar_for_page fills in the
+    path to the root and expands the branch of each page. 'slots' maps
+    id(entry) -> {slot: offset in html} for the current-page markers.
+    """
+    sidebar = getattr(app, 'toc_html_sidebar', None)
+    if sidebar is None:
+        sections = get_navigation(app)['sections']
+        marks = []
+        html = render_toc_html_from_doctree(sections, marks=marks)
+        # Links open in the page itself rather than the iframe's parent
+        html = TOC_SEARCH_PANEL + html.replace(' target="_parent"', '').replace('href="../', 'href="' + SIDEBAR_ROOT)
+        parts = []
+        slots = {}
+        offset = 0
+        for i, part in enumerate(MARK_PATTERN.split(html)):
+            if i % 2:
+                entry_id, slot = marks[int(part)]
+                slots.setdefault(entry_id, {})[slot] = offset
+            else:
+                parts.append(part)
+                offset += len(part)
+        sidebar = app.toc_html_sidebar = {
+            'html': ''.join(parts),
+            'slots': slots,
+            'chains': compute_ancestor_chains(sections),
+        }
+    return sidebar
+
+def inline_sidebar_for_page(sidebar, pagename, root):
+    """Mark the page and its ancestors current and expanded, and resolve links from the page."""
+    html = sidebar['html']
+    chain = sidebar['chains'].get(pagename, ())
+    inserts = []
+    for i, (level, entry) in enumerate(chain):
+        slots = sidebar['slots'].get(id(entry), {})
+        current = ' current current-page' if i == len(chain) - 1 else ' current'
+        for slot, text in (('li', current), ('a', 'current '), ('checkbox', ' checked=""')):
+            if slot in slots:
+                inserts.append((slots[slot], text))
+    parts = []
+    last = 0
+    for offset, text in sorted(inserts):
+        parts.append(html[last:offset])
+        parts.append(text)
+        last = offset
+    parts.append(html[last:])
+    return ''.join(parts).replace(SIDEBAR_ROOT, root)
+
+def add_inline_sidebar(app, pagename, templatename, context, doctree):
+    """Hand the rendered sidebar to _templates/sidebar/navigation.html in place of the iframe."""
+    if not app.config.toc_html_inline_sidebar or get_master_doc(app) not in app.builder.env.found_docs:
+        return
+    root = relative_uri(app.builder.get_target_uri(pagename), '')
+    context['toc_sidebar_html'] = inline_sidebar_for_page(get_inline_sidebar(app), pagename, root)
+
+def write_precompressed(path, data):
+    """Write .gz (and, if the brotli module is available, .br) siblings of path."""
+    with open(path + '.gz', 'wb') as f:
+        # mtime=0 keeps the output byte-identical across builds
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    try:
+        import brotli
+    except ImportError:
+        return
+    with open(path + '.br', 'wb') as f:
+        f.write(brotli.compress(data))
+
+def load_fragment_cache(app):
+    try:
+        with open(os.path.join(app.doctreedir, FRAGMENT_CACHE_NAME), 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return {}
+
+def save_fragment_cache(app, fragment_cache, found_docs):
+    # Drop documents that no longer exist so the cache can't grow without bound
+    for docname in [docname for docname in fragment_cache if docname not in found_docs]:
+        del fragment_cache[docname]
+    os.makedirs(app.doctreedir, exist_ok=True)
+    with open(os.path.join(app.doctreedir, FRAGMENT_CACHE_NAME), 'wb') as f:
+        pickle.dump(fragment_cache, f, pickle.HIGHEST_PROTOCOL)
+
+def remove_stale_shards(static_dir, shards, precompress):
+    """Delete the shard files (and compressed copies) that the TOC no longer refers to."""
+    shard_dir = os.path.join(static_dir, SHARD_DIR)
+    try:
+        names = os.listdir(shard_dir)
+    except OSError:
+        return
+    live = {shard_path[len(SHARD_DIR) + 1:] for shard_path in shards}
+    for name in names:
+        base, ext = os.path.splitext(name)
+        if name in live or (precompress and ext in ('.gz', '.br') and base in live):
+            continue
+        try:
+            os.remove(os.path.join(shard_dir, name))
+        except OSError:
+            pass
+
+def write_toc_page(out_path, sections, fragment_cache=None, shard_depth=0, precompress=False):
+    """
+    Write toc.html (and in shard mode its shards) for sections; returns the
+    number of shards written and the paths of all the shards it refers to.
+    """
+    static_dir = os.path.dirname(out_path)
+    shard_count = 0
+    shards = []
+
+    def write_shard(shard_path, html):
+        nonlocal shard_count
+        shard_count += 1
+        path = os.path.join(static_dir, shard_path)
+        data = html.encode('utf-8')
+        with open(path, 'wb') as f:
+            f.write(data)
+        if precompress:
+            write_precompressed(path, data)
+
+    def has_shard(shard_path):
+        path = os.path.join(static_dir, shard_path)
+        return os.path.exists(path) and (not precompress or os.path.exists(path + '.gz'))
+
+    # Write the TOC to _static/toc.html with sphinx toctree styling, streaming the
+    # tree straight into the file. Write to a temporary name first so a failed
+    # build never leaves a truncated toc.html behind.
+    os.makedirs(static_dir, exist_ok=True)
+    if shard_depth:
+        os.makedirs(os.path.join(static_dir, SHARD_DIR), exist_ok=True)
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(TOC_PAGE_HEAD)
+        render_toc_html_from_doctree(sections, f.write, fragment_cache, shard_depth, write_shard,
+                                     has_shard, shards)
+        f.write(TOC_PAGE_TAIL)
+    os.replace(tmp_path, out_path)
+    if precompress:
+        with open(out_path, 'rb') as f:
+            write_precompressed(out_path, f.read())
+    remove_stale_shards(static_dir, shards, precompress)
+    return shard_count, shards
 
 def generate_toc_html(app, exception):
     logger = logging.getLogger(__name__)
     env = app.builder.env
-    master_doc = app.config.master_doc if hasattr(app.config, 'master_doc') else 'index'
+    master_doc = get_master_doc(app)
     if master_doc not in env.found_docs:
         logger.warning(f"Master doc '{master_doc}' not found in env.found_docs")
         return
 
+    out_path = os.path.join(app.outdir, '_static', 'toc.html')
+    digest = navigation_digest(app, master_doc)
+    previous, previous_shards = read_previous_digest(app)
+    # The digest covers toc_html_shard_depth and toc_html_precompress
+    if digest == previous and toc_files_present(out_path, previous_shards, app.config.toc_html_precompress):
+        # Leave the file (and its mtime) alone so caches stay valid
+        logger.info(f"TOC reused: navigation unchanged (digest {digest[:12]}), kept {out_path}")
+        return
+
     logger.info(f"Starting TOC generation from master doc: {master_doc}")
     # Process all documents recursively
-    sections = process_document(env, master_doc)
+    sections = get_navigation(app)['sections']
     logger.info(f"Found {len(sections)} sections in total")
-    html = render_toc_html_from_doctree(sections)
 
-    # Write the TOC to _static/toc.html with sphinx toctree styling
-    out_path = os.path.join(app.outdir, '_static', 'toc.html')
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    
-    # Create a complete HTML document with sphinx toctree styling
-    full_html = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="utf-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Table of Contents</title>
-    <link rel="stylesheet" href="styles/furo.css">
-    <link rel="stylesheet" href="styles/furo-extensions.css">
-    <link rel="stylesheet" href="theme_overrides.css">
-    <style>
-        /* Make iframe body fill height and be scrollable */
-        html, body {{
-            height: 100%;
-            margin: 0;
-            padding: 0;
-            overflow: hidden;
-            background: var(--color-sidebar-background);
-        }}
-        
-        /* Keep search panel fixed at top */
-        #tocSearchPanel {{
-            position: sticky;
-            top: 0;
-            z-index: 10;
-            background: var(--color-sidebar-background, #f8f9fb);
-        }}
-        
-        /* Use flexbox for proper layout */
-        .content-container {{
-            height: 100vh;
-            display: flex;
-            flex-direction: column;
-            background: var(--color-sidebar-background);
-        }}
-        
-        /* Search panel takes its natural height */
-        #tocSearchPanel {{
-            flex-shrink: 0;
-        }}
-        
-        /* TOC content fills remaining space and scrolls */
-        .toc-content {{
-            flex: 1;
-            overflow-y: auto;
-            overflow-x: hidden;
-            background: var(--color-sidebar-background);
-        }}
-        
-        /* Style for current page */
-        .sidebar-tree .current-page > .reference {{
-            font-weight: bold;
-        }}
-    </style>
-    
-    <!-- SVG symbol definitions for navigation arrows (matching Sphinx/Furo) -->
-    <svg style="display: none;">
-      <symbol id="svg-arrow-right" viewBox="0 0 24 24">
-        <title>Expand</title>
-        <svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="none" stroke="currentColor"
-          stroke-width="2" stroke-linecap="round" stroke-linejoin="round" class="feather-chevron-right">
-          <polyline points="9 18 15 12 9 6"></polyline>
-        </svg>
-      </symbol>
-    </svg>
-    <script src="iframe_theme_receiver.js"></script>
-</head>
-<body data-theme="auto">
-<div class="content-container">
-    <div id="tocSearchPanel">
-        <div id="tocSearchPanelInner">
-            <input type="text" id="txtSearch" placeholder="Search..." autocomplete="off" />
-        </div>
-        <div id="tocSearchResult" style="display: none;"></div>
-    </div>
-    <div class="toc-content">
-{html}
-    </div>
-</div>
-<script src="toc-highlight.js"></script>
-<script src="search.js"></script>
-</body>
-</html>"""
-    
-    with open(out_path, 'w', encoding='utf-8') as f:
-        f.write(full_html)
-    logger.info(f"Generated {out_path}")
+    shard_depth = app.config.toc_html_shard_depth
+    fragment_cache = load_fragment_cache(app)
+    shard_count, shards = write_toc_page(out_path, sections, fragment_cache, shard_depth,
+                                         app.config.toc_html_precompress)
+    save_fragment_cache(app, fragment_cache, env.found_docs)
+    if shard_depth:
+        logger.info(f"Wrote {shard_count} of {len(shards)} TOC shards below level {shard_depth}")
+    write_digest(app, digest, shards)
+    logger.info(f"TOC regenerated (digest {digest[:12]}): generated {out_path}")
+
+def load_environment(path):
+    """Load a pickled build environment without a Sphinx application."""
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def html_target_uri(env):
+    """get_target_uri of the HTML builder, from the configuration pickled with env."""
+    config = getattr(env, 'config', None)
+    suffix = getattr(config, 'html_link_suffix', None)
+    if suffix is None:
+        suffix = getattr(config, 'html_file_suffix', None) or '.html'
+    return lambda docname: quote(docname) + suffix
+
+def sections_to_json(sections):
+    """The navigation tree as plain lists and dicts."""
+    return [
+        {
+            'caption': caption,
+            'entries': [dict(entry, children=sections_to_json(entry['children'])) for entry in entries],
+        }
+        for caption, entries in sections
+    ]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Regenerate _static/toc.html from the environment pickled by the last build.')
+    parser.add_argument('outdir', nargs='?', default='_build/html')
+    parser.add_argument('--env', help='environment.pickle to load (default: OUTDIR/.doctrees/environment.pickle)')
+    parser.add_argument('--json', metavar='PATH', help="also write the navigation tree as JSON ('-' for stdout)")
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='run traversal and rendering this many times and report the fastest')
+    parser.add_argument('--no-write', action='store_true', help='time traversal and rendering only')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    env_path = args.env or os.path.join(args.outdir, '.doctrees', 'environment.pickle')
+    # A truncated or foreign file makes pickle raise any of the last three
+    try:
+        env = load_environment(env_path)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError) as e:
+        print(f"Could not load the environment from {env_path} (build the docs first?): {e}", file=sys.stderr)
+        return 1
+    load_time = time.perf_counter() - start
+    config = getattr(env, 'config', None)
+    master_doc = getattr(config, 'root_doc', None) or getattr(config, 'master_doc', 'index')
+    if master_doc not in env.found_docs:
+        print(f"Master doc '{master_doc}' not found in {env_path}", file=sys.stderr)
+        return 1
+    target_uri = html_target_uri(env)
+
+    traversal_times = []
+    render_times = []
+    for _ in range(max(args.repeat, 1)):
+        start = time.perf_counter()
+        sections = process_document(env, master_doc, target_uri=target_uri)
+        traversal_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        html = render_toc_html_from_doctree(sections)
+        render_times.append(time.perf_counter() - start)
+
+    write_time = 0.0
+    out_path = os.path.join(args.outdir, '_static', 'toc.html')
+    if not args.no_write:
+        start = time.perf_counter()
+        write_toc_page(out_path, sections, None, getattr(config, 'toc_html_shard_depth', 0),
+                       getattr(config, 'toc_html_precompress', True))
+        write_time = time.perf_counter() - start
+    if args.json:
+        data = json.dumps(sections_to_json(sections), indent=1)
+        if args.json == '-':
+            print(data)
+        else:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                f.write(data + '\n')
+
+    entries = sum(1 for _ in iter_entries(sections))
+    print(f"{entries} entries, {len(html)} characters of HTML: load {load_time:.3f}s, "
+          f"traversal {min(traversal_times):.3f}s, render {min(render_times):.3f}s, write {write_time:.3f}s",
+          file=sys.stderr if args.json == '-' else sys.stdout)
+    if not args.no_write:
+        from .static_assets import MANIFEST_NAME
+        try:
+            with open(os.path.join(os.path.dirname(env_path), MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                fingerprinted = json.load(f).get('mapping', {}).get('_static/toc.html')
+        except (OSError, ValueError):
+            fingerprinted = None
+        if fingerprinted:
+            print(f"Note: pages load {fingerprinted}, which only the next build refreshes", file=sys.stderr)
+    return 0
+
+def iter_entries(sections):
+    for _, entries in sections:
+        for entry in entries:
+            yield entry
+            yield from iter_entries(entry['children'])
 
 def setup(app):
-    app.connect('build-finished', generate_toc_html) 
\ No newline at end of file
+    # Collect the toctree/title index while documents are read, after the
+    # conf.py source-read hooks have run
+    app.connect('source-read', collect_commented_toctree, priority=800)
+    app.connect('doctree-read', collect_toc_index)
+    app.connect('env-purge-doc', purge_toc_index)
+    app.connect('env-merge-info', merge_toc_index)
+    app.connect('env-updated', reset_navigation)
+    app.connect('html-page-context', add_toc_shard_meta)
+    app.connect('html-page-context', add_inline_sidebar)
+    app.connect('build-finished', generate_toc_html)
+
+    # Levels of the sidebar inlined in toc.html; deeper subtrees are split into
+    # shards under _static/toc/ and fetched when expanded. 0 inlines everything.
+    app.add_config_value('toc_html_shard_depth', 0, 'html', [int])
+    # Also write .gz/.br copies of toc.html and its shards for static hosting
+    app.add_config_value('toc_html_precompress', True, 'html', [bool])
+    # Render the navigation into every page's sidebar, with the current branch
+    # expanded, instead of loading toc.html in an iframe
+    app.add_config_value('toc_html_inline_sidebar', False, 'html', [bool])
+
+    return {
+        'version': '0.1',
+        # Bump when the shape of env.toc_html_index changes
+        'env_version': 1,
+        # The index is merged from parallel readers in merge_toc_index; toc.html
+        # is written once in the main process after all pages
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    } 
+
+if __name__ == '__main__':
+    sys.exit(main())
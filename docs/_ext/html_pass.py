@@ -0,0 +1,69 @@
+"""
+Helpers for running a function over many HTML output files in parallel.
+
+Used by the post-build extensions that rewrite or inspect the generated
+site. Each pass fans the files out across a process pool and reports how
+long it took.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Below this many files the cost of starting worker processes outweighs
+# the work itself, so the pass runs in-process instead.
+MIN_FILES_FOR_POOL = 64
+
+
+def scan_files(output_dir, suffix=None):
+    """
+    Return {relative_path: (mtime_ns, size)} for the files below output_dir.
+
+    Only stat calls are made, so this is cheap even on large trees. If suffix
+    is given, only files ending with it are included.
+    """
+    signatures = {}
+    pending = [output_dir]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif suffix is None or entry.name.endswith(suffix):
+                    st = entry.stat()
+                    relpath = os.path.relpath(entry.path, output_dir).replace(os.sep, '/')
+                    signatures[relpath] = (st.st_mtime_ns, st.st_size)
+    return signatures
+
+
+def resolve_workers(workers):
+    """Turn a configured worker count into an actual one (0 means one per CPU)."""
+    if not workers or workers < 1:
+        return os.cpu_count() or 1
+    return workers
+
+
+def map_files(func, paths, workers=0):
+    """
+    Call func(path) for every path and return the results in input order.
+
+    func must be a module-level function so it can be sent to worker
+    processes. Returns (results, elapsed_seconds, workers_used).
+    """
+    workers = min(resolve_workers(workers), max(len(paths), 1))
+    start = time.perf_counter()
+    if workers == 1 or len(paths) < MIN_FILES_FOR_POOL:
+        workers = 1
+        results = [func(path) for path in paths]
+    else:
+        # Hand out several files per task so small pages don't drown in IPC.
+        chunksize = max(1, len(paths) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(func, paths, chunksize=chunksize))
+    return results, time.perf_counter() - start, workers
+
+
+def format_rate(count, elapsed):
+    """Format a files-per-second figure for log output."""
+    if elapsed <= 0:
+        return f"{count} files in 0.000s"
+    return f"{count} files in {elapsed:.3f}s ({count / elapsed:.0f} files/s)"
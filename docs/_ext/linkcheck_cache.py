@@ -0,0 +1,221 @@
+"""
+Custom Sphinx extension that caches linkcheck results between runs.
+
+Replaces the ``linkcheck`` builder with one that keeps the result of every
+working or redirected URL in a JSON file, with the time it was checked.
+On the next run, URLs checked less than ``linkcheck_cache_ttl`` seconds
+ago are reported from the cache; only new, expired, broken or timed out
+URLs go to the network. Cached results are dropped when a setting that
+changes how links are judged (anchors, allowed redirects, ...) changes.
+
+The network checks are Sphinx's own, except that at most
+``linkcheck_host_concurrency`` requests go to the same host at once, so a
+page full of GitHub links doesn't trip GitHub's rate limits. This relies on
+private parts of Sphinx's checker; if they are missing, the stock builder
+is left in place and every URL is checked.
+
+The cache lives in the doctree dir unless ``linkcheck_cache_path`` says
+otherwise; CI keeps it between runs with a cache step.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+from sphinx.builders.linkcheck import (
+    CheckExternalLinksBuilder,
+    CheckResult,
+    HyperlinkAvailabilityChecker,
+    HyperlinkAvailabilityCheckWorker,
+)
+from sphinx.util import logging
+
+try:
+    from sphinx.builders.linkcheck import _Status
+except ImportError:
+    # Sphinx < 9 reports statuses as plain strings
+    _Status = str
+
+logger = logging.getLogger(__name__)
+
+# The private parts of Sphinx's link checker overridden below, checked before
+# the builder is replaced (tested with Sphinx 8.1 and 9.0)
+REQUIRED_INTERNALS = (
+    (HyperlinkAvailabilityCheckWorker, '_check'),
+    (HyperlinkAvailabilityChecker, 'invoke_threads'),
+    (HyperlinkAvailabilityChecker, 'check'),
+    (CheckExternalLinksBuilder, 'process_result'),
+)
+
+CACHE_NAME = 'linkcheck_cache.json'
+CACHE_VERSION = 1
+
+# Results worth keeping; failures are always checked again so fixes show up
+CACHED_STATUSES = ('working', 'redirected')
+
+# Settings that change the outcome of a check
+RESULT_SETTINGS = (
+    'linkcheck_anchors',
+    'linkcheck_anchors_ignore',
+    'linkcheck_anchors_ignore_for_url',
+    'linkcheck_allowed_redirects',
+    'linkcheck_allow_unauthorized',
+    'linkcheck_case_insensitive_urls',
+    'linkcheck_ignore',
+)
+
+
+def settings_digest(config):
+    """Hash the settings that affect results, so a change drops the cache."""
+    values = {name: repr(getattr(config, name, None)) for name in RESULT_SETTINGS}
+    return hashlib.sha256(json.dumps(values, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def status_value(status):
+    return getattr(status, 'value', status)
+
+
+class LinkCache:
+    """The cached results of one linkcheck run, {uri: {status, message, code, checked}}."""
+
+    def __init__(self, path, digest, ttl):
+        self.path = path
+        self.digest = digest
+        self.ttl = ttl
+        self.entries = {}
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') == CACHE_VERSION and data.get('settings') == self.digest:
+            self.entries = data['entries']
+
+    def lookup(self, uri, now):
+        entry = self.entries.get(uri)
+        if entry and now - entry['checked'] < self.ttl:
+            return entry
+        return None
+
+    def record(self, result, now):
+        status = status_value(result.status)
+        if status in CACHED_STATUSES:
+            self.entries[result.uri] = {'status': status, 'message': result.message,
+                                        'code': result.code, 'checked': now}
+        else:
+            self.entries.pop(result.uri, None)
+
+    def save(self, now):
+        entries = {uri: entry for uri, entry in self.entries.items() if now - entry['checked'] < self.ttl}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'settings': self.digest, 'entries': entries},
+                      f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+class HostLimitedWorker(HyperlinkAvailabilityCheckWorker):
+    """A Sphinx linkcheck worker that waits for a free slot on the link's host."""
+
+    host_slots = None
+
+    def _check(self, docname, uri, hyperlink):
+        slots = self.host_slots.get(urlsplit(uri).netloc)
+        if slots is None:
+            return super()._check(docname, uri, hyperlink)
+        with slots:
+            return super()._check(docname, uri, hyperlink)
+
+
+class HostLimitedChecker(HyperlinkAvailabilityChecker):
+    """Sphinx's link checker, with at most host_concurrency requests per host."""
+
+    def __init__(self, config, host_concurrency):
+        super().__init__(config)
+        self.host_concurrency = host_concurrency
+
+    def check(self, hyperlinks):
+        self.host_slots = {}
+        for hyperlink in hyperlinks.values():
+            netloc = urlsplit(hyperlink.uri).netloc
+            if netloc and netloc not in self.host_slots:
+                self.host_slots[netloc] = threading.BoundedSemaphore(self.host_concurrency)
+        yield from super().check(hyperlinks)
+
+    def invoke_threads(self):
+        for _ in range(self.num_workers):
+            thread = HostLimitedWorker(self.config, self.rqueue, self.wqueue, self.rate_limits)
+            thread.host_slots = self.host_slots
+            thread.start()
+            self.workers.append(thread)
+
+
+def builder_app(builder):
+    # Sphinx 9 deprecates Builder.app in favour of the private attribute
+    return getattr(builder, '_app', None) or builder.app
+
+
+class CachedLinkcheckBuilder(CheckExternalLinksBuilder):
+    """The linkcheck builder, answering recently checked URLs from a cache."""
+
+    def finish(self):
+        config = self.config
+        path = config.linkcheck_cache_path or os.path.join(self.doctreedir, CACHE_NAME)
+        cache = LinkCache(path, settings_digest(config), config.linkcheck_cache_ttl)
+        if config.linkcheck_cache_ttl > 0:
+            cache.load()
+
+        now = time.time()
+        cached = []
+        to_check = {}
+        for uri, hyperlink in self.hyperlinks.items():
+            entry = cache.lookup(uri, now)
+            if entry:
+                cached.append(CheckResult(uri, hyperlink.docname, hyperlink.lineno,
+                                          _Status(entry['status']), entry['message'], entry['code']))
+            else:
+                to_check[uri] = hyperlink
+        hosts = {urlsplit(uri).netloc for uri in to_check}
+        logger.info(f"Link cache: {len(cached)} results reused, checking {len(to_check)} URLs "
+                    f"on {len(hosts)} hosts")
+
+        checker = HostLimitedChecker(config, config.linkcheck_host_concurrency)
+        logger.info('')
+        with open(os.path.join(self.outdir, 'output.txt'), 'w', encoding='utf-8') as self.txt_outfile, \
+                open(os.path.join(self.outdir, 'output.json'), 'w', encoding='utf-8') as self.json_outfile:
+            for result in cached:
+                self.process_result(result)
+            for result in checker.check(to_check):
+                cache.record(result, time.time())
+                self.process_result(result)
+
+        if config.linkcheck_cache_ttl > 0:
+            cache.save(time.time())
+        if self.broken_hyperlinks or self.timed_out_hyperlinks:
+            builder_app(self).statuscode = 1
+
+
+def setup(app):
+    app.setup_extension('sphinx.builders.linkcheck')
+    missing = [f'{cls.__name__}.{name}' for cls, name in REQUIRED_INTERNALS if not hasattr(cls, name)]
+    if missing:
+        logger.info(f"Link cache disabled: this Sphinx has no {', '.join(missing)}")
+    else:
+        app.add_builder(CachedLinkcheckBuilder, override=True)
+
+    # Seconds a working or redirected URL is not checked again; 0 disables the cache
+    app.add_config_value('linkcheck_cache_ttl', 7 * 24 * 3600, '', [int, float])
+    # Cache file; defaults to linkcheck_cache.json in the doctree dir
+    app.add_config_value('linkcheck_cache_path', '', '', [str])
+    # Requests sent to the same host at once
+    app.add_config_value('linkcheck_host_concurrency', 2, '', [int])
+
+    return {
+        'version': '0.1',
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
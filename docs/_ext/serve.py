@@ -0,0 +1,406 @@
+"""
+Local development server that rebuilds the docs on save and reloads the browser.
+
+Keeps one Sphinx application, with its environment, alive between builds,
+so saving a page only re-reads and re-writes what Sphinx finds outdated
+(the page, plus the pages whose toctree includes it). The build-finished
+passes are already incremental: the toc.html fragment cache re-renders
+only the subtrees whose entries changed, fix_links and the llms.txt and
+search index writers skip inputs they have seen. Passes that only matter
+for deployment (asset fingerprinting, precompression) are switched off by
+DEV_OVERRIDES.
+
+Sources are watched with inotify on Linux, or by polling their mtimes
+elsewhere (or with ``--poll``). Changes are debounced, the site is rebuilt
+in-process, and every open page is told to reload over a server-sent
+events stream; the reload script is injected into the pages as they are
+served, so the output stays what sphinx-build would write. A change to
+conf.py or an extension restarts the server, which warms up from the
+pickled environment.
+
+Run it from docs/::
+
+    python -m _ext.serve [--port 8000] [--poll] [-D name=value ...]
+"""
+import argparse
+import ctypes
+import ctypes.util
+import errno
+import http.server
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import traceback
+from functools import partial
+
+# Settings for the served build; the output isn't deployed, so the passes
+# that prepare it for a CDN are skipped
+DEV_OVERRIDES = {
+    'static_assets_fingerprint': False,
+    'toc_html_precompress': False,
+    'check_links': False,
+}
+
+EVENTS_PATH = '/_serve/events'
+# Seconds between keep-alive comments on the event stream
+HEARTBEAT = 15
+# Seconds to wait for more changes before rebuilding, so a save that
+# touches several files (or an editor's write-then-rename) builds once
+DEBOUNCE = 0.05
+
+# Reloads the page on a rebuild, and after the stream reconnects (the server restarted)
+RELOAD_SCRIPT = f"""<script>
+(function () {{
+  if (window.top !== window || !window.EventSource) return;
+  var connected = false;
+  var source = new EventSource('{EVENTS_PATH}');
+  source.onopen = function () {{ if (connected) location.reload(); connected = true; }};
+  source.onmessage = function () {{ location.reload(); }};
+}})();
+</script>
+"""
+
+# Directories never watched, besides the output and doctree dirs
+IGNORED_DIRS = {'.git', '__pycache__', 'node_modules', '_build'}
+# Editor swap and backup files
+IGNORED_SUFFIXES = ('~', '.swp', '.swx', '.tmp')
+
+
+def ignored_name(name):
+    return name.startswith(('.#', '.~')) or name.endswith(IGNORED_SUFFIXES)
+
+
+def watched_dirs(root, skip):
+    """Yield root and the directories below it that are watched."""
+    for dirpath, dirnames, _ in os.walk(root):
+        dirnames[:] = [name for name in dirnames if name not in IGNORED_DIRS and
+                       os.path.join(dirpath, name) not in skip]
+        yield dirpath
+
+
+class PollingWatcher:
+    """Finds changed files by comparing mtimes and sizes of the whole tree."""
+
+    def __init__(self, root, skip, interval=0.5):
+        self.root = root
+        self.skip = skip
+        self.interval = interval
+        self.files = self.scan()
+
+    def scan(self):
+        files = {}
+        for dirpath in watched_dirs(self.root, self.skip):
+            try:
+                entries = list(os.scandir(dirpath))
+            except OSError:
+                continue
+            for entry in entries:
+                if not ignored_name(entry.name) and entry.is_file(follow_symlinks=False):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    files[entry.path] = (st.st_mtime_ns, st.st_size)
+        return files
+
+    def changes(self, timeout):
+        """Return the paths changed since the last call, waiting up to timeout seconds for one."""
+        deadline = time.monotonic() + timeout
+        while True:
+            time.sleep(min(self.interval, max(deadline - time.monotonic(), 0)))
+            files = self.scan()
+            changed = {path for path in files.keys() | self.files.keys()
+                       if files.get(path) != self.files.get(path)}
+            self.files = files
+            if changed or time.monotonic() >= deadline:
+                return changed
+
+
+class InotifyWatcher:
+    """Linux inotify through ctypes; one watch per directory, added as directories appear."""
+
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_ISDIR = 0x40000000
+    IN_CLOEXEC = 0o2000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, root, skip):
+        self.skip = skip
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.dirs = {}
+        self.add_tree(root)
+
+    def add_tree(self, root):
+        for dirpath in watched_dirs(root, self.skip):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), self.MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    raise OSError(error, 'out of inotify watches (fs.inotify.max_user_watches)')
+                continue
+            self.dirs[wd] = dirpath
+
+    def changes(self, timeout):
+        """Return the paths changed since the last call, waiting up to timeout seconds for one."""
+        changed = set()
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return changed
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if wd not in self.dirs or not name or ignored_name(name):
+                continue
+            path = os.path.join(self.dirs[wd], name)
+            if mask & self.IN_ISDIR:
+                if name in IGNORED_DIRS or path in self.skip:
+                    continue
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    self.add_tree(path)
+            # A new empty file isn't worth a build until it is written
+            elif mask & self.IN_CREATE:
+                continue
+            changed.add(path)
+        return changed
+
+
+def create_watcher(root, skip, poll, interval):
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root, skip)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}), polling for changes")
+    return PollingWatcher(root, skip, interval)
+
+
+class ReloadBroadcaster:
+    """Counts finished builds; event stream handlers wait for the count to move."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.generation = 0
+
+    def notify(self):
+        with self.condition:
+            self.generation += 1
+            self.condition.notify_all()
+
+    def wait(self, generation, timeout):
+        with self.condition:
+            self.condition.wait_for(lambda: self.generation != generation, timeout)
+            return self.generation
+
+
+class DevRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves the output directory, with the reload script added to HTML pages."""
+
+    broadcaster = None
+
+    def do_GET(self):
+        if self.path == EVENTS_PATH:
+            return self.send_events()
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) and self.path.split('?', 1)[0].endswith('/'):
+            path = os.path.join(path, 'index.html')
+        if not path.endswith('.html') or not os.path.isfile(path):
+            return super().do_GET()
+        with open(path, 'rb') as f:
+            content = f.read()
+        end = content.rfind(b'</body>')
+        script = RELOAD_SCRIPT.encode('utf-8')
+        content = content[:end] + script + content[end:] if end >= 0 else content + script
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def end_headers(self):
+        # Assets change between builds under the same name
+        if self.path != EVENTS_PATH:
+            self.send_header('Cache-Control', 'no-cache')
+        super().end_headers()
+
+    def send_events(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        generation = self.broadcaster.generation
+        try:
+            self.wfile.write(b'retry: 1000\n\n')
+            self.wfile.flush()
+            while True:
+                current = self.broadcaster.wait(generation, HEARTBEAT)
+                self.wfile.write(b'data: reload\n\n' if current != generation else b': ping\n\n')
+                self.wfile.flush()
+                generation = current
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BuildCounter:
+    """Counts the documents read and the pages written by one build."""
+
+    def __init__(self):
+        self.read = 0
+        self.written = 0
+
+    def doctree_read(self, app, doctree):
+        self.read += 1
+
+    def page_context(self, app, pagename, templatename, context, doctree):
+        if doctree is not None:
+            self.written += 1
+
+
+class DevServer:
+    """A warm Sphinx application, its output served over HTTP and rebuilt on changes."""
+
+    def __init__(self, srcdir, outdir, host='127.0.0.1', port=8000, overrides=None,
+                 poll=False, interval=0.5, verbose=False):
+        self.srcdir = os.path.abspath(srcdir)
+        self.outdir = os.path.abspath(outdir)
+        self.doctreedir = os.path.join(self.outdir, '.doctrees')
+        self.overrides = dict(DEV_OVERRIDES, **(overrides or {}))
+        self.verbose = verbose
+        self.app = None
+        self.counter = BuildCounter()
+        self.broadcaster = ReloadBroadcaster()
+        self.restart_requested = False
+        self.watcher = create_watcher(self.srcdir, {self.outdir}, poll, interval)
+        handler = partial(type('Handler', (DevRequestHandler,), {'broadcaster': self.broadcaster}),
+                          directory=self.outdir)
+        self.httpd = http.server.ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def create_app(self):
+        from sphinx.application import Sphinx
+        status = sys.stdout if self.verbose else None
+        app = Sphinx(self.srcdir, self.srcdir, self.outdir, self.doctreedir, 'html',
+                     confoverrides=self.overrides, status=status, warning=sys.stderr)
+        app.connect('doctree-read', self.counter.doctree_read)
+        app.connect('html-page-context', self.counter.page_context)
+        return app
+
+    def build(self):
+        """Bring the output up to date; returns False if the build failed."""
+        self.counter.__init__()
+        try:
+            if self.app is None:
+                self.app = self.create_app()
+            self.app.build()
+        except Exception:
+            traceback.print_exc()
+            # The environment may be half updated; start from the pickle next time
+            self.app = None
+            return False
+        return True
+
+    def needs_restart(self, paths):
+        """conf.py and the extensions are only loaded when the application is created."""
+        code_dir = os.path.dirname(os.path.abspath(__file__))
+        return any((os.path.dirname(path) == code_dir and path.endswith('.py')) or
+                   path == os.path.join(self.srcdir, 'conf.py') for path in paths)
+
+    def rebuild(self, paths):
+        start = time.perf_counter()
+        ok = self.build()
+        elapsed = time.perf_counter() - start
+        names = ', '.join(sorted(os.path.relpath(path, self.srcdir) for path in paths)[:3])
+        more = f' and {len(paths) - 3} more' if len(paths) > 3 else ''
+        status = 'rebuilt' if ok else 'build failed'
+        print(f"{names}{more}: {status} in {elapsed:.2f}s "
+              f"({self.counter.read} read, {self.counter.written} written)")
+        if ok:
+            self.broadcaster.notify()
+
+    def wait_for_changes(self):
+        paths = self.watcher.changes(1.0)
+        while paths:
+            more = self.watcher.changes(DEBOUNCE)
+            if not more:
+                break
+            paths |= more
+        return paths
+
+    def serve_forever(self, stop=None):
+        """Watch and rebuild until stop (a threading.Event) is set or a restart is needed."""
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        while stop is None or not stop.is_set():
+            paths = self.wait_for_changes()
+            if not paths:
+                continue
+            if self.needs_restart(paths):
+                self.restart_requested = True
+                break
+            self.rebuild(paths)
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def parse_overrides(values):
+    overrides = {}
+    for value in values:
+        name, sep, setting = value.partition('=')
+        if not sep:
+            raise SystemExit(f'-D expects name=value, got {value!r}')
+        overrides[name] = setting
+    return overrides
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the docs, rebuilding and reloading on changes.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--outdir', default='_build/serve',
+                        help='output directory; kept apart from _build/html, which is built with other settings')
+    parser.add_argument('--poll', action='store_true', help='poll for changes instead of using inotify')
+    parser.add_argument('--interval', type=float, default=0.5, help='seconds between polls')
+    parser.add_argument('-D', dest='define', action='append', default=[], metavar='name=value',
+                        help='override a configuration value')
+    parser.add_argument('-v', '--verbose', action='store_true', help="show Sphinx's build output")
+    args = parser.parse_args(argv)
+
+    server = DevServer('.', args.outdir, args.host, args.port, parse_overrides(args.define),
+                       args.poll, args.interval, args.verbose)
+    start = time.perf_counter()
+    ok = server.build()
+    print(f"{'Built' if ok else 'Build failed'} in {time.perf_counter() - start:.1f}s "
+          f"({server.counter.read} read, {server.counter.written} written)")
+    print(f"Serving {server.outdir} at {server.url} (watching with {type(server.watcher).__name__})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        return 0
+    if server.restart_requested:
+        print('conf.py or an extension changed, restarting')
+        sys.stdout.flush()
+        os.execv(sys.executable, [sys.executable, '-m', __spec__.name, *sys.argv[1:]])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,282 @@
+"""
+Custom Sphinx extension that fingerprints the static assets of the site.
+
+At the end of an HTML build, every asset in ``_static`` matching
+``static_assets_patterns`` (our scripts and styles, the theme's, the TOC
+search index and ``toc.html``) has the references it makes to other assets
+rewritten (styles are minified first) and is written next to the original
+under a name containing a hash of its content, e.g. ``search.3f2a1b4c.js``,
+with ``.gz`` (and ``.br``) siblings. The pages are then rewritten to refer to the
+fingerprinted names, so everything below ``_static`` except the original
+names can be served with a long-lived immutable cache policy.
+
+Assets are processed in a fixed order (data, styles, scripts, then HTML),
+so e.g. ``search.js`` already points at the fingerprinted search index
+when its own hash is taken. The original files stay in place for anything
+that still links them by name (the lazily loaded TOC shards keep theirs).
+Pages Sphinx didn't rewrite since the last build are left alone unless an
+asset changed.
+
+The pass is off by default, since it rewrites the finished pages; conf.py
+turns it on for deploy builds on Read the Docs, and CI builds with
+``-D static_assets_fingerprint=1`` to test it.
+"""
+import fnmatch
+import functools
+import hashlib
+import json
+import os
+import posixpath
+import re
+from sphinx.util import logging
+
+from .fix_links import note_rewritten_pages
+from .generate_toc_html import write_precompressed
+from .html_pass import format_rate, map_files, scan_files
+
+logger = logging.getLogger(__name__)
+
+# Records the fingerprinted names and the pages as we left them, in the doctree dir
+MANIFEST_NAME = 'static_assets_manifest.json'
+MANIFEST_VERSION = 1
+
+HASH_LENGTH = 8
+# name.<hash>.ext, as written by this extension
+FINGERPRINTED_PATTERN = re.compile(rf'^(?P<stem>.+)\.[0-9a-f]{{{HASH_LENGTH}}}(?P<ext>\.[A-Za-z0-9]+)$')
+
+# Assets may only refer to assets of an earlier rank, which are renamed first
+ASSET_RANKS = {'.json': 0, '.css': 1, '.js': 2, '.html': 3}
+
+# References in HTML attributes, and in string literals and url() of scripts and styles
+ATTRIBUTE_PATTERN = re.compile(r'(\b(?:href|src)=)(["\'])([^"\']+)\2')
+LITERAL_PATTERN = re.compile(r'()(["\'])([^"\'\s<>]+)\2')
+CSS_URL_PATTERN = re.compile(r'(url\()()([^)\'"\s]+)(?=\s*\))')
+
+CSS_TOKEN_PATTERN = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/)|(\s+)', re.DOTALL)
+CSS_STRING_PATTERN = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'')
+CSS_PUNCTUATION_PATTERN = re.compile(r'\s*([{};,])\s*')
+
+
+def minify_css(text):
+    """Drop comments (except /*! licenses and /*# source maps) and collapse whitespace."""
+    def repl(match):
+        string, comment, space = match.groups()
+        if string:
+            return string
+        if comment:
+            return comment if comment.startswith(('/*!', '/*#')) else ''
+        return ' '
+
+    def tighten(code):
+        return CSS_PUNCTUATION_PATTERN.sub(r'\1', code).replace(';}', '}')
+
+    parts = []
+    last = 0
+    text = CSS_TOKEN_PATTERN.sub(repl, text)
+    # Tighten the punctuation outside strings only
+    for match in CSS_STRING_PATTERN.finditer(text):
+        parts.append(tighten(text[last:match.start()]))
+        parts.append(match.group(0))
+        last = match.end()
+    parts.append(tighten(text[last:]))
+    return ''.join(parts).strip() + '\n'
+
+
+# Scripts are only fingerprinted and compressed; stripping them safely needs a real JS tokenizer
+MINIFIERS = {'.css': minify_css}
+
+
+def fingerprinted_name(relpath, data):
+    stem, ext = posixpath.splitext(relpath)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def lookup_asset(mapping, target):
+    """Return the fingerprinted path for an asset path, original or from an earlier build."""
+    if target in mapping:
+        return mapping[target]
+    directory, name = posixpath.split(target)
+    match = FINGERPRINTED_PATTERN.match(name)
+    if match:
+        return mapping.get(posixpath.join(directory, match.group('stem') + match.group('ext')))
+    return None
+
+
+def rewrite_references(text, relpath, mapping, patterns):
+    """Point the references to assets in text (the file at relpath) at their fingerprinted names."""
+    base = posixpath.dirname(relpath)
+
+    def repl(match):
+        prefix, quote, url = match.groups()
+        if '//' in url or url.startswith(('#', 'data:', 'javascript:', 'mailto:')):
+            return match.group(0)
+        path, _, query = url.partition('?')
+        path, hash_mark, fragment = path.partition('#')
+        if not path:
+            return match.group(0)
+        target = lookup_asset(mapping, posixpath.normpath(posixpath.join(base, path)))
+        if target is None:
+            return match.group(0)
+        # The renamed file sits next to the original; only the file name changes
+        new_url = path[:len(path) - len(posixpath.basename(path))] + posixpath.basename(target)
+        # A ?v= cache buster is redundant once the name carries the hash
+        if query and not query.startswith('v='):
+            new_url += '?' + query
+        if hash_mark:
+            new_url += '#' + fragment
+        return f"{prefix}{quote}{new_url}{quote}"
+
+    for pattern in patterns:
+        text = pattern.sub(repl, text)
+    return text
+
+
+def rewrite_page(filepath, outdir, mapping):
+    """
+    Rewrite the asset references of one page. Runs in a worker process.
+
+    Returns 'fixed', 'unchanged' or an error message string prefixed with 'error: '.
+    """
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            content = f.read()
+        relpath = os.path.relpath(filepath, outdir).replace(os.sep, '/')
+        rewritten = rewrite_references(content, relpath, mapping, [ATTRIBUTE_PATTERN])
+        if rewritten == content:
+            return 'unchanged'
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(rewritten)
+        return 'fixed'
+    except Exception as e:
+        return f'error: {e}'
+
+
+def find_assets(outdir, patterns):
+    """Return the relpaths of the original assets below _static, in processing order."""
+    files = scan_files(os.path.join(outdir, '_static'))
+    assets = []
+    for relpath in files:
+        name = posixpath.basename(relpath)
+        match = FINGERPRINTED_PATTERN.match(name)
+        if match and posixpath.join(posixpath.dirname(relpath), match.group('stem') + match.group('ext')) in files:
+            continue
+        ext = posixpath.splitext(name)[1]
+        if ext in ASSET_RANKS and any(fnmatch.fnmatch(relpath, pattern) for pattern in patterns):
+            assets.append('_static/' + relpath)
+    return sorted(assets, key=lambda relpath: (ASSET_RANKS[posixpath.splitext(relpath)[1]], relpath))
+
+
+def write_asset(app, relpath, mapping):
+    """Write the fingerprinted copy of one asset and return its relpath."""
+    outdir = str(app.outdir)
+    ext = posixpath.splitext(relpath)[1]
+    with open(os.path.join(outdir, relpath), 'r', encoding='utf-8') as f:
+        text = f.read()
+    if app.config.static_assets_minify and ext in MINIFIERS:
+        text = MINIFIERS[ext](text)
+    patterns = [ATTRIBUTE_PATTERN] if ext == '.html' else [LITERAL_PATTERN, CSS_URL_PATTERN]
+    data = rewrite_references(text, relpath, mapping, patterns).encode('utf-8')
+    target = fingerprinted_name(relpath, data)
+    path = os.path.join(outdir, target)
+    # Same name means same content; leave the file (and its mtime) alone
+    if not os.path.exists(path):
+        with open(path, 'wb') as f:
+            f.write(data)
+    if app.config.static_assets_precompress and not os.path.exists(path + '.gz'):
+        write_precompressed(path, data)
+    return target
+
+
+def load_manifest(app):
+    path = os.path.join(app.doctreedir, MANIFEST_NAME)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('outdir') != str(app.outdir):
+        return {}
+    return manifest
+
+
+def save_manifest(app, mapping, pages):
+    path = os.path.join(app.doctreedir, MANIFEST_NAME)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'version': MANIFEST_VERSION, 'outdir': str(app.outdir), 'mapping': mapping,
+                   'pages': pages}, f, separators=(',', ':'), sort_keys=True)
+
+
+def remove_stale_assets(outdir, previous, current):
+    """Delete the fingerprinted files of a previous build that nothing refers to any more."""
+    live = set(current.values())
+    for relpath in set(previous.values()) - live:
+        for suffix in ('', '.gz', '.br'):
+            try:
+                os.remove(os.path.join(outdir, relpath + suffix))
+            except OSError:
+                pass
+
+
+def fingerprint_static_assets(app, exception):
+    if exception or app.builder.format != 'html' or not app.config.static_assets_fingerprint:
+        return
+    outdir = str(app.outdir)
+    manifest = load_manifest(app)
+
+    mapping = {}
+    for relpath in find_assets(outdir, app.config.static_assets_patterns):
+        mapping[relpath] = write_asset(app, relpath, mapping)
+    remove_stale_assets(outdir, manifest.get('mapping', {}), mapping)
+
+    # Pages under _static (toc.html and its shards) were handled above
+    signatures = {relpath: signature for relpath, signature in scan_files(outdir, '.html').items()
+                  if not relpath.startswith('_static/')}
+    if manifest.get('mapping') == mapping:
+        previous = {relpath: tuple(signature) for relpath, signature in manifest['pages'].items()}
+        relpaths = [relpath for relpath, signature in signatures.items() if previous.get(relpath) != signature]
+    else:
+        relpaths = list(signatures)
+    paths = [os.path.join(outdir, relpath) for relpath in relpaths]
+    func = functools.partial(rewrite_page, outdir=outdir, mapping=mapping)
+    results, elapsed, workers = map_files(func, paths, app.config.static_assets_workers)
+
+    rewritten = {}
+    for relpath, filepath, result in zip(relpaths, paths, results):
+        if result == 'fixed':
+            st = os.stat(filepath)
+            rewritten[relpath] = (signatures[relpath], (st.st_mtime_ns, st.st_size))
+            signatures[relpath] = (st.st_mtime_ns, st.st_size)
+        elif result.startswith('error: '):
+            logger.warning(f"Could not rewrite asset references in {filepath}: {result[len('error: '):]}")
+            del signatures[relpath]
+    save_manifest(app, mapping, signatures)
+    # fix_links saved its manifest before we touched the pages
+    note_rewritten_pages(app, rewritten)
+
+    logger.info(f"Fingerprinted {len(mapping)} static assets; rewrote {len(rewritten)} of "
+                f"{len(relpaths)} pages checked ({format_rate(len(paths), elapsed)}, {workers} worker(s))")
+
+
+def setup(app):
+    # Write content-hashed copies of the static assets and point the pages at them
+    app.add_config_value('static_assets_fingerprint', False, '', [bool])
+    # Globs (relative to _static) of the assets to fingerprint
+    app.add_config_value('static_assets_patterns',
+                         ['*.css', '*.js', 'styles/*.css', 'scripts/*.js', 'toc-search-index.json', 'toc.html'],
+                         '', [list])
+    # Minify styles before hashing them
+    app.add_config_value('static_assets_minify', True, '', [bool])
+    # Write .gz (and .br, with the brotli module) next to each fingerprinted asset
+    app.add_config_value('static_assets_precompress', True, '', [bool])
+    # Number of processes used to rewrite pages; 0 means one per CPU
+    app.add_config_value('static_assets_workers', 0, '', [int])
+
+    # After toc.html and the search index are written, before the link checker
+    app.connect('build-finished', fingerprint_static_assets, priority=700)
+
+    return {
+        'version': '0.1',
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
@@ -1,7 +1,8 @@
-var txtSearch = document.getElementById("txtSearch");
-var resultPanel = document.getElementById("tocSearchResult");
-var searchPanelOutline = document.getElementById("tocSearchPanelInner");
-var searchPanel = document.getElementById("tocSearchPanel");
+// Looked up by initTocSearch once the document is parsed
+var txtSearch = null;
+var resultPanel = null;
+var searchPanelOutline = null;
+var searchPanel = null;
 
 let highlightedIndex = -1;
 
@@ -144,19 +145,9 @@ function isPerfectMatch(searchText, title) {
     return words.some(word => word === searchText);
 }
 
-function txtSearchChange(event) {
-    var searchText = txtSearch.value.trim();
-    if (!resultPanel || !txtSearch) return;
-
-    resultPanel.innerHTML = "";
-    var searchTokens = searchText.toLowerCase().split(/[\\.:,\s]+/).filter(t => t.length > 0);
-
-    if (searchText.length === 0 || searchTokens.length === 0) {
-        resultPanel.style.display = "none";
-        highlightedIndex = -1;
-        return;
-    }
-
+// Fallback search that walks the TOC DOM; used until (or if) the prebuilt
+// index can't be loaded.
+function searchTocDom(searchText, searchTokens) {
     var matchedResults = [];
     let hasPerfectMatch = false;
 
@@ -224,11 +215,110 @@ function txtSearchChange(event) {
         }
     });
 
+    return { results: matchedResults, hasPerfectMatch: hasPerfectMatch };
+}
+
+// -------- Prebuilt index search --------
+// _static/toc-search-index.json is generated at build time by the
+// generate_search_index extension. docs holds [display, href, title] rows and
+// terms is a sorted table whose postings list the ids of the docs using it.
+var tocSearchIndex = null;
+var tocSearchIndexUrl = document.currentScript ? new URL('toc-search-index.json', document.currentScript.src) : null;
+// The search page, resolved against this script (in _static) so it works from toc.html and from pages
+var tocSearchPageUrl = document.currentScript ? new URL('../search.html', document.currentScript.src).href : '../search.html';
+
+function loadTocSearchIndex() {
+    if (!tocSearchIndexUrl || !window.fetch) return;
+    fetch(tocSearchIndexUrl)
+        .then(response => {
+            if (!response.ok) throw new Error('HTTP ' + response.status);
+            return response.json();
+        })
+        .then(index => {
+            // Links are relative to the index file; resolve them once up front
+            index.docs.forEach(doc => { doc[1] = new URL(doc[1], tocSearchIndexUrl).href; });
+            tocSearchIndex = index;
+        })
+        .catch(e => console.log('Could not load search index, searching the TOC instead:', e));
+}
+
+// Index of the first term that is >= prefix
+function lowerBound(terms, prefix) {
+    let lo = 0, hi = terms.length;
+    while (lo < hi) {
+        const mid = (lo + hi) >> 1;
+        if (terms[mid] < prefix) lo = mid + 1; else hi = mid;
+    }
+    return lo;
+}
+
+// Ids of all docs with a term starting with prefix
+function idsForPrefix(index, prefix) {
+    const ids = new Set();
+    for (let i = lowerBound(index.terms, prefix); i < index.terms.length && index.terms[i].startsWith(prefix); i++) {
+        for (const id of index.postings[i]) ids.add(id);
+    }
+    return ids;
+}
+
+function searchTocIndex(index, searchText, searchTokens) {
+    var matchedResults = [];
+    let hasPerfectMatch = false;
+
+    // Terms only contain letters, digits and underscores
+    const indexTokens = searchTokens.join(' ').match(/[a-z0-9_]+/g);
+    if (!indexTokens) {
+        return { results: matchedResults, hasPerfectMatch: hasPerfectMatch };
+    }
+
+    // Every query token must prefix a term of the entry or its ancestors
+    let candidates = null;
+    for (const token of indexTokens) {
+        const ids = idsForPrefix(index, token);
+        candidates = candidates === null ? ids : new Set([...candidates].filter(id => ids.has(id)));
+        if (candidates.size === 0) break;
+    }
+
+    const lastToken = searchTokens[searchTokens.length - 1];
+    for (const id of candidates) {
+        const [display, href, title] = index.docs[id];
+        // As with the TOC walk, the last token has to match the entry itself
+        if (!title.toLowerCase().includes(lastToken)) continue;
+        const isPerfect = isPerfectMatch(searchText, display);
+        if (isPerfect) hasPerfectMatch = true;
+        matchedResults.push({
+            display: display,
+            href: href,
+            score: 2000 - display.length + (isPerfect ? 1000 : 0),
+            type: 'toc'
+        });
+    }
+
+    return { results: matchedResults, hasPerfectMatch: hasPerfectMatch };
+}
+
+function txtSearchChange(event) {
+    var searchText = txtSearch.value.trim();
+    if (!resultPanel || !txtSearch) return;
+
+    resultPanel.innerHTML = "";
+    var searchTokens = searchText.toLowerCase().split(/[\\.:,\s]+/).filter(t => t.length > 0);
+
+    if (searchText.length === 0 || searchTokens.length === 0) {
+        resultPanel.style.display = "none";
+        highlightedIndex = -1;
+        return;
+    }
+
+    var search = tocSearchIndex ? searchTocIndex(tocSearchIndex, searchText, searchTokens)
+                                : searchTocDom(searchText, searchTokens);
+    var matchedResults = search.results;
+    let hasPerfectMatch = search.hasPerfectMatch;
+
     matchedResults.sort((a, b) => b.score - a.score);
 
     // Add the "Search for..." item at the top
-    // Construct search URL relative to current page
-    let searchUrl = '../search.html';
+    let searchUrl = tocSearchPageUrl;
     resultPanel.innerHTML = `<div class='search_result_item' data-type='search'><a href="${searchUrl}?q=${encodeURIComponent(searchText)}"><span>Search Documentation for "${escapeHTML(searchText)}"</span></a></div>`;
     
     // Add the rest of the results
@@ -252,78 +342,97 @@ function txtSearchChange(event) {
     updateItemHighlight();
 }
 
-const input = txtSearch;
-
-if (input) {
-    input.addEventListener('keydown', (e) => {
-        if (!resultPanel) return;
-        const items = resultPanel.children;
-        if (items.length === 0 && e.key !== 'Escape') return;
-
-        if (e.key === 'ArrowDown') {
-            highlightedIndex++;
-            if (highlightedIndex >= items.length) highlightedIndex = 0;
-            e.preventDefault();
-        } else if (e.key === 'ArrowUp') {
-            highlightedIndex--;
-            if (highlightedIndex < 0) highlightedIndex = items.length - 1;
-            e.preventDefault();
-        } else if (e.key === 'Enter') {
-            if (highlightedIndex > -1 && items[highlightedIndex]) {
-                let selectedATag = items[highlightedIndex].querySelector('a');
-                if (selectedATag && selectedATag.href) {
-                    // If we're in an iframe, navigate the parent window
-                    if (window.parent && window.parent !== window) {
-                        window.parent.location.href = selectedATag.href;
-                    } else {
-                        window.location.href = selectedATag.href;
+function positDropdown() {
+    if (searchPanel && searchPanelOutline && resultPanel) {
+        resultPanel.style.top = `${searchPanel.offsetHeight}px`;
+        resultPanel.style.width = `${searchPanelOutline.offsetWidth}px`;
+    }
+}
+
+// search.js runs at the end of toc.html, and in the head of pages with the
+// inline sidebar, where the search box doesn't exist yet
+function initTocSearch() {
+    txtSearch = document.getElementById("txtSearch");
+    resultPanel = document.getElementById("tocSearchResult");
+    searchPanelOutline = document.getElementById("tocSearchPanelInner");
+    searchPanel = document.getElementById("tocSearchPanel");
+
+    const input = txtSearch;
+
+    if (input) {
+        input.addEventListener('keydown', (e) => {
+            if (!resultPanel) return;
+            const items = resultPanel.children;
+            if (items.length === 0 && e.key !== 'Escape') return;
+
+            if (e.key === 'ArrowDown') {
+                highlightedIndex++;
+                if (highlightedIndex >= items.length) highlightedIndex = 0;
+                e.preventDefault();
+            } else if (e.key === 'ArrowUp') {
+                highlightedIndex--;
+                if (highlightedIndex < 0) highlightedIndex = items.length - 1;
+                e.preventDefault();
+            } else if (e.key === 'Enter') {
+                if (highlightedIndex > -1 && items[highlightedIndex]) {
+                    let selectedATag = items[highlightedIndex].querySelector('a');
+                    if (selectedATag && selectedATag.href) {
+                        // If we're in an iframe, navigate the parent window
+                        if (window.parent && window.parent !== window) {
+                            window.parent.location.href = selectedATag.href;
+                        } else {
+                            window.location.href = selectedATag.href;
+                        }
                     }
+                    e.preventDefault();
                 }
-                e.preventDefault();
+            } else if (e.key === 'Escape') {
+                closePanel();
             }
-        } else if (e.key === 'Escape') {
+            updateItemHighlight();
+        });
+
+        input.addEventListener("blur", (e) => {
+            setTimeout(() => {
+                if (searchPanel && !searchPanel.contains(document.activeElement)) {
+                     txtSearchLostFocus(e);
+                     if(document.activeElement && !document.activeElement.closest('.search_result_item')){
+                        closePanel();
+                     }
+                }
+            }, 150);
+        });
+        input.addEventListener("focus", txtSearchFocus);
+        input.addEventListener("input", txtSearchChange);
+    }
+
+    window.addEventListener('load', positDropdown);
+    window.addEventListener('resize', positDropdown);
+
+    document.addEventListener('click', function(event) {
+        if (resultPanel && searchPanel && !resultPanel.contains(event.target) && !searchPanel.contains(event.target) && event.target !== txtSearch) {
             closePanel();
         }
-        updateItemHighlight();
     });
 
-    input.addEventListener("blur", (e) => {
-        setTimeout(() => {
-            if (searchPanel && !searchPanel.contains(document.activeElement)) {
-                 txtSearchLostFocus(e);
-                 if(document.activeElement && !document.activeElement.closest('.search_result_item')){
-                    closePanel();
-                 }
-            }
-        }, 150);
+    document.addEventListener('keydown', function(event) {
+        if (event.code === 'Backquote') { 
+            event.preventDefault();
+            if (txtSearch) txtSearch.focus(); 
+        }
     });
-    input.addEventListener("focus", txtSearchFocus);
-    input.addEventListener("input", txtSearchChange);
-}
 
-function positDropdown() {
-    if (searchPanel && searchPanelOutline && resultPanel) {
-        resultPanel.style.top = `${searchPanel.offsetHeight}px`;
-        resultPanel.style.width = `${searchPanelOutline.offsetWidth}px`;
+    if (txtSearch && txtSearch.offsetParent !== null) {
+        positDropdown();
     }
-}
 
-window.addEventListener('load', positDropdown);
-window.addEventListener('resize', positDropdown);
-
-document.addEventListener('click', function(event) {
-    if (resultPanel && searchPanel && !resultPanel.contains(event.target) && !searchPanel.contains(event.target) && event.target !== txtSearch) {
-        closePanel();
+    if (txtSearch) {
+        loadTocSearchIndex();
     }
-});
-
-document.addEventListener('keydown', function(event) {
-    if (event.code === 'Backquote') { 
-        event.preventDefault();
-        if (txtSearch) txtSearch.focus(); 
-    }
-});
+}
 
-if (txtSearch && txtSearch.offsetParent !== null) {
-    positDropdown();
+if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', initTocSearch);
+} else {
+    initTocSearch();
 }
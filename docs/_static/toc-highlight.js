@@ -1,4 +1,80 @@
 document.addEventListener('DOMContentLoaded', function() {
+    // In shard mode, deeper parts of the tree are loaded on demand. Load the
+    // shards leading to the current page before looking for it.
+    watchTocShards();
+    loadTocShards(getCurrentPageShards()).then(function() {
+        highlightCurrentPage();
+    });
+
+    // Save scroll position and relative position when page unloads
+    window.addEventListener('beforeunload', saveScrollPosition);
+    window.addEventListener('beforeunload', saveRelativePosition);
+});
+
+function getCurrentPageShards() {
+    // The parent page lists the shards containing it in a <meta name="toc-shards"> tag
+    try {
+        const meta = window.parent.document.querySelector('meta[name="toc-shards"]');
+        if (meta && meta.content) {
+            return meta.content.split(' ');
+        }
+    } catch (e) {
+        console.log('Cannot read TOC shards from parent page:', e);
+    }
+    return [];
+}
+
+function loadTocShard(li) {
+    // Fetch the children of a shard entry into its (empty) <ul>, once
+    if (!li || !li.dataset.tocShard) {
+        return Promise.resolve();
+    }
+    if (!li.tocShardPromise) {
+        const shardUrl = new URL(li.dataset.tocShard, window.location.href);
+        li.tocShardPromise = fetch(shardUrl)
+            .then(function(response) {
+                if (!response.ok) {
+                    throw new Error('HTTP ' + response.status);
+                }
+                return response.text();
+            })
+            .then(function(html) {
+                const ul = li.querySelector(':scope > ul');
+                if (ul) {
+                    ul.innerHTML = html;
+                }
+            })
+            .catch(function(e) {
+                console.log('Could not load TOC shard', li.dataset.tocShard, e);
+                li.tocShardPromise = null;
+            });
+    }
+    return li.tocShardPromise;
+}
+
+function loadTocShards(shardPaths) {
+    // Each shard lives inside the previous one, so load them in order
+    return shardPaths.reduce(function(previous, shardPath) {
+        return previous.then(function() {
+            const li = document.querySelector('.sidebar-tree li[data-toc-shard="' + shardPath + '"]');
+            return loadTocShard(li);
+        });
+    }, Promise.resolve());
+}
+
+function watchTocShards() {
+    // Load a shard when its entry is expanded by the user
+    const tree = document.querySelector('.sidebar-tree');
+    if (!tree) return;
+    tree.addEventListener('change', function(event) {
+        const checkbox = event.target;
+        if (checkbox.classList.contains('toctree-checkbox') && checkbox.checked) {
+            loadTocShard(checkbox.parentElement);
+        }
+    });
+}
+
+function highlightCurrentPage() {
     // Highlight current page and expand path to it
     try {
         const parentUrl = window.parent.location.href;
@@ -44,11 +120,7 @@ document.addEventListener('DOMContentLoaded', function() {
         // Log that we can't access parent URL due to cross-origin restrictions
         console.log('Cannot access parent URL:', e);
     }
-
-    // Save scroll position and relative position when page unloads
-    window.addEventListener('beforeunload', saveScrollPosition);
-    window.addEventListener('beforeunload', saveRelativePosition);
-});
+}
 
 function expandPathToElementAndChildren(element) {
     console.log('Expanding path to element and its children...');
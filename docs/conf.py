@@ -6,26 +6,36 @@
 
 # -- Project information -----------------------------------------------------
 # https://www.sphinx-doc.org/en/master/usage/configuration.html#project-information
+import hashlib
+import importlib.metadata
 import os
 import sys
 import re
+import time
 from pathlib import Path
+from sphinx.util import logging
 
 sys.path.insert(0, os.path.abspath('.'))  # For finding _ext
 sys.path.insert(0, os.path.abspath('..'))
 
+logger = logging.getLogger(__name__)
+
+# -- Source preprocessing ----------------------------------------------------
+# Every document goes through a single source-read hook that runs the steps
+# below in order. Each step has a cheap marker check, so its transform only
+# runs on documents that need it.
+
+TOC_COMMENT_PATTERN = re.compile(r'<!-- RTD-TOC-START\s*(.*?)\s*RTD-TOC-END -->', re.DOTALL)
+FRONTMATTER_START = re.compile(r'\s*---')
+
 def uncomment_toctrees(app, docname, source):
     content = source[0]
-    # Regex to find the comment block and extract its content
-    pattern = re.compile(r'<!-- RTD-TOC-START\s*(.*?)\s*RTD-TOC-END -->', re.DOTALL)
 
     def uncomment_toc(match):
         return match.group(1) # Return only the content inside the comments
 
     # Replace the comment block with its uncommented content
-    new_content = pattern.sub(uncomment_toc, content)
-
-    source[0] = new_content
+    source[0] = TOC_COMMENT_PATTERN.sub(uncomment_toc, content)
 
 def handle_utf16le_files(app, docname, source):
     doc_path = Path(app.env.doc2path(docname))
@@ -44,28 +54,58 @@ def handle_utf16le_files(app, docname, source):
 
 def add_orphan_directive(app, docname, source):
     content = source[0]
-    # Check if the document already has "orphan: true"
-    if 'orphan: true' in content:
-        return
 
     # Check if the document starts with YAML frontmatter
-    if content.strip().startswith('---'):
-        # Find the end of frontmatter
-        lines = content.split('\n')
-        frontmatter_end = -1
-        for i in range(1, len(lines)):
-            if lines[i].strip() == '---':
-                frontmatter_end = i
-                break
-
-        # Insert orphan: true at the end of the frontmatter
-        if frontmatter_end != -1:
-            lines.insert(frontmatter_end - 1, 'orphan: true')
-            source[0] = '\n'.join(lines)
+    if FRONTMATTER_START.match(content):
+        # Find the end of frontmatter: the first line after the first one that is just ---
+        prev_start = 0
+        pos = content.find('\n') + 1
+        while pos:
+            end = content.find('\n', pos)
+            line = content[pos:] if end == -1 else content[pos:end]
+            if line.strip() == '---':
+                # Insert orphan: true at the end of the frontmatter
+                source[0] = content[:prev_start] + 'orphan: true\n' + content[prev_start:]
+                return
+            prev_start, pos = pos, end + 1
     else:
         # No frontmatter, add frontmatter with "orphan: true"
         source[0] = '---\norphan: true\n---\n' + content
 
+# Rendered Liquid output, keyed by a hash of the source, lives in this
+# directory under the doctree dir so unchanged documents skip parsing and
+# rendering across builds. Bump the version when the rendering setup changes.
+LIQUID_CACHE_DIR = 'liquid_cache'
+LIQUID_CACHE_VERSION = 1
+
+_liquid_env = None
+_liquid_cache_key = None
+
+def get_liquid_cache_key():
+    """Return the cache key prefix, or None if python-liquid is not installed."""
+    global _liquid_cache_key
+    if _liquid_cache_key is None:
+        # Read the version from package metadata; importing liquid itself is
+        # slow and only needed on a cache miss
+        try:
+            version = importlib.metadata.version('python-liquid')
+        except importlib.metadata.PackageNotFoundError:
+            return None
+        _liquid_cache_key = f"{LIQUID_CACHE_VERSION}:{version}"
+    return _liquid_cache_key
+
+def get_liquid_env():
+    """Return the shared Liquid environment, or None if python-liquid is missing."""
+    global _liquid_env
+    if _liquid_env is None:
+        try:
+            from liquid import Environment
+        except ImportError:
+            return None
+        _liquid_env = Environment()
+        _liquid_env.add_filter("markdownify", lambda value: value)
+    return _liquid_env
+
 def render_liquid(app, docname, source):
     """Render Jekyll-style Liquid templates so Sphinx sees the same output Jekyll does.
 
@@ -75,69 +115,248 @@ def render_liquid(app, docname, source):
     MyST will parse the captured markdown after this hook runs.
     """
     content = source[0]
-    if '{%' not in content and '{{' not in content:
+
+    cache_key = get_liquid_cache_key()
+    if cache_key is None:
         return
 
+    digest = hashlib.sha256(f"{cache_key}\0{content}".encode('utf-8')).hexdigest()
+    cache_path = os.path.join(app.doctreedir, LIQUID_CACHE_DIR, digest + '.txt')
     try:
-        from liquid import Environment
-    except ImportError:
+        with open(cache_path, 'r', encoding='utf-8', newline='') as f:
+            source[0] = f.read()
+        # Mark as recently used for eviction
+        os.utime(cache_path)
         return
+    except OSError:
+        pass
 
-    env = Environment()
-    env.add_filter("markdownify", lambda value: value)
-
+    env = get_liquid_env()
+    if env is None:
+        return
     try:
-        source[0] = env.from_string(content).render()
+        rendered = env.from_string(content).render()
     except Exception as exc:
-        from sphinx.util import logging as sphinx_logging
-        sphinx_logging.getLogger(__name__).warning(
-            "Liquid rendering failed for %s: %s", docname, exc
-        )
-
-def latex_block_to_inline(app, docname, source):
-    content = source[0]
-    # Replace $$ with $ for inline math, but only when not part of a block
-    # First find all block math ($$...$$) on their own lines
-    block_matches = re.finditer(r'^\s*\$\$(.*?)\$\$\s*$', content, re.MULTILINE | re.DOTALL)
-    block_positions = [(m.start(), m.end()) for m in block_matches]
+        logger.warning("Liquid rendering failed for %s: %s", docname, exc)
+        return
+    source[0] = rendered
 
-    # Now find all $$ pairs
-    all_matches = list(re.finditer(r'\$\$(.*?)\$\$', content, re.DOTALL))
+    # Write to a per-process temporary name and rename, so parallel readers
+    # (sphinx-build -j) never see a partial file. The cache is only an
+    # optimisation, so a doctree dir we can't write to doesn't stop the build.
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(rendered)
+        os.replace(tmp_path, cache_path)
+    except OSError as exc:
+        logger.debug("Could not cache the Liquid output of %s: %s", docname, exc)
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+def prune_liquid_cache(app, exception):
+    """Drop the least recently used cache entries beyond liquid_cache_size."""
+    cache_dir = os.path.join(app.doctreedir, LIQUID_CACHE_DIR)
+    try:
+        entries = [(entry.stat().st_mtime_ns, entry.path) for entry in os.scandir(cache_dir)]
+    except OSError:
+        return
+    entries.sort(reverse=True)
+    for _, path in entries[app.config.liquid_cache_size:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+# Opening line of a fenced code block: ``` or ~~~, possibly indented (inside lists)
+CODE_FENCE_PATTERN = re.compile(r'^[ \t]*(`{3,}|~{3,})(.*)$', re.MULTILINE)
+
+def split_fenced_code(content):
+    """Split content into (text, is_code) pieces; fenced code blocks include their fence lines."""
+    pieces = []
+    pos = 0
+    search_from = 0
+    while True:
+        match = CODE_FENCE_PATTERN.search(content, search_from)
+        if match is None:
+            break
+        fence, info = match.group(1), match.group(2)
+        if fence[0] == '`' and '`' in info:
+            # Not a fence: backtick fences can't have backticks in the info string
+            search_from = match.end()
+            continue
+        # The block ends at a line of at least as many fence characters, or at the end
+        closing = re.compile(rf'^[ \t]*{re.escape(fence[0])}{{{len(fence)},}}[ \t]*$', re.MULTILINE)
+        close_match = closing.search(content, match.end() + 1)
+        end = len(content) if close_match is None else close_match.end() + 1
+        pieces.append((content[pos:match.start()], False))
+        pieces.append((content[match.start():end], True))
+        pos = search_from = end
+        if pos >= len(content):
+            break
+    pieces.append((content[pos:], False))
+    return pieces
+
+def find_block_math(text):
+    """
+    Return (start, end) spans, end inclusive, of $$ block math in text.
 
-    # Filter to only inline matches by checking if they overlap with any block matches
-    def is_inline(match):
-        pos = match.span()
-        return not any(block_start <= pos[0] <= block_end for block_start, block_end in block_positions)
+    A block opens with $$ as the first non-whitespace on a line and closes at
+    the first later $$ that ends a line (ignoring trailing whitespace).
+    """
+    blocks = []
+    pos = 0
+    while True:
+        start = text.find('$$', pos)
+        if start == -1:
+            break
+        line_start = text.rfind('\n', 0, start) + 1
+        if text[line_start:start].strip():
+            # Not first on its line, and nothing later on this line can be
+            next_line = text.find('\n', start)
+            if next_line == -1:
+                break
+            pos = next_line + 1
+            continue
+
+        close = -1
+        line_start = start + 2
+        while line_start <= len(text):
+            line_end = text.find('\n', line_start)
+            if line_end == -1:
+                line_end = len(text)
+            line = text[line_start:line_end].rstrip()
+            if line.endswith('$$'):
+                close = line_start + len(line) - 2
+                break
+            line_start = line_end + 1
+        if close == -1:
+            # No later opening $$ can find a closing one either
+            break
+        blocks.append((start, close + 1))
+        pos = close + 2
+    return blocks
+
+def convert_inline_math(text):
+    """Turn inline $$...$$ into $...$, leaving block math alone."""
+    delimiters = []
+    pos = text.find('$$')
+    while pos != -1:
+        delimiters.append(pos)
+        pos = text.find('$$', pos + 2)
+    if len(delimiters) < 2:
+        return text
+
+    blocks = find_block_math(text)
+    pieces = []
+    last = 0
+    block = 0
+    # Delimiters pair up in order; a pair is inline unless it opens inside a block
+    for i in range(0, len(delimiters) - 1, 2):
+        start, close = delimiters[i], delimiters[i + 1]
+        while block < len(blocks) and blocks[block][1] < start:
+            block += 1
+        if block < len(blocks) and blocks[block][0] <= start:
+            continue
+        pieces.append(text[last:start])
+        pieces.append('$')
+        pieces.append(text[start + 2:close])
+        pieces.append('$')
+        last = close + 2
+    pieces.append(text[last:])
+    return ''.join(pieces)
 
-    inline_matches = [m for m in all_matches if is_inline(m)]
+def latex_block_to_inline(app, docname, source):
+    # Replace $$ with $ for inline math, but only when not part of a block.
+    # Fenced code blocks are copied through untouched.
+    source[0] = ''.join(text if is_code else convert_inline_math(text)
+                        for text, is_code in split_fenced_code(source[0]))
+
+# name -> (marker check, transform); setup() picks the steps and their order.
+# Sphinx decodes sources as UTF-8, which turns a UTF-16 file into text full of
+# NUL characters, so only those files are re-read from disk and decoded
+# properly, before any other step sees them.
+SOURCE_STEPS = {
+    'utf16le': (lambda content: '\x00' in content, handle_utf16le_files),
+    'uncomment_toctrees': (lambda content: 'RTD-TOC-START' in content, uncomment_toctrees),
+    'add_orphan_directive': (lambda content: 'orphan: true' not in content, add_orphan_directive),
+    'latex_block_to_inline': (lambda content: '$$' in content, latex_block_to_inline),
+    'render_liquid': (lambda content: '{%' in content or '{{' in content, render_liquid),
+}
 
-    # Replace inline $$ with $ working backwards to preserve positions
-    for match in reversed(inline_matches):
-        start, end = match.span()
-        inner = match.group(1)
-        content = content[:start] + '$' + inner + '$' + content[end:]
-    source[0] = content
+def get_source_stats(env):
+    """Per-document {step: seconds} for the steps whose marker hit."""
+    if not hasattr(env, 'source_pipeline_stats'):
+        env.source_pipeline_stats = {}
+    return env.source_pipeline_stats
+
+def preprocess_source(app, docname, source):
+    """Run the enabled preprocessing steps over a document in order."""
+    stats = {}
+    for name in app.source_pipeline:
+        check, transform = SOURCE_STEPS[name]
+        if not check(source[0]):
+            continue
+        start = time.perf_counter()
+        transform(app, docname, source)
+        stats[name] = time.perf_counter() - start
+    get_source_stats(app.env)[docname] = stats
+
+def note_docs_to_read(app, env, docnames):
+    app.source_pipeline_docnames = list(docnames)
+
+def purge_source_stats(app, env, docname):
+    get_source_stats(env).pop(docname, None)
+
+def merge_source_stats(app, env, docnames, other):
+    stats = get_source_stats(env)
+    other_stats = get_source_stats(other)
+    for docname in docnames:
+        if docname in other_stats:
+            stats[docname] = other_stats[docname]
+
+def report_source_stats(app, env):
+    """Log hit counts and time spent per step for the documents read in this build."""
+    docnames = getattr(app, 'source_pipeline_docnames', [])
+    if not docnames:
+        return
+    stats = get_source_stats(env)
+    logger.info(f"Source preprocessing of {len(docnames)} documents:")
+    for name in app.source_pipeline:
+        times = [stats[docname][name] for docname in docnames
+                 if name in stats.get(docname, ())]
+        logger.info(f"  {name}: {len(times)} hits, {sum(times) * 1000:.1f} ms")
 
 def setup(app):
     # Register custom configuration value
     app.add_config_value('build_toctree', False, 'env', [bool])
+    # Number of rendered Liquid documents kept in the cache under the doctree dir
+    app.add_config_value('liquid_cache_size', 256, '', [int])
 
     # Check if we want to build toctrees for validation
     # This can be set via: sphinx-build -D build_toctree=true
+    # For a check in seconds without a build, run: python -m _ext.check_toctree
     build_toctree = getattr(app.config, 'build_toctree', False)
 
     if build_toctree:
         # Enable toctree processing to verify all docs are included
-        app.connect('source-read', uncomment_toctrees)
+        toc_step = 'uncomment_toctrees'
     else:
         # When not building toctrees, add :orphan: to documents to suppress toctree warnings
         # Processing toctrees is really slow, so we leave them commented out in normal builds
         # and build the TOC a different way
-        app.connect('source-read', add_orphan_directive)
+        toc_step = 'add_orphan_directive'
+    app.source_pipeline = ['utf16le', toc_step, 'latex_block_to_inline', 'render_liquid']
 
-    app.connect('source-read', latex_block_to_inline)
-    app.connect('source-read', handle_utf16le_files)
-    app.connect('source-read', render_liquid)
+    app.connect('source-read', preprocess_source)
+    app.connect('env-before-read-docs', note_docs_to_read)
+    app.connect('env-purge-doc', purge_source_stats)
+    app.connect('env-merge-info', merge_source_stats)
+    app.connect('env-updated', report_source_stats)
+    app.connect('build-finished', prune_liquid_cache)
 
 project = 'Slang Documentation'
 author = 'Chris Cummings, Benedikt Bitterli, Sai Bangaru, Yong Hei, Aidan Foster'
@@ -161,6 +380,14 @@ extensions = [
     'sphinx.ext.intersphinx',
     'myst_parser',
     '_ext.generate_toc_html',
+    '_ext.generate_search_index',  # Prebuilt index for the sidebar search
+    '_ext.generate_llms_txt',  # llms-full.txt built from the docs in TOC order, page texts and its range index
+    '_ext.static_assets',  # Fingerprinted, minified, precompressed _static assets
+    '_ext.build_cache',  # Reuses the submodule trees of earlier builds, enabled with -D build_cache_dir=DIR
+    '_ext.build_profile',  # Per-handler timing report, enabled with -D build_profile=1
+    '_ext.linkcheck_cache',  # linkcheck builder that reuses recent results
+    '_ext.check_links',  # Offline internal link/anchor check, enabled with -D check_links=1
+    '_ext.deploy_manifest',  # Content hashes of the output and what changed since the last build
 ]
 
 # Debugging flag for verbose output
@@ -230,6 +457,9 @@ linkcheck_request_headers = {
 # -- Options for HTML output -------------------------------------------------
 # https://www.sphinx-doc.org/en/master/usage/configuration.html#options-for-html-output
 
+# Deploy builds fingerprint the static assets; local builds leave the pages alone
+static_assets_fingerprint = os.environ.get('READTHEDOCS') == 'True'
+
 html_theme = "furo"
 html_title = "Slang Documentation"
 html_static_path = ['_static']